@@ -0,0 +1,73 @@
+-- Schema v2 for log_entries: LowCardinality, compression codecs and skip indexes
+--
+-- Key and codec changes can't be applied with ALTER, so the table is rebuilt:
+-- log_entries_v2 is created with the new schema, filled from log_entries, and
+-- the two tables are swapped atomically. On a fresh volume this runs right
+-- after 01-init-coagent.sql on an empty table.
+--
+-- To migrate an existing volume, stop coagent-core (rows inserted during the
+-- copy would be lost) and run:
+--
+--   docker-compose stop coagent-core
+--   docker-compose exec -T clickhouse clickhouse-client --user coagent --password coagent \
+--     --multiquery < config/clickhouse/initdb.d/03-log-entries-v2.sql
+--   docker-compose start coagent-core
+--
+-- The copy needs free disk space for a second copy of the table. Running the
+-- script again rebuilds the table with the same schema.
+USE coagent;
+
+DROP TABLE IF EXISTS log_entries_v2;
+
+CREATE TABLE log_entries_v2 (
+    -- Random ids don't compress; ZSTD only shaves the hex encoding
+    log_id String CODEC(ZSTD(3)),
+    -- Sorted within a session, so deltas between rows are small
+    timestamp DateTime64(3) CODEC(Delta, ZSTD(1)),
+    version LowCardinality(String),
+    session_id String CODEC(ZSTD(3)),
+    prompt_number UInt32 CODEC(Delta, ZSTD(1)),
+    turn_number UInt32 CODEC(Delta, ZSTD(1)),
+    event_id String CODEC(ZSTD(3)),
+    event_type Enum8(
+        'session_start' = 1,
+        'session_end' = 2,
+        'user_input' = 3,
+        'component_enter' = 4,
+        'component_exit' = 5,
+        'routing' = 6,
+        'consensus_success' = 7,
+        'consensus_failure' = 8,
+        'tool_call' = 9,
+        'tool_response' = 10,
+        'error' = 11,
+        'recovery' = 12,
+        'performance_degradation' = 13,
+        'human_oversight' = 14,
+        'test_result' = 15,
+        'llm_call' = 16,
+        'llm_response' = 17
+    ) CODEC(ZSTD(1)),
+    -- Payloads are mostly text and compress well with ZSTD
+    event_data JSON CODEC(ZSTD(3)),
+    agent_stack Array(LowCardinality(String)),
+    prompt Nullable(String) CODEC(ZSTD(3)),
+    conversation_context Nullable(JSON) CODEC(ZSTD(3)),
+    meta Nullable(JSON) CODEC(ZSTD(3)),
+    custom_metadata Nullable(JSON) CODEC(ZSTD(3)),
+    additional_properties Nullable(JSON) CODEC(ZSTD(3)),
+
+    -- Point lookups by id skip granules whose filter can't contain the id
+    INDEX idx_event_id event_id TYPE bloom_filter(0.01) GRANULARITY 4,
+    INDEX idx_log_id log_id TYPE bloom_filter(0.01) GRANULARITY 4,
+    -- Time range queries without a session_id filter
+    INDEX idx_timestamp timestamp TYPE minmax GRANULARITY 1
+) ENGINE = MergeTree()
+PARTITION BY toYYYYMM(timestamp)
+ORDER BY (session_id, timestamp, event_id);
+
+INSERT INTO log_entries_v2 SELECT * FROM log_entries;
+
+EXCHANGE TABLES log_entries AND log_entries_v2;
+
+DROP TABLE log_entries_v2;
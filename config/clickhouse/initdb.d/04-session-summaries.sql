@@ -0,0 +1,88 @@
+-- Per-session rollups of log_entries for the runs listing
+--
+-- session_summaries holds one partial aggregate per session and insert block,
+-- maintained by session_summaries_mv as log entries arrive. ClickHouse merges
+-- the partial rows in the background, so runs_summary reads about one row per
+-- session instead of every log entry.
+--
+-- Apply after 03-log-entries-v2.sql; rebuilding log_entries again later
+-- requires dropping and re-creating the materialized view. To add the rollups
+-- to an existing volume, stop coagent-core (entries inserted before the view
+-- exists and after the backfill would be missed) and run:
+--
+--   docker-compose stop coagent-core
+--   docker-compose exec -T clickhouse clickhouse-client --user coagent --password coagent \
+--     --multiquery < config/clickhouse/initdb.d/04-session-summaries.sql
+--   docker-compose start coagent-core
+USE coagent;
+
+-- Numeric field of an event payload. Accepts both the nested layout of the
+-- API ({"llm_response": {"total_tokens": 5}}) and a flat one; 0 when absent.
+CREATE FUNCTION IF NOT EXISTS coagent_event_uint AS (data, section, key) ->
+    ifNull(coalesce(
+        JSONExtract(toJSONString(data), section, key, 'Nullable(UInt64)'),
+        JSONExtract(toJSONString(data), key, 'Nullable(UInt64)')
+    ), 0);
+
+CREATE TABLE IF NOT EXISTS session_summaries (
+    session_id String,
+    first_timestamp SimpleAggregateFunction(min, DateTime64(3)),
+    last_timestamp SimpleAggregateFunction(max, DateTime64(3)),
+    log_count SimpleAggregateFunction(sum, UInt64),
+    event_counts SimpleAggregateFunction(sumMap, Map(String, UInt64)),
+    input_tokens SimpleAggregateFunction(sum, UInt64),
+    output_tokens SimpleAggregateFunction(sum, UInt64),
+    total_tokens SimpleAggregateFunction(sum, UInt64),
+    error_count SimpleAggregateFunction(sum, UInt64),
+    tool_call_count SimpleAggregateFunction(sum, UInt64)
+) ENGINE = AggregatingMergeTree()
+ORDER BY session_id;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS session_summaries_mv TO session_summaries AS
+SELECT
+    session_id,
+    min(timestamp) AS first_timestamp,
+    max(timestamp) AS last_timestamp,
+    toUInt64(count()) AS log_count,
+    sumMap(map(toString(event_type), toUInt64(1))) AS event_counts,
+    sumIf(coagent_event_uint(event_data, 'llm_response', 'input_tokens'), event_type = 'llm_response') AS input_tokens,
+    sumIf(coagent_event_uint(event_data, 'llm_response', 'output_tokens'), event_type = 'llm_response') AS output_tokens,
+    sumIf(coagent_event_uint(event_data, 'llm_response', 'total_tokens'), event_type = 'llm_response') AS total_tokens,
+    toUInt64(countIf(event_type = 'error')) AS error_count,
+    toUInt64(countIf(event_type = 'tool_call')) AS tool_call_count
+FROM log_entries
+GROUP BY session_id;
+
+-- Backfill from existing entries, once
+INSERT INTO session_summaries
+SELECT
+    session_id,
+    min(timestamp),
+    max(timestamp),
+    toUInt64(count()),
+    sumMap(map(toString(event_type), toUInt64(1))),
+    sumIf(coagent_event_uint(event_data, 'llm_response', 'input_tokens'), event_type = 'llm_response'),
+    sumIf(coagent_event_uint(event_data, 'llm_response', 'output_tokens'), event_type = 'llm_response'),
+    sumIf(coagent_event_uint(event_data, 'llm_response', 'total_tokens'), event_type = 'llm_response'),
+    toUInt64(countIf(event_type = 'error')),
+    toUInt64(countIf(event_type = 'tool_call'))
+FROM log_entries
+WHERE (SELECT count() FROM session_summaries) = 0
+GROUP BY session_id;
+
+-- Runs listing in the shape of GET /api/v1/runs?summarize=1, timestamps in
+-- epoch milliseconds like the log entries themselves
+CREATE VIEW IF NOT EXISTS runs_summary AS
+SELECT
+    session_id AS run_id,
+    sum(log_count) AS log_count,
+    toUnixTimestamp64Milli(min(first_timestamp)) AS start_timestamp,
+    toUnixTimestamp64Milli(max(last_timestamp)) AS end_timestamp,
+    sumMap(event_counts) AS event_counts,
+    sum(input_tokens) AS input_tokens,
+    sum(output_tokens) AS output_tokens,
+    sum(total_tokens) AS total_tokens,
+    sum(error_count) AS error_count,
+    sum(tool_call_count) AS tool_call_count
+FROM session_summaries
+GROUP BY session_id;
@@ -0,0 +1,144 @@
+-- Token and latency time series of LLM responses, tool responses and errors
+--
+-- usage_rollups_1m and usage_rollups_1h are filled by materialized views as
+-- log entries arrive, grouped by model, agent and tool. Token counts are
+-- summed; durations (execution_time_ms) are kept as t-digest quantile states,
+-- so p50/p95/p99 can be merged across any time range and grouping. Dashboards
+-- read these instead of parsing event_data of every raw entry; see
+-- tools/metrics_query.py.
+--
+-- Dimensions are taken from the entry itself: the model from meta.model, the
+-- agent from meta.issuer (falling back to the innermost agent_stack entry)
+-- and the tool from tool_response.tool_name. Missing values are ''.
+--
+-- Apply after 04-session-summaries.sql, which defines coagent_event_uint.
+-- Adding the rollups to an existing volume works as described in the header
+-- of 04-session-summaries.sql.
+USE coagent;
+
+-- String and raw JSON fields of an event payload, like coagent_event_uint
+CREATE FUNCTION IF NOT EXISTS coagent_event_string AS (data, section, key) ->
+    ifNull(if(
+        JSONHas(toJSONString(data), section, key),
+        JSONExtractString(toJSONString(data), section, key),
+        JSONExtractString(toJSONString(data), key)
+    ), '');
+
+CREATE FUNCTION IF NOT EXISTS coagent_event_raw AS (data, section, key) ->
+    ifNull(if(
+        JSONHas(toJSONString(data), section, key),
+        JSONExtractRaw(toJSONString(data), section, key),
+        JSONExtractRaw(toJSONString(data), key)
+    ), '');
+
+CREATE TABLE IF NOT EXISTS usage_rollups_1m (
+    bucket DateTime CODEC(Delta, ZSTD(1)),
+    event_type LowCardinality(String),
+    model LowCardinality(String),
+    agent LowCardinality(String),
+    tool LowCardinality(String),
+    events SimpleAggregateFunction(sum, UInt64),
+    errors SimpleAggregateFunction(sum, UInt64),
+    input_tokens SimpleAggregateFunction(sum, UInt64),
+    output_tokens SimpleAggregateFunction(sum, UInt64),
+    total_tokens SimpleAggregateFunction(sum, UInt64),
+    duration_ms_sum SimpleAggregateFunction(sum, UInt64),
+    duration_ms_count SimpleAggregateFunction(sum, UInt64),
+    duration_ms_quantiles AggregateFunction(quantilesTDigest(0.5, 0.95, 0.99), UInt64)
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(bucket)
+ORDER BY (bucket, event_type, model, agent, tool);
+
+CREATE TABLE IF NOT EXISTS usage_rollups_1h AS usage_rollups_1m;
+
+-- Both views share the row shape below; only the bucket differs
+CREATE MATERIALIZED VIEW IF NOT EXISTS usage_rollups_1m_mv TO usage_rollups_1m AS
+WITH
+    toString(event_type) AS section,
+    coagent_event_uint(event_data, section, 'execution_time_ms') AS duration_ms
+SELECT
+    toStartOfMinute(timestamp) AS bucket,
+    section AS event_type,
+    coagent_event_string(meta, 'meta', 'model') AS model,
+    coalesce(nullIf(coagent_event_string(meta, 'meta', 'issuer'), ''), agent_stack[-1]) AS agent,
+    coagent_event_string(event_data, 'tool_response', 'tool_name') AS tool,
+    toUInt64(count()) AS events,
+    toUInt64(countIf(section = 'error' OR coagent_event_raw(event_data, section, 'success') = 'false')) AS errors,
+    sum(coagent_event_uint(event_data, 'llm_response', 'input_tokens')) AS input_tokens,
+    sum(coagent_event_uint(event_data, 'llm_response', 'output_tokens')) AS output_tokens,
+    sum(coagent_event_uint(event_data, 'llm_response', 'total_tokens')) AS total_tokens,
+    sum(duration_ms) AS duration_ms_sum,
+    toUInt64(countIf(duration_ms > 0)) AS duration_ms_count,
+    quantilesTDigestStateIf(0.5, 0.95, 0.99)(duration_ms, duration_ms > 0) AS duration_ms_quantiles
+FROM log_entries
+WHERE event_type IN ('llm_response', 'tool_response', 'error')
+GROUP BY bucket, event_type, model, agent, tool;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS usage_rollups_1h_mv TO usage_rollups_1h AS
+WITH
+    toString(event_type) AS section,
+    coagent_event_uint(event_data, section, 'execution_time_ms') AS duration_ms
+SELECT
+    toStartOfHour(timestamp) AS bucket,
+    section AS event_type,
+    coagent_event_string(meta, 'meta', 'model') AS model,
+    coalesce(nullIf(coagent_event_string(meta, 'meta', 'issuer'), ''), agent_stack[-1]) AS agent,
+    coagent_event_string(event_data, 'tool_response', 'tool_name') AS tool,
+    toUInt64(count()) AS events,
+    toUInt64(countIf(section = 'error' OR coagent_event_raw(event_data, section, 'success') = 'false')) AS errors,
+    sum(coagent_event_uint(event_data, 'llm_response', 'input_tokens')) AS input_tokens,
+    sum(coagent_event_uint(event_data, 'llm_response', 'output_tokens')) AS output_tokens,
+    sum(coagent_event_uint(event_data, 'llm_response', 'total_tokens')) AS total_tokens,
+    sum(duration_ms) AS duration_ms_sum,
+    toUInt64(countIf(duration_ms > 0)) AS duration_ms_count,
+    quantilesTDigestStateIf(0.5, 0.95, 0.99)(duration_ms, duration_ms > 0) AS duration_ms_quantiles
+FROM log_entries
+WHERE event_type IN ('llm_response', 'tool_response', 'error')
+GROUP BY bucket, event_type, model, agent, tool;
+
+-- Backfill from existing entries, once
+INSERT INTO usage_rollups_1h
+WITH
+    toString(event_type) AS section,
+    coagent_event_uint(event_data, section, 'execution_time_ms') AS duration_ms
+SELECT
+    toStartOfHour(timestamp) AS bucket,
+    section AS event_type,
+    coagent_event_string(meta, 'meta', 'model') AS model,
+    coalesce(nullIf(coagent_event_string(meta, 'meta', 'issuer'), ''), agent_stack[-1]) AS agent,
+    coagent_event_string(event_data, 'tool_response', 'tool_name') AS tool,
+    toUInt64(count()),
+    toUInt64(countIf(section = 'error' OR coagent_event_raw(event_data, section, 'success') = 'false')),
+    sum(coagent_event_uint(event_data, 'llm_response', 'input_tokens')),
+    sum(coagent_event_uint(event_data, 'llm_response', 'output_tokens')),
+    sum(coagent_event_uint(event_data, 'llm_response', 'total_tokens')),
+    sum(duration_ms),
+    toUInt64(countIf(duration_ms > 0)),
+    quantilesTDigestStateIf(0.5, 0.95, 0.99)(duration_ms, duration_ms > 0)
+FROM log_entries
+WHERE event_type IN ('llm_response', 'tool_response', 'error')
+    AND (SELECT count() FROM usage_rollups_1h) = 0
+GROUP BY bucket, event_type, model, agent, tool;
+
+INSERT INTO usage_rollups_1m
+WITH
+    toString(event_type) AS section,
+    coagent_event_uint(event_data, section, 'execution_time_ms') AS duration_ms
+SELECT
+    toStartOfMinute(timestamp) AS bucket,
+    section AS event_type,
+    coagent_event_string(meta, 'meta', 'model') AS model,
+    coalesce(nullIf(coagent_event_string(meta, 'meta', 'issuer'), ''), agent_stack[-1]) AS agent,
+    coagent_event_string(event_data, 'tool_response', 'tool_name') AS tool,
+    toUInt64(count()),
+    toUInt64(countIf(section = 'error' OR coagent_event_raw(event_data, section, 'success') = 'false')),
+    sum(coagent_event_uint(event_data, 'llm_response', 'input_tokens')),
+    sum(coagent_event_uint(event_data, 'llm_response', 'output_tokens')),
+    sum(coagent_event_uint(event_data, 'llm_response', 'total_tokens')),
+    sum(duration_ms),
+    toUInt64(countIf(duration_ms > 0)),
+    quantilesTDigestStateIf(0.5, 0.95, 0.99)(duration_ms, duration_ms > 0)
+FROM log_entries
+WHERE event_type IN ('llm_response', 'tool_response', 'error')
+    AND (SELECT count() FROM usage_rollups_1m) = 0
+GROUP BY bucket, event_type, model, agent, tool;
@@ -0,0 +1,88 @@
+-- Prompts of llm_call entries logged as content-addressed chunks
+--
+-- The examples log each prompt as a list of message hashes plus the messages
+-- not yet sent in the session (prompt_dedup.py), in the prompt_chunks
+-- property, which the CoAgent server stores in additional_properties:
+--
+--   {"refs": ["<hash>", ...], "chunks": [{"hash": "<hash>", "text": "..."}], "separator": "\n"}
+--
+-- Consecutive prompts of an issuer may be sent as a delta: the first
+-- base_length refs of the llm_call entry with event_id base, then refs.
+--
+--   {"base": "<event_id>", "base_length": 14, "refs": [...], "chunks": [...], "separator": "\n"}
+--
+-- Every session carries all of its chunks and bases, so session_prompts
+-- rebuilds the prompts of one session from that session's entries alone:
+--
+--   SELECT event_id, prompt FROM coagent.session_prompts(session_id = 'abc')
+--
+-- Entries logged with a plain prompt are returned as they are. Adding the
+-- view to an existing volume only needs this script to be run, e.g.:
+--
+--   docker-compose exec -T clickhouse clickhouse-client --user coagent --password coagent \
+--     --multiquery < config/clickhouse/initdb.d/06-session-prompts.sql
+USE coagent;
+
+CREATE VIEW IF NOT EXISTS session_prompts AS
+WITH
+    ifNull(toJSONString(additional_properties), '{}') AS properties,
+    full_refs[event_id] AS refs,
+    -- hash -> text of every chunk the session carries
+    (
+        SELECT CAST((groupArray(chunk.1), groupArray(chunk.2)), 'Map(String, String)')
+        FROM log_entries
+        ARRAY JOIN JSONExtract(
+            ifNull(toJSONString(additional_properties), '{}'),
+            'prompt_chunks', 'chunks', 'Array(Tuple(hash String, text String))'
+        ) AS chunk
+        WHERE session_id = {session_id:String} AND event_type = 'llm_call'
+    ) AS chunks,
+    -- event_id -> full refs of every prompt, materializing deltas (base and
+    -- base_length) in order; a missing base leaves a marker for its prefix
+    (
+        SELECT arrayFold(
+            (acc, e) -> mapUpdate(acc, map(e.1, arrayConcat(
+                if(e.2 = '' OR mapContains(acc, e.2), arraySlice(acc[e.2], 1, e.3), [concat('missing-base:', e.2)]),
+                e.4
+            ))),
+            arraySort(e -> (e.5, e.1), groupArray((event_id, base, base_length, delta_refs, timestamp))),
+            CAST(map(), 'Map(String, Array(String))')
+        )
+        FROM
+        (
+            SELECT
+                event_id,
+                timestamp,
+                ifNull(toJSONString(additional_properties), '{}') AS block_properties,
+                JSONExtractString(block_properties, 'prompt_chunks', 'base') AS base,
+                JSONExtractUInt(block_properties, 'prompt_chunks', 'base_length') AS base_length,
+                JSONExtract(block_properties, 'prompt_chunks', 'refs', 'Array(String)') AS delta_refs
+            FROM log_entries
+            WHERE session_id = {session_id:String} AND event_type = 'llm_call'
+                AND JSONHas(block_properties, 'prompt_chunks')
+        )
+    ) AS full_refs
+SELECT
+    timestamp,
+    event_id,
+    prompt_number,
+    turn_number,
+    if(
+        JSONHas(properties, 'prompt_chunks'),
+        -- The separator is per entry, and arrayStringConcat only takes a constant
+        arrayStringConcat(arrayMap(
+            (h, i) -> concat(
+                if(i = 1, '', JSONExtractString(properties, 'prompt_chunks', 'separator')),
+                multiIf(
+                    mapContains(chunks, h), chunks[h],
+                    startsWith(h, 'missing-base:'), concat('[missing prompt of ', substring(h, 14), ']'),
+                    concat('[missing prompt chunk ', h, ']')
+                )
+            ),
+            refs, arrayEnumerate(refs)
+        )),
+        ifNull(prompt, '')
+    ) AS prompt
+FROM log_entries
+WHERE session_id = {session_id:String} AND event_type = 'llm_call'
+ORDER BY timestamp, event_id;
@@ -0,0 +1,133 @@
+-- Time to first token and inter-token latency of streamed LLM responses
+--
+-- The examples time the chunks of streamed model responses (stream_timing.py)
+-- and log the report with the llm_response entry, in the stream_timing
+-- property, which the CoAgent server stores in additional_properties:
+--
+--   {"ttft_ms": 412.5, "stream_ms": 3180.2, "chunks": 240, "tokens_per_second": 75.1,
+--    "inter_token_ms": {"p50": 12.1, "p90": 19.8, "p99": 41.0, "max": 88.3}}
+--
+-- stream_rollups_1m and stream_rollups_1h are filled by materialized views as
+-- entries arrive, grouped by model and agent like usage_rollups_1m. Time to
+-- first token, and the median and p99 inter-token gap of each call, are kept
+-- as t-digest quantile states, so a regression in time to first token shows
+-- even when total durations in the usage rollups don't move. See
+-- tools/metrics_query.py --stream.
+--
+-- Apply after 05-usage-rollups.sql, which defines coagent_event_string. To add
+-- the rollups to an existing volume, stop coagent-core and run this script as
+-- described in the header of 04-session-summaries.sql.
+USE coagent;
+
+CREATE TABLE IF NOT EXISTS stream_rollups_1m (
+    bucket DateTime CODEC(Delta, ZSTD(1)),
+    model LowCardinality(String),
+    agent LowCardinality(String),
+    streamed_calls SimpleAggregateFunction(sum, UInt64),
+    ttft_ms_sum SimpleAggregateFunction(sum, Float64),
+    ttft_ms_quantiles AggregateFunction(quantilesTDigest(0.5, 0.95, 0.99), Float64),
+    inter_token_p50_ms_quantiles AggregateFunction(quantilesTDigest(0.5, 0.95, 0.99), Float64),
+    inter_token_p99_ms_quantiles AggregateFunction(quantilesTDigest(0.5, 0.95, 0.99), Float64),
+    tokens_per_second_sum SimpleAggregateFunction(sum, Float64),
+    tokens_per_second_count SimpleAggregateFunction(sum, UInt64)
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(bucket)
+ORDER BY (bucket, model, agent);
+
+CREATE TABLE IF NOT EXISTS stream_rollups_1h AS stream_rollups_1m;
+
+-- Both views share the row shape below; only the bucket differs
+CREATE MATERIALIZED VIEW IF NOT EXISTS stream_rollups_1m_mv TO stream_rollups_1m AS
+WITH
+    ifNull(toJSONString(additional_properties), '{}') AS properties,
+    JSONExtractFloat(properties, 'stream_timing', 'ttft_ms') AS ttft_ms,
+    JSONExtract(properties, 'stream_timing', 'inter_token_ms', 'p50', 'Nullable(Float64)') AS inter_token_p50_ms,
+    JSONExtract(properties, 'stream_timing', 'inter_token_ms', 'p99', 'Nullable(Float64)') AS inter_token_p99_ms,
+    JSONExtract(properties, 'stream_timing', 'tokens_per_second', 'Nullable(Float64)') AS tokens_per_second
+SELECT
+    toStartOfMinute(timestamp) AS bucket,
+    coagent_event_string(meta, 'meta', 'model') AS model,
+    coalesce(nullIf(coagent_event_string(meta, 'meta', 'issuer'), ''), agent_stack[-1]) AS agent,
+    toUInt64(count()) AS streamed_calls,
+    sum(ttft_ms) AS ttft_ms_sum,
+    quantilesTDigestState(0.5, 0.95, 0.99)(ttft_ms) AS ttft_ms_quantiles,
+    quantilesTDigestStateIf(0.5, 0.95, 0.99)(assumeNotNull(inter_token_p50_ms), inter_token_p50_ms IS NOT NULL)
+        AS inter_token_p50_ms_quantiles,
+    quantilesTDigestStateIf(0.5, 0.95, 0.99)(assumeNotNull(inter_token_p99_ms), inter_token_p99_ms IS NOT NULL)
+        AS inter_token_p99_ms_quantiles,
+    sum(ifNull(tokens_per_second, 0)) AS tokens_per_second_sum,
+    toUInt64(countIf(tokens_per_second IS NOT NULL)) AS tokens_per_second_count
+FROM log_entries
+WHERE event_type = 'llm_response' AND JSONHas(properties, 'stream_timing')
+GROUP BY bucket, model, agent;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS stream_rollups_1h_mv TO stream_rollups_1h AS
+WITH
+    ifNull(toJSONString(additional_properties), '{}') AS properties,
+    JSONExtractFloat(properties, 'stream_timing', 'ttft_ms') AS ttft_ms,
+    JSONExtract(properties, 'stream_timing', 'inter_token_ms', 'p50', 'Nullable(Float64)') AS inter_token_p50_ms,
+    JSONExtract(properties, 'stream_timing', 'inter_token_ms', 'p99', 'Nullable(Float64)') AS inter_token_p99_ms,
+    JSONExtract(properties, 'stream_timing', 'tokens_per_second', 'Nullable(Float64)') AS tokens_per_second
+SELECT
+    toStartOfHour(timestamp) AS bucket,
+    coagent_event_string(meta, 'meta', 'model') AS model,
+    coalesce(nullIf(coagent_event_string(meta, 'meta', 'issuer'), ''), agent_stack[-1]) AS agent,
+    toUInt64(count()) AS streamed_calls,
+    sum(ttft_ms) AS ttft_ms_sum,
+    quantilesTDigestState(0.5, 0.95, 0.99)(ttft_ms) AS ttft_ms_quantiles,
+    quantilesTDigestStateIf(0.5, 0.95, 0.99)(assumeNotNull(inter_token_p50_ms), inter_token_p50_ms IS NOT NULL)
+        AS inter_token_p50_ms_quantiles,
+    quantilesTDigestStateIf(0.5, 0.95, 0.99)(assumeNotNull(inter_token_p99_ms), inter_token_p99_ms IS NOT NULL)
+        AS inter_token_p99_ms_quantiles,
+    sum(ifNull(tokens_per_second, 0)) AS tokens_per_second_sum,
+    toUInt64(countIf(tokens_per_second IS NOT NULL)) AS tokens_per_second_count
+FROM log_entries
+WHERE event_type = 'llm_response' AND JSONHas(properties, 'stream_timing')
+GROUP BY bucket, model, agent;
+
+-- Backfill from existing entries, once
+INSERT INTO stream_rollups_1h
+WITH
+    ifNull(toJSONString(additional_properties), '{}') AS properties,
+    JSONExtractFloat(properties, 'stream_timing', 'ttft_ms') AS ttft_ms,
+    JSONExtract(properties, 'stream_timing', 'inter_token_ms', 'p50', 'Nullable(Float64)') AS inter_token_p50_ms,
+    JSONExtract(properties, 'stream_timing', 'inter_token_ms', 'p99', 'Nullable(Float64)') AS inter_token_p99_ms,
+    JSONExtract(properties, 'stream_timing', 'tokens_per_second', 'Nullable(Float64)') AS tokens_per_second
+SELECT
+    toStartOfHour(timestamp) AS bucket,
+    coagent_event_string(meta, 'meta', 'model') AS model,
+    coalesce(nullIf(coagent_event_string(meta, 'meta', 'issuer'), ''), agent_stack[-1]) AS agent,
+    toUInt64(count()),
+    sum(ttft_ms),
+    quantilesTDigestState(0.5, 0.95, 0.99)(ttft_ms),
+    quantilesTDigestStateIf(0.5, 0.95, 0.99)(assumeNotNull(inter_token_p50_ms), inter_token_p50_ms IS NOT NULL),
+    quantilesTDigestStateIf(0.5, 0.95, 0.99)(assumeNotNull(inter_token_p99_ms), inter_token_p99_ms IS NOT NULL),
+    sum(ifNull(tokens_per_second, 0)),
+    toUInt64(countIf(tokens_per_second IS NOT NULL))
+FROM log_entries
+WHERE event_type = 'llm_response' AND JSONHas(properties, 'stream_timing')
+    AND (SELECT count() FROM stream_rollups_1h) = 0
+GROUP BY bucket, model, agent;
+
+INSERT INTO stream_rollups_1m
+WITH
+    ifNull(toJSONString(additional_properties), '{}') AS properties,
+    JSONExtractFloat(properties, 'stream_timing', 'ttft_ms') AS ttft_ms,
+    JSONExtract(properties, 'stream_timing', 'inter_token_ms', 'p50', 'Nullable(Float64)') AS inter_token_p50_ms,
+    JSONExtract(properties, 'stream_timing', 'inter_token_ms', 'p99', 'Nullable(Float64)') AS inter_token_p99_ms,
+    JSONExtract(properties, 'stream_timing', 'tokens_per_second', 'Nullable(Float64)') AS tokens_per_second
+SELECT
+    toStartOfMinute(timestamp) AS bucket,
+    coagent_event_string(meta, 'meta', 'model') AS model,
+    coalesce(nullIf(coagent_event_string(meta, 'meta', 'issuer'), ''), agent_stack[-1]) AS agent,
+    toUInt64(count()),
+    sum(ttft_ms),
+    quantilesTDigestState(0.5, 0.95, 0.99)(ttft_ms),
+    quantilesTDigestStateIf(0.5, 0.95, 0.99)(assumeNotNull(inter_token_p50_ms), inter_token_p50_ms IS NOT NULL),
+    quantilesTDigestStateIf(0.5, 0.95, 0.99)(assumeNotNull(inter_token_p99_ms), inter_token_p99_ms IS NOT NULL),
+    sum(ifNull(tokens_per_second, 0)),
+    toUInt64(countIf(tokens_per_second IS NOT NULL))
+FROM log_entries
+WHERE event_type = 'llm_response' AND JSONHas(properties, 'stream_timing')
+    AND (SELECT count() FROM stream_rollups_1m) = 0
+GROUP BY bucket, model, agent;
@@ -1,25 +1,30 @@
 import asyncio
+import os
+
 import aioconsole
 
-from coa_dev_coagent import CoagentClient
 from datetime import datetime
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.runners import InMemoryRunner
 from google.genai.types import Content, Part
 
 from .agent import get_root_agent
 from .coa_plugin import CoaPlugin
+from .coagent_clients import shared_async_client, shared_client
 from .json import pretty_print_json
 
 APP_NAME = 'financial_coordinator'
 USER_ID = 'coa_user'
+# Stream model responses, so the plugin can time the first token
+STREAMING = os.environ.get('ADK_STREAMING', '1') != '0'
 
 async def main():
-    coa = CoagentClient()
+    coa_plugin = CoaPlugin(coa=shared_client())
 
     runner = InMemoryRunner(
         agent=get_root_agent(),
         app_name=APP_NAME,
-        plugins=[CoaPlugin(coa=coa)],
+        plugins=[coa_plugin],
     )
 
     print("Starting interactive session with the Financial Coordinator agent.")
@@ -31,39 +36,49 @@ async def main():
 
     print(f"Session created: {session.id}")
 
-    while True:
-        user_query = await aioconsole.ainput('[user]: ')
-
-        print(f"[debug] User query received: {user_query}")
-
-        if user_query.lower() in ['exit', 'quit']:
-            print("Exiting the conversation.")
-            break
-
-        new_message = Content(role='user', parts=[Part(text=user_query)])
-
-        print(f"[debug] Created new message: {new_message}")
-
-        events = runner.run_async(
-            user_id=USER_ID,
-            session_id=session.id,
-            new_message=new_message,
-        )
-
-        print("[debug] Processing events...")
-
-        final_response = ""
-        i = 0
-
-        async for event in events:
-            print(f"[event {i}]: {event}")
-
-            i += 1
-            if hasattr(event, 'author') and event.author == 'financial_coordinator':
-                if event.is_final_response():
-                    final_response = event.content.parts[0].text
-                    pretty = pretty_print_json(final_response, title="Final Response Event")
-                    print(pretty)
+    try:
+        while True:
+            user_query = await aioconsole.ainput('[user]: ')
+
+            print(f"[debug] User query received: {user_query}")
+
+            if user_query.lower() in ['exit', 'quit']:
+                print("Exiting the conversation.")
+                break
+
+            new_message = Content(role='user', parts=[Part(text=user_query)])
+
+            print(f"[debug] Created new message: {new_message}")
+
+            events = runner.run_async(
+                user_id=USER_ID,
+                session_id=session.id,
+                new_message=new_message,
+                run_config=RunConfig(
+                    streaming_mode=StreamingMode.SSE if STREAMING else StreamingMode.NONE,
+                ),
+            )
+
+            print("[debug] Processing events...")
+
+            final_response = ""
+            i = 0
+
+            async for event in events:
+                if event.partial:
+                    # Chunks of a streamed response, repeated by the final event
+                    continue
+                print(f"[event {i}]: {event}")
+
+                i += 1
+                if hasattr(event, 'author') and event.author == 'financial_coordinator':
+                    if event.is_final_response():
+                        final_response = event.content.parts[0].text
+                        pretty = pretty_print_json(final_response, title="Final Response Event")
+                        print(pretty)
+    finally:
+        await coa_plugin.close()
+        await shared_async_client().aclose()
 
 if __name__ == "__main__":
   asyncio.run(main())
@@ -1,5 +1,7 @@
 """Financial coordinator: provide reasonable investment strategies."""
 
+import os
+
 from dotenv import load_dotenv
 from google.adk.agents import LlmAgent
 from google.adk.tools.agent_tool import AgentTool
@@ -8,6 +10,7 @@ from agent import root_agent
 
 from . import prompt
 from .config import get_gemini_model
+from .fan_out import FanOutAgent
 from .sub_agents.data_analyst import data_analyst_agent
 from .sub_agents.execution_analyst import execution_analyst_agent
 from .sub_agents.risk_analyst import risk_analyst_agent
@@ -15,7 +18,51 @@ from .sub_agents.trading_analyst import trading_analyst_agent
 
 load_dotenv()
 
-def get_root_agent() -> LlmAgent:
+# Each analyst and the analysts whose results it builds on; execution and
+# risk analysis only need the trading strategies, so they run side by side
+ADVISORY_GRAPH = [
+    (data_analyst_agent, []),
+    (trading_analyst_agent, [data_analyst_agent]),
+    (execution_analyst_agent, [trading_analyst_agent]),
+    (risk_analyst_agent, [data_analyst_agent, trading_analyst_agent]),
+]
+
+
+def get_advisory_agent(max_concurrency: int | None = None) -> FanOutAgent:
+    """The four analysts as one agent, running independent ones concurrently."""
+    if max_concurrency is None:
+        max_concurrency = int(os.environ.get("ADK_FAN_OUT_CONCURRENCY", 2))
+    return FanOutAgent.from_graph(
+        name="financial_advisory",
+        description=(
+            "analyze a market ticker, develop trading strategies for the "
+            "user's risk attitude and investment period, then define an "
+            "execution plan and evaluate the overall risk of the strategies."
+        ),
+        graph=ADVISORY_GRAPH,
+        max_concurrency=max_concurrency,
+    )
+
+
+def get_root_agent(fan_out: bool | None = None) -> LlmAgent:
+    """
+    The coordinator calls the analysts one at a time, or with `fan_out` (the
+    `ADK_FAN_OUT` environment variable by default) all at once through
+    `get_advisory_agent()`.
+    """
+    if fan_out is None:
+        fan_out = os.environ.get("ADK_FAN_OUT", "0") != "0"
+    if fan_out:
+        instruction = prompt.FINANCIAL_COORDINATOR_FAN_OUT_PROMPT
+        tools = [AgentTool(agent=get_advisory_agent())]
+    else:
+        instruction = prompt.FINANCIAL_COORDINATOR_PROMPT
+        tools = [
+            AgentTool(agent=data_analyst_agent),
+            AgentTool(agent=trading_analyst_agent),
+            AgentTool(agent=execution_analyst_agent),
+            AgentTool(agent=risk_analyst_agent),
+        ]
     return LlmAgent(
         model=get_gemini_model(),
         name="financial_coordinator",
@@ -25,14 +72,9 @@ def get_root_agent() -> LlmAgent:
             "analyze a market ticker, develop trading strategies, define "
             "execution plans, and evaluate the overall risk."
         ),
-        instruction=prompt.FINANCIAL_COORDINATOR_PROMPT,
+        instruction=instruction,
         output_key="financial_coordinator_output",
-        tools=[
-            AgentTool(agent=data_analyst_agent),
-            AgentTool(agent=trading_analyst_agent),
-            AgentTool(agent=execution_analyst_agent),
-            AgentTool(agent=risk_analyst_agent),
-        ],
+        tools=tools,
     )
 
 root_agent = get_root_agent()
@@ -1,11 +1,19 @@
-import time
+import json
+import logging
+import os
 
-from typing import Any
+from typing import Any, Callable
 
 from coa_dev_coagent import CoagentClient
 from coa_dev_coagent.logapi import (
+    create_error_log,
+    create_llm_call_log,
+    create_llm_response_log,
+    create_session_end_log,
+    create_session_start_log,
     create_tool_call_log,
     create_tool_response_log,
+    create_user_input_log,
 )
 
 from google.adk.agents.base_agent import BaseAgent
@@ -17,113 +25,214 @@ from google.adk.plugins.base_plugin import BasePlugin
 from google.adk.tools.base_tool import BaseTool
 from google.adk.tools.tool_context import ToolContext
 
+from . import hook_logging, stream_timing
+from .coagent_clients import shared_async_client, shared_client
+from .instrumentation import Instrumentation
+from .log_shipper import LogShipper
+from .log_spool import LogSpool
+from .payload_governor import DEFAULT_BLOB_DIR, BlobStore, PayloadGovernor
+from .prompt_dedup import PromptDeduplicator
+from .response_cache import CACHE_FIELD, ResponseCache, cache_key
+from .session_sampler import SessionSampler
+from .spans import Span, SpanTracker
+
+log = logging.getLogger("coagent.plugin")
+
 class CoaPlugin(BasePlugin):
     """CoAgent + ADK Agent Lifecycle Callback Integration."""
 
-    def __init__(self, coa: CoagentClient) -> None:
-        """Initialize the plugin with counters."""
-        print("Initializing CoaPlugin...")
+    def __init__(
+        self,
+        coa: CoagentClient | None = None,
+        shipper: LogShipper | None = None,
+        cache: ResponseCache | None = None,
+    ) -> None:
+        """Initialize the plugin with counters.
+
+        Log entries are handed to `shipper`, which batches them without
+        blocking the event loop. When omitted, a `LogShipper` is created that
+        sends with the shared `AsyncCoagentClient` and spools undeliverable
+        batches to `COAGENT_SPOOL_DIR` (default `.coagent_spool`). `coa`
+        defaults to the shared `CoagentClient`.
+
+        Model calls answered before are answered from `cache`, which is
+        configured from the environment when omitted (off by default).
+        """
         super().__init__(name="coa_plugin")
+        coa = coa or shared_client()
         self.coa = coa
         # Keep backward-compatible alias used by logging helpers
         self.client = coa
+        self.shipper = shipper or LogShipper(
+            coa,
+            spool=LogSpool(coa, directory=os.environ.get("COAGENT_SPOOL_DIR", ".coagent_spool")),
+            async_client=shared_async_client(),
+        )
+        # Prompts are logged as content-addressed message chunks, with
+        # COAGENT_PROMPT_DEDUP=1; a session whose entries are lost sends its
+        # next prompt whole
+        self.prompt_dedup = PromptDeduplicator()
+        self.shipper.on_drop = self.prompt_dedup.forget
+        if self.shipper.spool is not None:
+            self.shipper.spool.on_drop = self.prompt_dedup.forget
+        # Sessions outside the head sample are only logged when they fail, run
+        # slow or use many tokens; prompt chunks of dropped runs are sent again
+        self.sampler = SessionSampler(self.shipper.submit, on_drop=self.prompt_dedup.forget)
+        # Oversized tool arguments and results are truncated; a sample of them
+        # is kept whole in a local blob store
+        self.payloads = PayloadGovernor(
+            blob_store=BlobStore(os.environ.get("COAGENT_BLOB_DIR", DEFAULT_BLOB_DIR))
+        )
+        # Events and content to log, from COAGENT_LOG_LEVEL; callbacks return
+        # right away when logging is off, and entries that won't be logged
+        # are never built
+        self.instrumentation = Instrumentation(self.sampler.offer, accepts=self.sampler.accepts)
+        # Callbacks log through a queue, so they never wait on stdout
+        hook_logging.configure_logging(logging.DEBUG if self.instrumentation.debug_enabled else logging.INFO)
+        self.instrumentation.debug("Initializing CoaPlugin...")
 
         # Counters
         self.agent_count: int = 0
         self.llm_request_count: int = 0
         self.llm_response_count: int = 0
         self.error_count: int = 0
-        self.turn_number: dict[str, int] = {}
+        # Turns per (session, branch); parallel agents count on their own branch
+        self.turn_number: dict[tuple[str, str | None], int] = {}
         self.prompt_number: dict[str, int] = {}
 
-        # Track request start times to compute durations
-        self.request_start_times: dict[str, float] = {}
+        # Open run, agent, model and tool spans, timed with a monotonic clock
+        self.spans = SpanTracker()
+        # Open runs per session; a run nested in another on the same session
+        # doesn't end it
+        self._open_runs: dict[str, int] = {}
+
+        # Responses of earlier identical model calls; keys of the calls
+        # waiting for their response, by invocation and branch or agent
+        self.cache = cache if cache is not None else ResponseCache.from_env()
+        self._cache_keys: dict[tuple[str, str], str] = {}
+
+    async def before_run_callback(
+        self, *, invocation_context: InvocationContext
+    ) -> None:
+        """Open the span of the run that agent, model and tool spans nest under."""
+        if not self.instrumentation.active:
+            return None
+        session_id = invocation_context.session.id
+        self._open_runs[session_id] = self._open_runs.get(session_id, 0) + 1
+        self.spans.start_run(invocation_context.invocation_id)
 
     async def before_agent_callback(
         self, *, agent: BaseAgent, callback_context: CallbackContext
     ) -> None:
+        if not self.instrumentation.active:
+            return None
         session = callback_context.session.id
         try:
             self.agent_count += 1
-            print(f"[Plugin] Before agent callback #{self.agent_count} for agent: {agent.name}")
+            self.instrumentation.debug("Before agent callback #%s for agent: %s", self.agent_count, agent.name)
+            self.spans.start_agent(
+                callback_context.invocation_id, agent.name, self._branch(callback_context)
+            )
 
             # Increment turn number for new agent interaction
-            self._get_turn_number(session, increment=True)
+            self._get_turn_number(session, increment=True, branch=self._branch(callback_context))
         except Exception as e:
-            print(f"[Plugin] Error in before_agent_callback: {e}")
-            await self._log_error(session, f"before_agent_callback error: {e}")
+            log.error("Error in before_agent_callback: %s", e)
+            await self._log_error(session, f"before_agent_callback error: {e}", self._branch(callback_context))
 
     async def before_model_callback(
         self, *, callback_context: CallbackContext, llm_request: LlmRequest
-    ) -> None:
+    ) -> LlmResponse | None:
+        # Answers the call from the cache, with or without logging
+        cached = self._cached_response(callback_context, llm_request)
+        if not self.instrumentation.active:
+            return cached
         session = callback_context.session.id
         try:
             self.llm_request_count += 1
-            request_id = f"req_{self.llm_request_count}"
-            self.request_start_times[request_id] = time.time()
-            print(f"[Plugin] Before model callback #{self.llm_request_count} for model: {llm_request.model}")
-
-            if hasattr(callback_context, 'metadata'):
-                callback_context.metadata = callback_context.metadata or {}
-                callback_context.metadata['request_id'] = request_id
-
-            # Extract prompt primarily from LlmRequest.contents (list[types.Content])
-            prompt = ""
-            try:
-                contents = getattr(llm_request, "contents", None)
-                prompt = self._extract_text_from_contents(contents)
-                if not prompt:
-                    # Secondary fallbacks if some other field is used
-                    if hasattr(llm_request, "prompt") and llm_request.prompt:
-                        prompt = str(llm_request.prompt)
-                    elif hasattr(llm_request, "input") and llm_request.input:
-                        prompt = str(llm_request.input)
-            except Exception:
-                # Fall back to stringifying the request
-                try:
-                    prompt = str(llm_request)
-                except Exception:
-                    prompt = ""
+            self.instrumentation.debug(
+                "Before model callback #%s for model: %s", self.llm_request_count, llm_request.model
+            )
+            span = self.spans.start_model(
+                callback_context.invocation_id,
+                callback_context.agent_name,
+                self._branch(callback_context),
+                model=llm_request.model,
+            )
+            # Times the chunks of a streamed response
+            span.attributes["stream"] = stream_timing.StreamTimer(span.start_ns)
 
             agent_name = callback_context.agent_name
             # Mirror smolagents: log raw LLM call details early
             try:
-                self.client.log_llm_call_new(
+                self.instrumentation.emit(session, "llm_call", lambda: create_llm_call_log(
                     session_id=session,
                     issuer=agent_name or "unknown-agent",
-                    prompt=prompt,
                     prompt_number=self._get_prompt_number(session),
-                    turn_number=self._get_turn_number(session),
-                )
+                    turn_number=self._get_turn_number(session, branch=self._branch(callback_context)),
+                    meta={"model": llm_request.model or "", **span.meta()},
+                    # Messages sent in earlier calls are only referenced by hash
+                    **self.instrumentation.content(
+                        lambda: self.prompt_dedup.log_fields(
+                            session, self._request_messages(llm_request), issuer=agent_name
+                        ),
+                        {"prompt": None},
+                    ),
+                ))
             except Exception as e:
-                print(f"[Plugin] Failed to log LLM call: {e}")
+                log.error("Failed to log LLM call: %s", e)
+
+            if cached is not None:
+                # The model isn't called, so after_model_callback won't be either
+                self.llm_response_count += 1
+                span = self.spans.end_model(
+                    callback_context.invocation_id, agent_name, self._branch(callback_context)
+                )
+                await self._log_llm_response(
+                    session, cached, agent_name, span, self._branch(callback_context),
+                    cache=cached.custom_metadata[CACHE_FIELD],
+                )
 
         except Exception as e:
-            print(f"[Plugin] Error in before_model_callback: {e}")
-            await self._log_error(session, f"before_model_callback error: {e}")
+            log.error("Error in before_model_callback: %s", e)
+            await self._log_error(session, f"before_model_callback error: {e}", self._branch(callback_context))
+        return cached
 
     async def after_model_callback(
         self, *, callback_context: CallbackContext, llm_response: LlmResponse
     ) -> None:
+        cached = self._cache_response(callback_context, llm_response)
+        if not self.instrumentation.active:
+            return None
         session = callback_context.session.id
         try:
-            self.llm_response_count += 1
-
-            request_id = None
-            if hasattr(callback_context, 'metadata') and callback_context.metadata:
-                request_id = callback_context.metadata.get('request_id')
+            if getattr(llm_response, "partial", None):
+                # A chunk of a streamed response; the call ends with the final one
+                span = self.spans.model(
+                    callback_context.invocation_id,
+                    callback_context.agent_name,
+                    self._branch(callback_context),
+                )
+                if span is not None:
+                    span.attributes["stream"].chunk()
+                return None
 
-            duration_ms = 0
-            if request_id and request_id in self.request_start_times:
-                duration_ms = int((time.time() - self.request_start_times[request_id]) * 1000)
-                del self.request_start_times[request_id]
+            self.llm_response_count += 1
+            span = self.spans.end_model(
+                callback_context.invocation_id,
+                callback_context.agent_name,
+                self._branch(callback_context),
+            )
 
-            print(f"[Plugin] After model callback #{self.llm_response_count}")
-            await self._log_llm_response(session,llm_response, duration_ms)
+            self.instrumentation.debug("After model callback #%s", self.llm_response_count)
+            await self._log_llm_response(
+                session, llm_response, callback_context.agent_name, span, self._branch(callback_context),
+                cache={"hit": False, "stored": cached} if cached is not None else None,
+            )
 
         except Exception as e:
-            print(f"[Plugin] Error in after_model_callback: {e}")
-            await self._log_error(session, f"after_model_callback error: {e}")
+            log.error("Error in after_model_callback: %s", e)
+            await self._log_error(session, f"after_model_callback error: {e}", self._branch(callback_context))
 
     async def before_tool_callback(
         self,
@@ -133,23 +242,31 @@ class CoaPlugin(BasePlugin):
         tool_context: ToolContext,
     ) -> None:
         """Callback executed before a tool is called. Logs the tool call when possible."""
+        if not self.instrumentation.active:
+            return None
         try:
-            print(f"[Plugin] Before tool callback for tool: {tool.name}")
+            self.instrumentation.debug("Before tool callback for tool: %s", tool.name)
             session_id = tool_context.session.id
 
             tool_name = tool.name
             pn = self._get_prompt_number(session_id)
-            tn = self._get_turn_number(session_id)
+            tn = self._get_turn_number(session_id, branch=self._branch(tool_context))
+            span = self.spans.start_tool(
+                tool_context.invocation_id,
+                self._call_id(tool, tool_context),
+                tool_name,
+                tool_context.agent_name,
+                self._branch(tool_context),
+            )
 
-            self.client.store_log(
-                create_tool_call_log(
-                    session_id=session_id,
-                    prompt_number=pn,
-                    turn_number=tn,
-                    tool_name=tool_name,
-                    parameters=tool_args,
-                    )
-                )
+            self.instrumentation.emit(session_id, "tool_call", lambda: create_tool_call_log(
+                session_id=session_id,
+                prompt_number=pn,
+                turn_number=tn,
+                tool_name=tool_name,
+                parameters=self.instrumentation.content(lambda: self.payloads.govern("parameters", tool_args)),
+                meta=span.meta(),
+            ))
         except Exception:
             # Swallow logging errors; do not affect tool execution
             pass
@@ -164,30 +281,32 @@ class CoaPlugin(BasePlugin):
         result: dict,
     ) -> None:
         """Callback executed after a tool is called. Logs the tool response when possible."""
+        if not self.instrumentation.active:
+            return None
         try:
-            print(f"[Plugin] After tool callback for tool: {tool.name}")
+            self.instrumentation.debug("After tool callback for tool: %s", tool.name)
             session_id = tool_context.session.id
 
             tool_name = tool.name
 
             pn = self._get_prompt_number(session_id)
-            tn = self._get_turn_number(session_id)
+            tn = self._get_turn_number(session_id, branch=self._branch(tool_context))
+            span = self.spans.end_tool(tool_context.invocation_id, self._call_id(tool, tool_context))
 
-            self.client.store_log(
-                create_tool_response_log(
-                    session_id=session_id,
-                    prompt_number=pn,
-                    turn_number=tn,
-                    tool_name=tool_name,
-                    parameters=tool_args,
-                    result=result,
-                    success=True,
-                    error_message=None,
-                    execution_time_ms=None,
-                    )
-                )
+            self.instrumentation.emit(session_id, "tool_response", lambda: create_tool_response_log(
+                session_id=session_id,
+                prompt_number=pn,
+                turn_number=tn,
+                tool_name=tool_name,
+                parameters=self.instrumentation.content(lambda: self.payloads.govern("parameters", tool_args)),
+                result=self.instrumentation.content(lambda: self.payloads.govern("result", result)),
+                success=True,
+                error_message=None,
+                execution_time_ms=span.duration_ms if span else None,
+                meta=span.meta() if span else None,
+            ))
         except Exception as e:
-            print(f"[Plugin] Error in after_tool_callback: {e}")
+            log.error("Error in after_tool_callback: %s", e)
         return None
 
     async def on_tool_error_callback(
@@ -199,58 +318,102 @@ class CoaPlugin(BasePlugin):
         error: Exception,
     ) -> None:
         """Callback executed when a tool call errors. Logs error details."""
+        if not self.instrumentation.active:
+            return None
         try:
             session_id = tool_context.session.id
 
             tool_name = tool.name
             pn = self._get_prompt_number(session_id)
-            tn = self._get_turn_number(session_id)
+            tn = self._get_turn_number(session_id, branch=self._branch(tool_context))
+            span = self.spans.end_tool(tool_context.invocation_id, self._call_id(tool, tool_context))
 
-            self.client.store_log(
-                create_tool_response_log(
-                    session_id=session_id,
-                    prompt_number=pn,
-                    turn_number=tn,
-                    tool_name=tool_name,
-                    parameters=tool_args,
-                    result=None,
-                    success=False,
-                    error_message=str(error),
-                    execution_time_ms=None,
-                    )
-                )
+            self.instrumentation.emit(session_id, "tool_response", lambda: create_tool_response_log(
+                session_id=session_id,
+                prompt_number=pn,
+                turn_number=tn,
+                tool_name=tool_name,
+                parameters=self.instrumentation.content(lambda: self.payloads.govern("parameters", tool_args)),
+                result=None,
+                success=False,
+                error_message=str(error),
+                execution_time_ms=span.duration_ms if span else None,
+                meta=span.meta() if span else None,
+            ))
 
         except Exception as e:
-            print(f"[Plugin] Error in on_tool_error_callback: {e}")
+            log.error("Error in on_tool_error_callback: %s", e)
         return None
 
     async def on_error_callback(
         self, *, callback_context: CallbackContext, error: Exception
     ) -> None:
         """Handle errors during agent execution."""
+        if not self.instrumentation.active:
+            return None
         try:
-            session = callback_context.session.id 
-            print(f"[Plugin] Error callback triggered: {error}")
-            await self._log_error(session, str(error))
+            session = callback_context.session.id
+            self.instrumentation.debug("Error callback triggered: %s", error)
+            await self._log_error(session, str(error), self._branch(callback_context))
 
         except Exception as e:
-            print(f"[Plugin] Error in on_error_callback: {e}")
+            log.error("Error in on_error_callback: %s", e)
+
+    async def after_run_callback(
+        self, *, invocation_context: InvocationContext
+    ) -> None:
+        """
+        Log the end of a top-level run, timed by its span, and ship its events
+        without waiting for the batch delay.
+        """
+        invocation_id = invocation_context.invocation_id
+        if self.cache is not None:
+            # Calls that failed never got their response
+            for key in [key for key in self._cache_keys if key[0] == invocation_id]:
+                del self._cache_keys[key]
+        if not self.instrumentation.active:
+            return None
+        session_id = invocation_context.session.id
+        try:
+            open_runs = self._open_runs.pop(session_id, 1) - 1
+            if open_runs > 0:
+                self._open_runs[session_id] = open_runs
+            else:
+                await self._log_run_end(
+                    session_id,
+                    lambda: self._final_response(invocation_context),
+                    invocation_context.agent.name,
+                    self.spans.run(invocation_id),
+                )
+        except Exception as e:
+            log.error("Error in after_run_callback: %s", e)
+        self.spans.end_run(invocation_id)
+        self.shipper.request_flush()
+
+    async def close(self) -> None:
+        """Flush pending log entries and stop the shipper."""
+        await self.shipper.close()
+        log.info("Log shipper stopped: %s", self.shipper.metrics.to_dict())
+        log.info("Session sampling: %s", self.sampler.metrics.to_dict())
+        log.info("Hook log: %s", hook_logging.metrics.to_dict())
+        if self.cache is not None:
+            log.info("Response cache: %s", self.cache.metrics.to_dict())
+            self.cache.close()
 
     async def after_agent_callback(
         self, *, agent: BaseAgent, callback_context: CallbackContext
     ) -> None:
-        """Handle agent completion - potential run end."""
+        """Close the agent's span; the run ends in `after_run_callback`."""
+        if not self.instrumentation.active:
+            return None
         session_id = callback_context.session.id
         try:
-            print(f"[Plugin] After agent callback for agent: {agent.name}")
-            result = getattr(callback_context, 'result', None)
-
-            if self._is_final_answer(result, callback_context):
-                await self._log_run_end(session_id, result, agent.name)
+            self.instrumentation.debug("After agent callback for agent: %s", agent.name)
+            self.spans.end_agent(callback_context.invocation_id, agent.name, self._branch(callback_context))
 
         except Exception as e:
-            print(f"[Plugin] Error in after_agent_callback: {e}")
-            await self._log_error(session_id, f"after_agent_callback error: {e}")
+            log.error("Error in after_agent_callback: %s", e)
+            await self._log_error(session_id, f"after_agent_callback error: {e}", self._branch(callback_context))
 
     async def on_user_message_callback(
         self,
@@ -258,51 +421,37 @@ class CoaPlugin(BasePlugin):
         invocation_context: InvocationContext,
         user_message: Any,
     ) -> None:
+        if not self.instrumentation.active:
+            return None
         try:
             session_id = invocation_context.session.id
 
-            # Extract plain text from the Content parts
-            prompt_text = ""
-            try:
-                if hasattr(user_message, "parts"):
-                    prompt_text = "\n".join(
-                        [
-                            getattr(p, "text", "")
-                            for p in user_message.parts
-                            if hasattr(p, "text") and getattr(p, "text")
-                        ]
-                    )
-                if not prompt_text:
-                    prompt_text = str(user_message)
-            except Exception:
-                prompt_text = str(user_message)
-
             # Determine if this is the very first prompt/turn for the session
             current_prompt = self._get_prompt_number(session_id, True)
             current_turn = self._get_turn_number(session_id)
 
             if current_prompt <= 1 and current_turn == 0:
-                self.client.log_session_start(
+                self.instrumentation.emit(session_id, "session_start", lambda: create_session_start_log(
                     session_id=session_id,
-                    prompt=prompt_text,
+                    prompt=self._message_text(user_message),
                     prompt_number=current_prompt,
                     turn_number=current_turn,
-                )
-                print(f"[Plugin] Logged session start for {session_id}")
+                ))
+                self.instrumentation.debug("Logged session start for %s", session_id)
             try:
-                self.client.log_user_input(
-                session_id=session_id,
-                prompt=prompt_text,
-                prompt_number=current_prompt,
-                turn_number=current_turn,
-                )
-                print(f"[Plugin] Logged user input (prompt #{current_prompt})")
+                self.instrumentation.emit(session_id, "user_input", lambda: create_user_input_log(
+                    session_id=session_id,
+                    prompt=self._message_text(user_message),
+                    prompt_number=current_prompt,
+                    turn_number=current_turn,
+                ))
+                self.instrumentation.debug("Logged user input (prompt #%s)", current_prompt)
             except Exception as e:
-                print(f"[Plugin] Failed to log user input: {e}")
+                log.error("Failed to log user input: %s", e)
 
         except Exception as e:
             # Ensure errors here don't break the agent flow
-            print(f"[Plugin] Error in on_user_message_callback: {e}")
+            log.error("Error in on_user_message_callback: %s", e)
             try:
                 await self._log_error(invocation_context.session.id, f"on_user_message_callback error: {e}")
             except Exception:
@@ -310,31 +459,134 @@ class CoaPlugin(BasePlugin):
 
         # No modification of the user message
         return None
-    def _is_final_answer(self, result: Any, callback_context: CallbackContext) -> bool:
-        """Determine if this is a final answer."""
-
-        if hasattr(result, 'is_final'):
-            return result.is_final
-
-        if hasattr(callback_context, 'is_final_response'):
-            return callback_context.is_final_response
 
-        return False
+    def _message_text(self, user_message: Any) -> str:
+        """Plain text of the Content parts of a user message."""
+        prompt_text = ""
+        try:
+            if hasattr(user_message, "parts"):
+                prompt_text = "\n".join(
+                    [
+                        getattr(p, "text", "")
+                        for p in user_message.parts
+                        if hasattr(p, "text") and getattr(p, "text")
+                    ]
+                )
+            if not prompt_text:
+                prompt_text = str(user_message)
+        except Exception:
+            prompt_text = str(user_message)
+        return prompt_text
+
+    def _final_response(self, invocation_context: InvocationContext) -> str:
+        """Text of the last final response of the run."""
+        for event in reversed(invocation_context.session.events):
+            if (
+                event.invocation_id == invocation_context.invocation_id
+                and event.author != "user"
+                and event.is_final_response()
+                and event.content is not None
+                and event.content.parts
+            ):
+                return "\n".join(part.text for part in event.content.parts if part.text)
+        return ""
+
+    def _branch(self, callback_context: CallbackContext) -> str | None:
+        """Branch of the invocation, set for agents running in parallel."""
+        return getattr(getattr(callback_context, "_invocation_context", None), "branch", None)
+
+    def _cached_response(self, callback_context: CallbackContext, llm_request: LlmRequest) -> LlmResponse | None:
+        """The cached response to the request, or None, remembering the key of a miss."""
+        if self.cache is None:
+            return None
+        try:
+            key = self._request_key(llm_request)
+            hit = self.cache.get(key)
+            if hit is None:
+                self._cache_keys[self._model_key(callback_context)] = key
+                return None
+            # Bytes, e.g. thought signatures, are stored base64-encoded as in JSON
+            response = LlmResponse.model_validate_json(json.dumps(hit.value))
+            usage = response.usage_metadata
+            saved_tokens = getattr(usage, "total_token_count", None) or 0
+            self.cache.metrics.saved_tokens += saved_tokens
+            # Nothing was spent on this response
+            response.usage_metadata = None
+            response.custom_metadata = {
+                **(response.custom_metadata or {}),
+                CACHE_FIELD: {"hit": True, "age_s": round(hit.age_s, 3), "saved_tokens": saved_tokens},
+            }
+            return response
+        except Exception as e:
+            log.error("Response cache lookup failed: %s", e)
+            return None
 
-    def _get_turn_number(self, session_id: str, increment: bool = False) -> int:
+    def _cache_response(self, callback_context: CallbackContext, llm_response: LlmResponse) -> bool | None:
+        """
+        Store the complete response of a call that missed the cache. Returns
+        whether it was stored, or None when the call wasn't looked up.
+        """
+        if self.cache is None or getattr(llm_response, "partial", None):
+            return None
+        key = self._cache_keys.pop(self._model_key(callback_context), None)
+        if key is None:
+            return None
+        # Errors and interrupted responses may not repeat
+        if llm_response.error_code or llm_response.interrupted or llm_response.content is None:
+            return False
+        try:
+            self.cache.put(key, llm_response.model_dump(mode="json", exclude_none=True))
+            return True
+        except Exception as e:
+            log.error("Failed to cache response: %s", e)
+            return False
+
+    def _request_key(self, llm_request: LlmRequest) -> str:
+        """Cache key of everything the response depends on: model, contents and config."""
+        contents = [content.model_dump(mode="json", exclude_none=True) for content in llm_request.contents or []]
+        config = llm_request.config.model_dump(mode="json", exclude_none=True) if llm_request.config else {}
+        # Client settings don't change the response
+        config.pop("http_options", None)
+        return cache_key(model=llm_request.model, contents=_normalized(contents), config=config)
+
+    def _model_key(self, callback_context: CallbackContext) -> tuple[str, str]:
+        return (
+            callback_context.invocation_id,
+            self._branch(callback_context) or callback_context.agent_name,
+        )
+
+    def _call_id(self, tool: BaseTool, tool_context: ToolContext) -> str:
+        """Key of a tool span; tools called without a function call id are keyed by name."""
+        return tool_context.function_call_id or tool.name
+
+    def _get_turn_number(self, session_id: str, increment: bool = False, branch: str | None = None) -> int:
         """Get the current turn number, optionally incrementing it.
 
+        Agents running in parallel count their turns on their own branch,
+        starting from the turn of the enclosing branch when they started, so
+        the turns of one agent stay consecutive however the others interleave.
+
         Args:
             increment: When True, increments the internal counter before returning.
+            branch: Branch of the invocation, None outside parallel agents.
 
         Returns:
             The current turn number after optional increment.
         """
-        if self.turn_number.get(session_id) is None:
-            self.turn_number[session_id] = 0
+        key = (session_id, branch)
+        if self.turn_number.get(key) is None:
+            self.turn_number[key] = self._branch_turn(session_id, branch)
         if increment:
-            self.turn_number[session_id] += 1
-        return self.turn_number[session_id]
+            self.turn_number[key] += 1
+        return self.turn_number[key]
+
+    def _branch_turn(self, session_id: str, branch: str | None) -> int:
+        """Turn number of the innermost enclosing branch counted so far."""
+        while branch:
+            branch = branch.rsplit(".", 1)[0] if "." in branch else None
+            if (session_id, branch) in self.turn_number:
+                return self.turn_number[(session_id, branch)]
+        return self.turn_number.get((session_id, None), 0)
 
     def _get_prompt_number(self, session_id: str, increment: bool = False) -> int:
         """Get the current prompt number, optionally incrementing it."""
@@ -344,80 +596,128 @@ class CoaPlugin(BasePlugin):
             self.prompt_number[session_id] += 1
         return self.prompt_number[session_id]
 
-    async def _log_error(self, session_id: str, error_message: str) -> None:
+    async def _log_error(self, session_id: str, error_message: str, branch: str | None = None) -> None:
         """Log error to CoAgent."""
         try:
             self.error_count += 1
-            self.client.log_error(
+            turn_number = self._get_turn_number(session_id, True, branch)
+            self.instrumentation.emit(session_id, "error", lambda: create_error_log(
                 session_id=session_id,
                 prompt_number=self._get_prompt_number(session_id),
-                turn_number=self._get_turn_number(session_id, True),
+                turn_number=turn_number,
                 error_message=error_message,
-            )
-            print(f"[Plugin] Logged error #{self.error_count}: {error_message}")
+            ))
+            self.instrumentation.debug("Logged error #%s: %s", self.error_count, error_message)
         except Exception as e:
-            print(f"[Plugin] Failed to log error: {e}")
+            log.error("Failed to log error: %s", e)
 
-    async def _log_llm_response(self, session_id: str, llm_response: LlmResponse, duration_ms: int = 0) -> None:
-        """Log LLM response to CoAgent."""
+    async def _log_llm_response(
+        self,
+        session_id: str,
+        llm_response: LlmResponse,
+        agent_name: str | None = None,
+        span: Span | None = None,
+        branch: str | None = None,
+        cache: dict[str, Any] | None = None,
+    ) -> None:
+        """Log LLM response to CoAgent, timed by the span of the model call.
+
+        `cache` tells whether the response came from the response cache.
+        """
         try:
-            total_tokens = getattr(llm_response, 'total_tokens', 0)
-            input_tokens = getattr(llm_response, 'input_tokens', 0)
-            output_tokens = getattr(llm_response, 'output_tokens', 0)
+            # Token counts come from the Gemini usage metadata when present
+            usage = getattr(llm_response, 'usage_metadata', None)
+            total_tokens = getattr(usage, 'total_token_count', None) or 0
+            input_tokens = getattr(usage, 'prompt_token_count', None) or 0
+            output_tokens = getattr(usage, 'candidates_token_count', None) or 0
+
+            model = span.attributes.get("model") if span else None
+
+            def response_text() -> str:
+                if hasattr(llm_response, 'text'):
+                    return llm_response.text
+                if hasattr(llm_response, 'content'):
+                    return str(llm_response.content)
+                return ""
 
-            response_text = ""
-            if hasattr(llm_response, 'text'):
-                response_text = llm_response.text
-            elif hasattr(llm_response, 'content'):
-                response_text = str(llm_response.content)
+            # Time to first token and gaps between chunks, when streamed
+            fields = stream_timing.log_fields(span.attributes.get("stream") if span else None, output_tokens)
+            if cache is not None:
+                fields.setdefault("additional_properties", {})[CACHE_FIELD] = cache
 
-            self.client.log_llm_response(
+            turn_number = self._get_turn_number(session_id, True, branch)
+            self.instrumentation.emit(session_id, "llm_response", lambda: create_llm_response_log(
                 session_id=session_id,
-                response=response_text,
+                response=self.instrumentation.content(response_text, ""),
                 prompt_number=self._get_prompt_number(session_id),
-                turn_number=self._get_turn_number(session_id, True),
+                turn_number=turn_number,
                 total_tokens=total_tokens,
                 input_tokens=input_tokens,
                 output_tokens=output_tokens,
-            )
-            print(f"[Plugin] Logged LLM response #{self.llm_response_count}")
+                execution_time_ms=span.duration_ms if span else None,
+                # Dimensions of the ClickHouse usage rollups
+                meta={
+                    "model": model or getattr(llm_response, 'model_version', None) or "",
+                    "issuer": agent_name or "unknown-agent",
+                    **(span.meta() if span else {}),
+                },
+                **fields,
+            ))
+            self.instrumentation.debug("Logged LLM response #%s", self.llm_response_count)
         except Exception as e:
-            print(f"[Plugin] Failed to log LLM response: {e}")
+            log.error("Failed to log LLM response: %s", e)
 
-    async def _log_run_end(self, session_id: str, result: Any, agent_name: str) -> None:
-        """Log run end to CoAgent."""
+    async def _log_run_end(
+        self, session_id: str, final_response: Callable[[], str], agent_name: str, span: Span | None = None
+    ) -> None:
+        """Log run end to CoAgent, with the time elapsed since `span` started."""
         try:
-            final_response = ""
-            if hasattr(result, 'text'):
-                final_response = result.text
-            elif hasattr(result, 'content'):
-                final_response = str(result.content)
-            else:
-                final_response = str(result)
-
-            # TODO(leoborai) - Calculate actual elapsed time, we should decide
-            # wether to track per agent or overall
-            self.client.log_session_end(
+            turn_number = self._get_turn_number(session_id, True)
+            self.instrumentation.emit(session_id, "session_end", lambda: create_session_end_log(
                 session_id=session_id,
-                response=final_response,
+                response=self.instrumentation.content(final_response, ""),
                 prompt_number=self._get_prompt_number(session_id),
-                turn_number=self._get_turn_number(session_id,True),
-                elapsed_time_ms=1000,
-            )
-
-            print(f"[Plugin] Logged run end for agent: {agent_name}")
+                turn_number=turn_number,
+                elapsed_time_ms=span.duration_ms if span else None,
+                meta={
+                    "log_shipper": self.shipper.metrics.to_dict(),
+                    "hook_log": hook_logging.metrics.to_dict(),
+                    **({"response_cache": self.cache.metrics.to_dict()} if self.cache is not None else {}),
+                    **(span.meta() if span else {}),
+                },
+            ))
+            self.instrumentation.debug("Logged run end for agent: %s", agent_name)
         except Exception as e:
-            print(f"[Plugin] Failed to log run end: {e}")
+            log.error("Failed to log run end: %s", e)
 
-    def _extract_text_from_contents(self, contents: Any) -> str:
-        """Extract joined text from a list of google.genai types.Content-like objects.
+    def _request_messages(self, llm_request: LlmRequest) -> list[str]:
+        """Prompt messages of a request, primarily from LlmRequest.contents (list[types.Content])."""
+        try:
+            messages = self._extract_messages_from_contents(getattr(llm_request, "contents", None))
+            if not messages:
+                # Secondary fallbacks if some other field is used
+                if hasattr(llm_request, "prompt") and llm_request.prompt:
+                    messages = [str(llm_request.prompt)]
+                elif hasattr(llm_request, "input") and llm_request.input:
+                    messages = [str(llm_request.input)]
+            return messages
+        except Exception:
+            # Fall back to stringifying the request
+            try:
+                return [str(llm_request)]
+            except Exception:
+                return []
+
+    def _extract_messages_from_contents(self, contents: Any) -> list[str]:
+        """Extract the text of each message in a list of google.genai types.Content-like objects.
 
         Handles shapes where each content has a `.parts` iterable of objects that may
-        include a `.text` attribute. Falls back gracefully.
+        include a `.text` attribute; the texts of a content's parts form one message.
+        Falls back gracefully.
         """
         try:
             if not contents:
-                return ""
+                return []
             collected: list[str] = []
             for c in contents:
                 # Prefer render_as_markdown if available for richer prompts
@@ -430,16 +730,32 @@ class CoaPlugin(BasePlugin):
 
                 parts = getattr(c, "parts", None)
                 if parts:
-                    for p in parts:
-                        t = getattr(p, "text", None)
-                        if t:
-                            collected.append(str(t))
+                    texts = [str(t) for t in (getattr(p, "text", None) for p in parts) if t]
+                    if texts:
+                        collected.append("\n".join(texts))
             if collected:
-                return "\n".join(collected)
+                return collected
         except Exception:
             pass
         try:
             # Last resort
-            return "\n".join(str(c) for c in (contents or []))
+            return [str(c) for c in (contents or [])]
         except Exception:
-            return ""
+            return []
+
+
+# Parts of contents that differ between otherwise identical requests: ADK
+# generates function call ids, and thought signatures are opaque
+def _normalized(value: Any) -> Any:
+    """Contents without volatile fields and with text stripped, for cache keys."""
+    if isinstance(value, dict):
+        value = {k: _normalized(v) for k, v in value.items() if k != "thought_signature"}
+        for call in ("function_call", "function_response"):
+            if isinstance(value.get(call), dict):
+                value[call].pop("id", None)
+        return value
+    if isinstance(value, list):
+        return [_normalized(v) for v in value]
+    if isinstance(value, str):
+        return value.strip()
+    return value
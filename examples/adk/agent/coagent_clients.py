@@ -0,0 +1,222 @@
+# Shared by the examples: edit examples/adk/agent/coagent_clients.py and run tools/shared_modules.py sync
+"""
+Shared clients for the CoAgent log API.
+
+Every client holds its own connection pool, so creating one per component
+pays for new TCP (and TLS) connections and keeps none of them warm. The
+integrations get their clients from `shared_client()` and
+`shared_async_client()` instead, which create one instance per process,
+configured from the environment:
+
+    COAGENT_BASE_URL     log API base URL (default http://localhost:3000/api/v1)
+    COAGENT_AUTH_TOKEN   bearer token, if the server requires one
+    COAGENT_TIMEOUT      request timeout in seconds (default 30)
+
+`AsyncCoagentClient` sends from the event loop without blocking it. It
+keeps a bounded pool of keep-alive connections, multiplexes requests over
+HTTP/2 when the server supports it and the `h2` package is installed
+(`pip install 'httpx[http2]'`), and caps the number of requests in flight.
+"""
+
+import asyncio
+import json
+import os
+import threading
+
+from dataclasses import asdict, dataclass
+from typing import Any, Iterable
+
+from coa_dev_coagent import CoagentClient, CoagentClientError
+from coa_dev_coagent.logapi import LogEntry, LogRequest
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_BASE_URL = "http://localhost:3000/api/v1"
+
+
+@dataclass
+class ClientMetrics:
+    """Counters describing the requests of an `AsyncCoagentClient`."""
+
+    requests: int = 0
+    failures: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    bytes_sent: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class AsyncCoagentClient:
+    """
+    Asynchronous client for the CoAgent log API, built on `httpx.AsyncClient`.
+
+    The connection pool is created on first use and bound to the event loop
+    it is used on; call `aclose` on that loop when done.
+
+    Args:
+        base_url: Base URL of the log API
+        auth_token: Bearer token sent with every request
+        timeout: Default timeout of a request in seconds; each call can
+            override it
+        connect_timeout: Timeout for establishing a connection
+        max_connections: Upper bound of open connections
+        max_keepalive_connections: Idle connections kept open for reuse
+        keepalive_expiry: Seconds an idle connection is kept open
+        max_concurrency: Requests in flight at once; further ones wait
+        http2: Use HTTP/2 when the server supports it; defaults to whether
+            the `h2` package is installed
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        auth_token: str | None = None,
+        timeout: float = 30.0,
+        connect_timeout: float = 5.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        max_concurrency: int = 16,
+        http2: bool | None = None,
+    ) -> None:
+        if httpx is None:
+            raise ModuleNotFoundError(
+                "Please install 'httpx' to use the AsyncCoagentClient: `pip install 'httpx[http2]'`"
+            )
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.http2 = HTTP2_AVAILABLE if http2 is None else http2
+        self.metrics = ClientMetrics()
+        self._headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        if auth_token:
+            self._headers["Authorization"] = f"Bearer {auth_token}"
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._concurrency = asyncio.Semaphore(max_concurrency)
+        self._client: "httpx.AsyncClient | None" = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self._headers,
+                timeout=self._timeout,
+                limits=self._limits,
+                http2=self.http2,
+            )
+        return self._client
+
+    async def request(self, method: str, path: str, timeout: float | None = None,
+                      **kwargs) -> "httpx.Response":
+        """
+        Send a request to `path` under the base URL and return the response.
+
+        HTTP errors are returned like any other response. Raises
+        `httpx.HTTPError` when the server can't be reached.
+        """
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        async with self._concurrency:
+            self.metrics.requests += 1
+            self.metrics.in_flight += 1
+            self.metrics.max_in_flight = max(self.metrics.max_in_flight, self.metrics.in_flight)
+            self.metrics.bytes_sent += len(kwargs.get("content") or b"")
+            try:
+                return await self.client.request(method, f"/{path.lstrip('/')}", **kwargs)
+            except httpx.HTTPError:
+                self.metrics.failures += 1
+                raise
+            finally:
+                self.metrics.in_flight -= 1
+
+    async def post_logs(self, body: bytes, headers: dict[str, str] | None = None,
+                        timeout: float | None = None) -> "httpx.Response":
+        """POST an encoded body (JSON or NDJSON) to `/logs`."""
+        return await self.request("POST", "logs", content=body, headers=headers, timeout=timeout)
+
+    async def log(self, entries: LogEntry | Iterable[LogEntry], timeout: float | None = None) -> None:
+        """Store one entry, or several in one request. Raises `CoagentClientError` on failure."""
+        if isinstance(entries, LogEntry):
+            payload = serialize_log_entry(entries)
+        else:
+            payload = [serialize_log_entry(entry) for entry in entries]
+        body = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+        try:
+            response = await self.post_logs(body, timeout=timeout)
+        except httpx.HTTPError as e:
+            raise CoagentClientError(f"Request failed: {e}") from e
+        if response.status_code >= 300:
+            raise CoagentClientError(f"Request failed: HTTP {response.status_code}: {response.text}")
+
+    async def get_logs(self, session_id: str, timeout: float | None = None) -> list[dict[str, Any]]:
+        """Entries of a session, oldest first."""
+        try:
+            response = await self.request("GET", f"logs/{session_id}", timeout=timeout)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise CoagentClientError(f"Request failed: {e}") from e
+        return response.json()
+
+    async def aclose(self) -> None:
+        """Close the pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "AsyncCoagentClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+
+def serialize_log_entry(entry: LogEntry) -> dict[str, Any]:
+    """The JSON object `POST /logs` expects for an entry, as `CoagentClient` sends it."""
+    return LogRequest(entry=entry).to_dict()
+
+
+def _config() -> dict[str, Any]:
+    return {
+        "base_url": os.environ.get("COAGENT_BASE_URL", DEFAULT_BASE_URL),
+        "auth_token": os.environ.get("COAGENT_AUTH_TOKEN") or None,
+        "timeout": float(os.environ.get("COAGENT_TIMEOUT", 30.0)),
+    }
+
+
+_lock = threading.Lock()
+_shared_client: CoagentClient | None = None
+_shared_async_client: AsyncCoagentClient | None = None
+
+
+def shared_client() -> CoagentClient:
+    """The process-wide synchronous client, used by spools and other threads."""
+    global _shared_client
+    with _lock:
+        if _shared_client is None:
+            _shared_client = CoagentClient(**_config())
+        return _shared_client
+
+
+def shared_async_client() -> AsyncCoagentClient:
+    """The process-wide asynchronous client, for code running on the event loop."""
+    global _shared_async_client
+    with _lock:
+        if _shared_async_client is None:
+            _shared_async_client = AsyncCoagentClient(**_config())
+        return _shared_async_client
@@ -0,0 +1,162 @@
+"""
+Run sub-agents as a dependency graph, independent ones concurrently.
+
+The financial coordinator's analysts form a graph: trading strategies need
+the market data analysis, and the execution plan and risk evaluation build
+on the strategies but not on each other. Calling them one at a time makes a run
+as slow as the sum of all four LLM chains; `FanOutAgent` starts every
+sub-agent as soon as the ones it depends on are done, so execution and
+risk analysis run side by side.
+
+Each sub-agent runs on its own branch, named like those of ADK's
+`ParallelAgent` (`<fan-out agent>.<sub-agent>`), so concurrent agents don't
+see each other's events and `CoaPlugin` keeps their spans and turns apart.
+Results are passed on through session state: `FanOutAgent.from_graph`
+appends the `output_key` of each dependency to an agent's instruction as
+a `{key?}` placeholder, filled in by ADK when the agent runs.
+
+As in `ParallelAgent`, an agent only continues after the runner has
+processed the event it yielded, so a dependency's `output_key` is in the
+session state before the agents waiting for it start.
+"""
+
+import asyncio
+
+from typing import AsyncGenerator
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.genai import types
+from pydantic import Field, model_validator
+
+
+class FanOutAgent(BaseAgent):
+    """
+    Runs its sub-agents once each, as soon as their dependencies are done.
+
+    Attributes:
+        dependencies: Names of the sub-agents each sub-agent waits for;
+            sub-agents not listed wait for none
+        max_concurrency: Sub-agents running at once
+    """
+
+    dependencies: dict[str, list[str]] = Field(default_factory=dict)
+    max_concurrency: int = 4
+
+    @classmethod
+    def from_graph(
+        cls,
+        name: str,
+        graph: list[tuple[LlmAgent, list[LlmAgent]]],
+        max_concurrency: int = 4,
+        description: str = "",
+    ) -> "FanOutAgent":
+        """
+        Build a fan-out agent from pairs of an agent and the agents it depends on.
+
+        The agents are cloned, with the output of each dependency added to
+        the clone's instruction, so the originals can still be used elsewhere.
+        """
+        sub_agents = []
+        for agent, depends_on in graph:
+            inputs = "\n\n".join(f"{dep.output_key}:\n{{{dep.output_key}?}}" for dep in depends_on)
+            instruction = f"{agent.instruction}\n\nResults of the steps this one builds on:\n\n{inputs}"
+            sub_agents.append(agent.clone(update={"instruction": instruction} if depends_on else None))
+        return cls(
+            name=name,
+            description=description,
+            sub_agents=sub_agents,
+            dependencies={agent.name: [dep.name for dep in deps] for agent, deps in graph},
+            max_concurrency=max_concurrency,
+        )
+
+    @model_validator(mode="after")
+    def _check_graph(self) -> "FanOutAgent":
+        names = {agent.name for agent in self.sub_agents}
+        for name, depends_on in self.dependencies.items():
+            unknown = ({name} | set(depends_on)) - names
+            if unknown:
+                raise ValueError(f"Unknown sub-agents in dependencies of {self.name}: {sorted(unknown)}")
+        # Depth-first search for a cycle
+        state: dict[str, str] = {}
+
+        def visit(name: str) -> None:
+            state[name] = "visiting"
+            for dep in self.dependencies.get(name, []):
+                if state.get(dep) == "visiting":
+                    raise ValueError(f"Dependency cycle in {self.name} through {dep}")
+                if dep not in state:
+                    visit(dep)
+            state[name] = "done"
+
+        for name in names:
+            if name not in state:
+                visit(name)
+        return self
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        finished = object()
+        events: asyncio.Queue = asyncio.Queue()
+        done = {agent.name: asyncio.Event() for agent in self.sub_agents}
+        slots = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(agent: BaseAgent) -> None:
+            try:
+                for dep in self.dependencies.get(agent.name, []):
+                    await done[dep].wait()
+                async with slots:
+                    async for event in agent.run_async(self._branch_ctx(agent, ctx)):
+                        processed = asyncio.Event()
+                        await events.put((event, processed))
+                        # Wait until the runner has applied the event's state delta
+                        await processed.wait()
+                done[agent.name].set()
+            finally:
+                await events.put((finished, None))
+
+        tasks = [asyncio.ensure_future(run(agent)) for agent in self.sub_agents]
+        runs = asyncio.gather(*tasks)
+        try:
+            remaining = len(self.sub_agents)
+            while remaining:
+                next_event = asyncio.ensure_future(events.get())
+                await asyncio.wait({next_event, runs}, return_when=asyncio.FIRST_COMPLETED)
+                if runs.done() and runs.exception() is not None:
+                    next_event.cancel()
+                    raise runs.exception()
+                event, processed = await next_event
+                if event is finished:
+                    remaining -= 1
+                    continue
+                yield event
+                processed.set()
+            await runs
+        finally:
+            # A failed gather leaves the other agents running; stop them too
+            for task in tasks:
+                task.cancel()
+
+        # One answer with every result, e.g. for an AgentTool calling this agent
+        results = [
+            f"## {agent.name}\n\n{ctx.session.state.get(agent.output_key, '')}"
+            for agent in self.sub_agents
+            if getattr(agent, "output_key", None)
+        ]
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text="\n\n".join(results))]),
+        )
+
+    async def _run_live_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        raise NotImplementedError(f"{type(self).__name__} does not support live runs")
+        yield  # pragma: no cover
+
+    def _branch_ctx(self, agent: BaseAgent, ctx: InvocationContext) -> InvocationContext:
+        """A copy of the context on the agent's own branch, as ParallelAgent does it."""
+        ctx = ctx.model_copy()
+        suffix = f"{self.name}.{agent.name}"
+        ctx.branch = f"{ctx.branch}.{suffix}" if ctx.branch else suffix
+        return ctx
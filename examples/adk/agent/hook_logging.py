@@ -0,0 +1,206 @@
+# Shared by the examples: edit examples/adk/agent/hook_logging.py and run tools/shared_modules.py sync
+"""
+Non-blocking, structured logging for the CoAgent hooks.
+
+The hooks run inside the agent's callbacks, so writing to stdout there
+blocks the agent whenever the container's log driver is slow, and lines
+written by several threads interleave. The hooks log through the standard
+`logging` module under the `coagent` logger instead; `configure_logging()`
+gives that logger a handler that only puts records on a bounded queue. A
+listener thread formats them and writes them out, one line per record, as
+text or JSON. When the queue is full, records are dropped and counted
+rather than waited for.
+
+Repeated warnings and errors are rate-limited per call site: beyond a few
+per minute they are counted and the next one let through reports how many
+were suppressed. The counters are in `metrics`.
+
+Settings come from the environment:
+
+    COAGENT_HOOK_LOG_FORMAT       text (default) or json
+    COAGENT_HOOK_LOG_QUEUE        records queued at most (default 10000)
+    COAGENT_HOOK_ERRORS_PER_MIN   warnings and errors per call site and
+                                  minute (default 10)
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+from dataclasses import asdict, dataclass
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, TextIO
+
+LOGGER_NAME = "coagent"
+
+# Attributes every LogRecord has; any other attribute came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+@dataclass
+class LoggingMetrics:
+    """Counters describing the hook log."""
+
+    records: int = 0
+    dropped: int = 0
+    suppressed: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+metrics = LoggingMetrics()
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most `per_minute` warnings and errors per call site and minute.
+
+    A call site is a logger and message template, so `log.error("Failed: %s", e)`
+    counts as one whatever `e` is. Records below WARNING pass unchecked.
+    """
+
+    def __init__(self, per_minute: int = 10, max_sites: int = 1024) -> None:
+        super().__init__()
+        self.per_minute = per_minute
+        self.max_sites = max_sites
+        self._lock = threading.Lock()
+        # call site -> [window start, records let through, records suppressed]
+        self._sites: dict[tuple[str, Any], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= 60.0:
+                suppressed = site[2] if site else 0
+                if site is None and len(self._sites) >= self.max_sites:
+                    self._sites.clear()
+                site = self._sites[key] = [now, 0, 0]
+            else:
+                suppressed = 0
+            if site[1] >= self.per_minute:
+                site[2] += 1
+                metrics.suppressed += 1
+                return False
+            site[1] += 1
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of waiting."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting is left to the listener thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            metrics.records += 1
+        except queue.Full:
+            metrics.dropped += 1
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    One line per record: `time level logger: message key=value ...` as text,
+    or an object with the same fields as JSON. Fields passed with `extra=`,
+    e.g. `session_id`, are included.
+    """
+
+    def __init__(self, json_lines: bool = False) -> None:
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+        if record.exc_info:
+            fields["exc"] = self.formatException(record.exc_info)
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+        timestamp += f".{int(record.msecs):03d}"
+        if self.json_lines:
+            return json.dumps(
+                {
+                    "ts": timestamp,
+                    "level": record.levelname,
+                    "logger": record.name,
+                    "message": record.getMessage(),
+                    **fields,
+                },
+                default=str,
+            )
+        line = f"{timestamp} {record.levelname} {record.name}: {record.getMessage()}"
+        exc = fields.pop("exc", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if exc:
+            line += "\n" + exc
+        return line
+
+
+_lock = threading.Lock()
+_listener: QueueListener | None = None
+_handler: NonBlockingQueueHandler | None = None
+
+
+def configure_logging(
+    level: int = logging.INFO,
+    stream: TextIO | None = None,
+    json_lines: bool | None = None,
+    queue_size: int | None = None,
+    errors_per_minute: int | None = None,
+) -> logging.Logger:
+    """
+    Route the `coagent` logger through a queue to a listener thread writing to
+    `stream` (stdout by default), and return the logger. Settings not given
+    are read from the environment. Later calls only change the level.
+    """
+    global _listener, _handler
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    with _lock:
+        if _listener is not None:
+            return logger
+        if json_lines is None:
+            json_lines = os.environ.get("COAGENT_HOOK_LOG_FORMAT", "text").strip().lower() == "json"
+        if queue_size is None:
+            queue_size = int(os.environ.get("COAGENT_HOOK_LOG_QUEUE", 10000))
+        if errors_per_minute is None:
+            errors_per_minute = int(os.environ.get("COAGENT_HOOK_ERRORS_PER_MIN", 10))
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(StructuredFormatter(json_lines))
+        records: queue.Queue = queue.Queue(maxsize=queue_size)
+        _handler = NonBlockingQueueHandler(records)
+        _handler.addFilter(RateLimitFilter(errors_per_minute))
+        logger.addHandler(_handler)
+        # Records stay out of the root logger's handlers, which may block
+        logger.propagate = False
+
+        _listener = QueueListener(records, output)
+        _listener.start()
+        atexit.register(shutdown_logging)
+    return logger
+
+
+def shutdown_logging() -> None:
+    """Write out the queued records and stop the listener thread."""
+    global _listener, _handler
+    with _lock:
+        listener, _listener = _listener, None
+        handler, _handler = _handler, None
+    if handler is not None:
+        logging.getLogger(LOGGER_NAME).removeHandler(handler)
+    if listener is not None:
+        listener.stop()
@@ -0,0 +1,151 @@
+# Shared by the examples: edit examples/adk/agent/instrumentation.py and run tools/shared_modules.py sync
+"""
+What the CoAgent logging hooks record, and how much work they do for it.
+
+A verbosity level sets which events are logged and whether their content
+(model prompts and responses, tool arguments and results, the final answer)
+is captured:
+
+    off        nothing; the hooks return right away
+    errors     error events
+    session    + session_start, user_input and session_end, with the
+               user's prompts
+    calls      + llm_call/llm_response and tool_call/tool_response, with
+               token counts, timings and names, but no content
+    full       + content (the default)
+    debug      + debug lines in the `coagent.hooks` log
+
+Single event types can be switched on or off on top of the level, e.g. to
+keep errors and sessions but drop `llm_call`. The hooks ask
+`Instrumentation.enabled` before doing anything for an event, and hand
+`emit` a function that builds the entry, which is only called when the
+entry will be passed on. Prompts are only rendered, hashed and
+deduplicated, and payloads only serialized and measured, for entries that
+are kept.
+
+Settings come from the environment:
+
+    COAGENT_LOG_LEVEL        off, errors, session, calls, full or debug
+    COAGENT_EVENTS           comma-separated event types to log regardless
+                             of the level
+    COAGENT_DISABLED_EVENTS  comma-separated event types never to log
+"""
+
+import logging
+import os
+
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from coa_dev_coagent.logapi import LogEntry
+
+log = logging.getLogger("coagent.hooks")
+
+OFF = 0
+ERRORS = 10
+SESSION = 20
+CALLS = 30
+FULL = 40
+DEBUG = 50
+
+LEVELS = {"off": OFF, "errors": ERRORS, "session": SESSION, "calls": CALLS, "full": FULL, "debug": DEBUG}
+
+# Lowest level at which each event type is logged; others need `full`
+EVENT_LEVELS = {
+    "error": ERRORS,
+    "session_start": SESSION,
+    "session_end": SESSION,
+    "user_input": SESSION,
+    "llm_call": CALLS,
+    "llm_response": CALLS,
+    "tool_call": CALLS,
+    "tool_response": CALLS,
+}
+
+
+def _event_names(value: str) -> set[str]:
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+@dataclass
+class InstrumentationConfig:
+    """
+    Which events are logged.
+
+    Attributes:
+        level: One of OFF, ERRORS, SESSION, CALLS, FULL or DEBUG
+        events: Event types logged whatever the level
+        disabled_events: Event types never logged
+    """
+
+    level: int = FULL
+    events: set[str] = field(default_factory=set)
+    disabled_events: set[str] = field(default_factory=set)
+
+    @classmethod
+    def from_env(cls) -> "InstrumentationConfig":
+        """Config from COAGENT_LOG_LEVEL, COAGENT_EVENTS and COAGENT_DISABLED_EVENTS."""
+        name = os.environ.get("COAGENT_LOG_LEVEL", "full").strip().lower()
+        if name not in LEVELS:
+            log.warning("Unknown COAGENT_LOG_LEVEL %r, using 'full'", name)
+        return cls(
+            level=LEVELS.get(name, FULL),
+            events=_event_names(os.environ.get("COAGENT_EVENTS", "")),
+            disabled_events=_event_names(os.environ.get("COAGENT_DISABLED_EVENTS", "")),
+        )
+
+    def enabled(self, event_type: str) -> bool:
+        if event_type in self.disabled_events:
+            return False
+        return event_type in self.events or self.level >= EVENT_LEVELS.get(event_type, FULL)
+
+
+class Instrumentation:
+    """
+    Gate in front of a sink of log entries, e.g. `SessionSampler.offer`.
+
+    Args:
+        sink: Receives the entries that are logged
+        config: Read from the environment when omitted
+        accepts: Whether the sink keeps entries of a session, e.g.
+            `SessionSampler.accepts`; entries it would drop aren't built
+    """
+
+    def __init__(
+        self,
+        sink: Callable[[LogEntry], Any],
+        config: InstrumentationConfig | None = None,
+        accepts: Callable[[str], bool] | None = None,
+    ) -> None:
+        self.sink = sink
+        self.config = config or InstrumentationConfig.from_env()
+        self.accepts = accepts
+        # Decisions per event type, so checks are one lookup
+        self._enabled: dict[str, bool] = {}
+        self.active = self.config.level > OFF or bool(self.config.events - self.config.disabled_events)
+        self.capture_content = self.config.level >= FULL
+        self.debug_enabled = self.config.level >= DEBUG
+
+    def enabled(self, event_type: str) -> bool:
+        """Whether entries of `event_type` are logged at all."""
+        enabled = self._enabled.get(event_type)
+        if enabled is None:
+            enabled = self._enabled[event_type] = self.config.enabled(event_type)
+        return enabled
+
+    def emit(self, session_id: str, event_type: str, build: Callable[[], LogEntry]) -> None:
+        """Build the entry with `build` and pass it on, if it will be logged."""
+        if not self.enabled(event_type):
+            return
+        if self.accepts is not None and not self.accepts(session_id):
+            return
+        self.sink(build())
+
+    def content(self, build: Callable[[], Any], default: Any = None) -> Any:
+        """The result of `build` when content is captured, otherwise `default`."""
+        return build() if self.capture_content else default
+
+    def debug(self, message: str, *args: Any) -> None:
+        """Log a debug line; `args` are only formatted into `message` at the debug level."""
+        if self.debug_enabled:
+            log.debug(message, *args)
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import time
+
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Iterable
+
+from coa_dev_coagent import CoagentClient, CoagentClientError
+from coa_dev_coagent.logapi import LogEntry
+
+from .coagent_clients import AsyncCoagentClient, serialize_log_entry
+from .log_spool import BulkResult, BulkSender, LogSpool
+
+log = logging.getLogger("coagent.shipper")
+
+
+@dataclass
+class ShipperMetrics:
+    """Counters describing the shipper's throughput and backpressure."""
+
+    enqueued: int = 0
+    dropped: int = 0
+    sent: int = 0
+    failed: int = 0
+    spooled: int = 0
+    batches: int = 0
+    bytes_sent: int = 0
+    queue_depth: int = 0
+    queue_high_watermark: int = 0
+    last_batch_size: int = 0
+    last_batch_latency_ms: float = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class LogShipper:
+    """Ships CoAgent log entries from an asyncio queue in batches.
+
+    Callbacks call `submit`, which only enqueues the entry. A background task
+    drains the queue and sends a batch when `max_batch_size` entries are
+    pending or `max_batch_delay` seconds have passed since the first one,
+    whichever happens first. Batches are POSTed to `/logs` as one bulk request
+    (gzip NDJSON, see `BulkSender`). With an `async_client`, batches are sent
+    on the event loop over its pooled keep-alive connections; otherwise from
+    a worker thread, so the event loop never waits on the network. Entries
+    the server rejects are counted as failed.
+
+    When the queue is full new entries are dropped and counted rather than
+    blocking the caller. Batches that can't be delivered are written to
+    `spool`, if given, which replays them once the server is reachable again.
+    While the spool is still replaying, new batches go straight to it so
+    they are not sent out of order or retried against a server that is down.
+
+    `on_drop` is called with the session id of entries that are lost:
+    dropped from a full queue, rejected by the server, or failed without a
+    spool to fall back on.
+    """
+
+    def __init__(
+        self,
+        client: CoagentClient,
+        max_queue_size: int = 10_000,
+        max_batch_size: int = 100,
+        max_batch_delay: float = 0.5,
+        spool: LogSpool | None = None,
+        async_client: AsyncCoagentClient | None = None,
+        on_drop: Callable[[str], None] | None = None,
+    ) -> None:
+        self.client = client
+        self.async_client = async_client
+        self.spool = spool
+        self.on_drop = on_drop
+        self.sender = BulkSender(client, async_client=async_client)
+        self.max_queue_size = max_queue_size
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.metrics = ShipperMetrics()
+
+        self._queue: asyncio.Queue[LogEntry] | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._flush_pending: bool = False
+        self._flush_waiters: int = 0
+
+    def start(self) -> None:
+        """Start the background drain task on the running event loop."""
+        if self._task is not None and not self._task.done():
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(
+            self._run(), name="coa-log-shipper"
+        )
+
+    def submit(self, entry: LogEntry) -> bool:
+        """Enqueue a log entry without blocking.
+
+        Returns:
+            False when the entry was dropped because the queue is full.
+        """
+        if self._task is None or self._task.done():
+            self.start()
+
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.metrics.dropped += 1
+            self._dropped([entry])
+            return False
+
+        self.metrics.enqueued += 1
+        depth = self._queue.qsize()
+        self.metrics.queue_depth = depth
+        if depth > self.metrics.queue_high_watermark:
+            self.metrics.queue_high_watermark = depth
+        if depth >= self.max_batch_size:
+            self._wakeup.set()
+        return True
+
+    def request_flush(self) -> None:
+        """Send whatever is queued right away, without waiting for it."""
+        if self._wakeup is None:
+            return
+        self._flush_pending = True
+        self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Send everything queued so far and wait until it is delivered."""
+        if self._queue is None or self._task is None or self._task.done():
+            return
+        self._flush_waiters += 1
+        self._wakeup.set()
+        try:
+            await self._queue.join()
+        finally:
+            self._flush_waiters -= 1
+
+    async def close(self) -> None:
+        """Flush pending entries and stop the background task."""
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.spool is not None:
+            await asyncio.to_thread(self.spool.close)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_batch_delay
+
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+
+                remaining = deadline - loop.time()
+                if self._flush_waiters or self._flush_pending or remaining <= 0:
+                    break
+
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except TimeoutError:
+                    pass
+
+            # A requested flush is done once the queue has been drained
+            if self._queue.empty():
+                self._flush_pending = False
+
+            self.metrics.queue_depth = self._queue.qsize()
+            try:
+                await self._send(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _send(self, batch: list[LogEntry]) -> None:
+        started = time.perf_counter()
+        try:
+            if self.spool is not None and not self.spool.healthy:
+                await asyncio.to_thread(self._spool_batch, batch)
+            else:
+                if self.async_client is not None:
+                    result = await self._apost_batch(batch)
+                else:
+                    result = await asyncio.to_thread(self._post_batch, batch)
+                self.metrics.sent += result.accepted
+                self.metrics.failed += result.rejected
+                self.metrics.bytes_sent += result.bytes_sent
+                self._dropped(batch[status.index] for status in result.statuses if not status.ok)
+        except Exception as e:
+            log.error("Failed to ship %s log entries: %s", len(batch), e)
+            if self.spool is not None:
+                await asyncio.to_thread(self._spool_batch, batch)
+            else:
+                self.metrics.failed += len(batch)
+                self._dropped(batch)
+        finally:
+            self.metrics.batches += 1
+            self.metrics.last_batch_size = len(batch)
+            self.metrics.last_batch_latency_ms = (time.perf_counter() - started) * 1000
+
+    def _post_batch(self, batch: list[LogEntry]) -> BulkResult:
+        """Serialize and POST a batch; runs in a worker thread."""
+        return self._checked(self.sender.send(self._serialize(batch)))
+
+    async def _apost_batch(self, batch: list[LogEntry]) -> BulkResult:
+        """Serialize and POST a batch with the async client."""
+        return self._checked(await self.sender.asend(self._serialize(batch)))
+
+    def _serialize(self, batch: list[LogEntry]) -> list[dict[str, Any]]:
+        return [serialize_log_entry(entry) for entry in batch]
+
+    def _checked(self, result: BulkResult) -> BulkResult:
+        if result.retryable:
+            raise CoagentClientError(f"batch not stored: HTTP {result.status_code}")
+        if result.rejected:
+            error = next(status.error for status in result.statuses if not status.ok)
+            log.error("CoAgent rejected %s log entries: %s", result.rejected, error)
+        return result
+
+    def _spool_batch(self, batch: list[LogEntry]) -> None:
+        """Write a batch to the spool for later delivery; runs in a worker thread."""
+        try:
+            self.spool.append_many(batch)
+            self.metrics.spooled += len(batch)
+        except Exception as e:
+            self.metrics.failed += len(batch)
+            log.error("Failed to spool %s log entries: %s", len(batch), e)
+            self._dropped(batch)
+
+    def _dropped(self, entries: Iterable[LogEntry | dict[str, Any]]) -> None:
+        """Tell `on_drop` about the sessions of lost entries."""
+        if self.on_drop is None:
+            return
+        session_ids = {
+            entry.get("session_id") if isinstance(entry, dict) else getattr(entry, "session_id", None)
+            for entry in entries
+        }
+        for session_id in session_ids - {None}:
+            self.on_drop(session_id)
@@ -0,0 +1,183 @@
+# Shared by the examples: edit examples/adk/agent/prompt_dedup.py and run tools/shared_modules.py sync
+"""
+Content-addressed deduplication of logged LLM prompts.
+
+Multi-step agents resend the whole conversation with every model call, so
+logging each full prompt makes the logged bytes grow quadratically with the
+number of steps. Instead, a prompt is split into its messages, each message
+is hashed, and only messages not yet sent in the session are carried along.
+The `llm_call` entry references the rest by hash:
+
+    {
+      "event_type": "llm_call",
+      "prompt_chunks": {
+        "refs": ["9f86d081884c7d65...", "60303ae22b998861..."],
+        "chunks": [{"hash": "60303ae22b998861...", "text": "Thought: ..."}],
+        "separator": "\\n"
+      },
+      ...
+    }
+
+Consecutive calls of the same issuer usually share a prefix: the previous
+prompt plus the new messages. When that is smaller, the refs are sent as a
+delta against the previous `llm_call` entry, whose first `base_length` refs
+come before `refs`:
+
+    "prompt_chunks": {"base": "<event_id>", "base_length": 14, "refs": [...], ...}
+
+Readers rebuild `prompt` by joining the referenced chunks with `separator`,
+looking them up among the chunks of earlier entries. `prompt_chunks` is sent
+as an additional property of the entry; the CoAgent server stores those in
+`additional_properties`. Chunks and bases are remembered per session, so
+every session carries all of its chunks and can be reassembled on its own.
+
+Deduplication is off unless COAGENT_PROMPT_DEDUP=1. The CoAgent server
+doesn't reassemble prompts yet, so with it on, its UI and
+`GET /api/v1/logs` show `llm_call` entries without `prompt`. Only
+`tools/ingest_server.py`, `tools/session_logs.py` and the
+`coagent.session_prompts` view in ClickHouse rebuild them.
+
+A chunk is remembered as sent once its entry is handed to the spool or
+shipper. If that entry is lost (rejected, or evicted from a full spool),
+prompts referencing the chunk or the entry can't be rebuilt completely.
+The spool, shipper and sampler report lost entries to `forget`, so the
+session's next prompt is sent whole and the ones after it can be rebuilt.
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+
+from collections import OrderedDict
+
+PROMPT_CHUNKS_FIELD = "prompt_chunks"
+
+# JSON bytes of a ref in a list: the hash, its quotes and a comma
+REF_BYTES = 32 + 3
+# JSON bytes of "base" and "base_length" besides the event id
+DELTA_OVERHEAD_BYTES = 32
+
+
+def chunk_hash(text: str) -> str:
+    """Content address of a chunk: the first 128 bits of its SHA-256, hex."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def dedup_enabled() -> bool:
+    """Whether prompts are deduplicated; off unless COAGENT_PROMPT_DEDUP=1."""
+    return os.environ.get("COAGENT_PROMPT_DEDUP", "0").strip().lower() not in ("", "0", "false", "no", "off")
+
+
+def common_prefix_length(a: list[str], b: list[str]) -> int:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class _SessionState:
+    """Chunks sent in a session and the last prompt of each issuer."""
+
+    def __init__(self) -> None:
+        self.sent: set[str] = set()
+        self.last: dict[str | None, tuple[str, list[str]]] = {}
+
+
+class PromptDeduplicator:
+    """
+    Replaces prompt messages already sent in a session by their hashes.
+
+    Args:
+        enabled: True to log chunks, False to log full prompts; None to
+            read COAGENT_PROMPT_DEDUP (off by default)
+        delta: Send refs as a delta against the issuer's previous prompt when
+            that is smaller
+        min_chunk_bytes: Messages shorter than this are always sent, since a
+            reference would save little
+        max_sessions: Sessions whose sent chunks are remembered; the least
+            recently used are forgotten first, after which their chunks are
+            sent again
+        separator: String the messages are joined with to form the prompt
+    """
+
+    def __init__(
+        self,
+        enabled: bool | None = None,
+        delta: bool = True,
+        min_chunk_bytes: int = 64,
+        max_sessions: int = 256,
+        separator: str = "\n",
+    ) -> None:
+        self.enabled = dedup_enabled() if enabled is None else enabled
+        self.delta = delta
+        self.min_chunk_bytes = min_chunk_bytes
+        self.max_sessions = max_sessions
+        self.separator = separator
+        self._lock = threading.Lock()
+        self._sessions: OrderedDict[str, _SessionState] = OrderedDict()
+
+    def encode(self, session_id: str, messages: list[str], event_id: str | None = None,
+               issuer: str | None = None) -> dict:
+        """
+        Build the `prompt_chunks` block for a prompt made of `messages`.
+
+        Messages already sent in the session are only referenced. With the
+        `event_id` of the entry, later prompts of the same `issuer` can be
+        sent as a delta against this one.
+        """
+        refs = [chunk_hash(text) for text in messages]
+        chunks: list[dict] = []
+        block: dict = {}
+        with self._lock:
+            state = self._sessions.pop(session_id, None) or _SessionState()
+            # Most recently used last
+            self._sessions[session_id] = state
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+            new: set[str] = set()
+            for digest, text in zip(refs, messages):
+                if digest in state.sent or digest in new:
+                    continue
+                chunks.append({"hash": digest, "text": text})
+                if len(text.encode("utf-8")) >= self.min_chunk_bytes:
+                    state.sent.add(digest)
+                else:
+                    new.add(digest)
+
+            sent_refs = refs
+            if self.delta and issuer in state.last:
+                base, base_refs = state.last[issuer]
+                shared = common_prefix_length(base_refs, refs)
+                if shared * REF_BYTES > len(base) + DELTA_OVERHEAD_BYTES:
+                    block = {"base": base, "base_length": shared}
+                    sent_refs = refs[shared:]
+            if event_id is not None:
+                state.last[issuer] = (event_id, refs)
+        return {**block, "refs": sent_refs, "chunks": chunks, "separator": self.separator}
+
+    def log_fields(self, session_id: str, messages: list[str], issuer: str | None = None) -> dict:
+        """
+        Keyword arguments for `create_llm_call_log` carrying the prompt.
+
+        The full prompt when deduplication is disabled, otherwise its chunks
+        and the entry's event id, which later deltas refer to.
+        """
+        if not self.enabled:
+            return {"prompt": self.separator.join(messages)}
+        event_id = str(uuid.uuid4())
+        return {
+            "event_id": event_id,
+            "prompt": None,
+            "additional_properties": {
+                PROMPT_CHUNKS_FIELD: self.encode(session_id, messages, event_id, issuer),
+            },
+        }
+
+    def forget(self, session_id: str) -> None:
+        """Drop what was sent in a finished session."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
@@ -0,0 +1,237 @@
+"""
+Cache of model responses, for requests that were answered before.
+
+Users ask about the same tickers again and again, and each time the data
+analyst runs the same model calls with the same search tool. `ResponseCache`
+keeps the responses, keyed by a hash of everything the response depends on:
+the model, the contents sent and the request's configuration (system
+instruction, tools, sampling parameters). A repeated request is answered
+from the cache in milliseconds, without tokens.
+
+Entries expire `ttl_s` seconds after they were stored, and the least
+recently used ones are evicted beyond `max_entries`. Two backends are
+available:
+
+    MemoryBackend   a dict in the process, lost on exit
+    SqliteBackend   a SQLite database on the local disk, kept across
+                    restarts and shared by processes on one machine
+
+Settings come from the environment (see `ResponseCache.from_env`):
+
+    COAGENT_RESPONSE_CACHE        off (default), memory or sqlite
+    COAGENT_RESPONSE_CACHE_TTL    seconds an entry is used (default 3600)
+    COAGENT_RESPONSE_CACHE_SIZE   entries kept at most (default 1000)
+    COAGENT_RESPONSE_CACHE_PATH   database of the sqlite backend (default
+                                  .coagent_cache/responses.sqlite3)
+
+Values must be JSON-serializable for the sqlite backend.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Protocol
+
+CACHE_FIELD = "response_cache"
+DEFAULT_CACHE_PATH = os.path.join(".coagent_cache", "responses.sqlite3")
+
+
+def cache_key(**parts: Any) -> str:
+    """SHA-256 of the parts as canonical JSON; equal parts give equal keys."""
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheMetrics:
+    """Counters describing the cache."""
+
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    expired: int = 0
+    evicted: int = 0
+    saved_tokens: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class CacheHit:
+    """A cached value and how long ago it was stored."""
+
+    value: Any
+    age_s: float
+
+
+class CacheBackend(Protocol):
+    """Storage of cache entries, least recently used evicted first."""
+
+    def get(self, key: str) -> tuple[float, Any] | None:
+        """Time the entry was stored and its value, marking it as used."""
+
+    def put(self, key: str, stored_at: float, value: Any) -> int:
+        """Store an entry and return how many entries were evicted for it."""
+
+    def delete(self, key: str) -> None: ...
+
+
+class MemoryBackend:
+    """Entries in an ordered dict, least recently used first; thread-safe."""
+
+    def __init__(self, max_entries: int = 1000) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> tuple[float, Any] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, stored_at: float, value: Any) -> int:
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteBackend:
+    """
+    Entries in a SQLite database, values stored as JSON.
+
+    The database is in WAL mode, so processes sharing it read while one of
+    them writes. Entries are evicted by the time they were last used.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 1000) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, stored_at REAL NOT NULL, used_at REAL NOT NULL, value TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)")
+
+    def get(self, key: str) -> tuple[float, Any] | None:
+        with self._lock:
+            row = self._db.execute("SELECT stored_at, value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key))
+        return row[0], json.loads(row[1])
+
+    def put(self, key: str, stored_at: float, value: Any) -> int:
+        data = json.dumps(value, default=str, ensure_ascii=False)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, stored_at, used_at, value) VALUES (?, ?, ?, ?)",
+                (key, stored_at, time.time(), data),
+            )
+            (count,) = self._db.execute("SELECT count(*) FROM responses").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN"
+                    " (SELECT key FROM responses ORDER BY used_at LIMIT ?)",
+                    (excess,),
+                )
+        return max(excess, 0)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class ResponseCache:
+    """
+    Values by key, used for `ttl_s` seconds after they were stored.
+
+    Args:
+        backend: Where entries are kept
+        ttl_s: Seconds an entry is used after it was stored
+        clock: Returns the current time in seconds since the epoch; entries
+            of the sqlite backend outlive the process, so this is wall time
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        ttl_s: float = 3600.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self.clock = clock
+        self.metrics = CacheMetrics()
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache | None":
+        """
+        Cache from COAGENT_RESPONSE_CACHE, COAGENT_RESPONSE_CACHE_TTL,
+        COAGENT_RESPONSE_CACHE_SIZE and COAGENT_RESPONSE_CACHE_PATH, or None
+        when caching is off.
+        """
+        kind = os.environ.get("COAGENT_RESPONSE_CACHE", "off").strip().lower()
+        max_entries = int(os.environ.get("COAGENT_RESPONSE_CACHE_SIZE", 1000))
+        if kind == "memory":
+            backend: CacheBackend = MemoryBackend(max_entries)
+        elif kind == "sqlite":
+            backend = SqliteBackend(os.environ.get("COAGENT_RESPONSE_CACHE_PATH", DEFAULT_CACHE_PATH), max_entries)
+        elif kind in ("", "off", "0", "false", "no"):
+            return None
+        else:
+            raise ValueError(f"Unknown COAGENT_RESPONSE_CACHE {kind!r}; use off, memory or sqlite")
+        return cls(backend, ttl_s=float(os.environ.get("COAGENT_RESPONSE_CACHE_TTL", 3600.0)))
+
+    def get(self, key: str) -> CacheHit | None:
+        entry = self.backend.get(key)
+        if entry is not None:
+            stored_at, value = entry
+            age_s = self.clock() - stored_at
+            if age_s < self.ttl_s:
+                self.metrics.hits += 1
+                return CacheHit(value, age_s)
+            self.backend.delete(key)
+            self.metrics.expired += 1
+        self.metrics.misses += 1
+        return None
+
+    def put(self, key: str, value: Any) -> None:
+        self.metrics.evicted += self.backend.put(key, self.clock(), value)
+        self.metrics.stores += 1
+
+    def close(self) -> None:
+        close = getattr(self.backend, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,148 @@
+"""
+Span tracking across the callbacks of `CoaPlugin`.
+
+ADK calls the plugin before and after each run, agent, model call and tool
+call, but hands it nothing to connect an `after_*` callback to its
+`before_*` callback. `SpanTracker` opens a span in the `before_*` callback
+under a key derived from the callback context, and closes it in the
+matching `after_*` callback:
+
+    run     (invocation_id)
+    agent   (invocation_id, branch or agent name)
+    model   (invocation_id, branch or agent name)
+    tool    (invocation_id, function_call_id)
+
+Keys include the invocation id, so concurrent invocations never share a
+span. Agents running in parallel have their own branch. Times come from
+`time.perf_counter_ns`, a monotonic clock, so durations are unaffected by
+changes to the wall clock.
+"""
+
+import threading
+import time
+import uuid
+
+from dataclasses import dataclass, field
+from typing import Any, Hashable
+
+RUN = "run"
+AGENT = "agent"
+MODEL = "model"
+TOOL = "tool"
+
+
+@dataclass(eq=False)
+class Span:
+    """A timed unit of work, nested under its parent."""
+
+    kind: str
+    name: str
+    parent: "Span | None" = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    span_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    start_ns: int = field(default_factory=time.perf_counter_ns)
+    end_ns: int | None = None
+
+    @property
+    def duration_ms(self) -> int:
+        """Duration so far for open spans, total duration for closed ones."""
+        end_ns = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end_ns - self.start_ns) // 1_000_000
+
+    def meta(self) -> dict[str, Any]:
+        """Fields identifying the span, for the `meta` of log entries."""
+        return {
+            "span_id": self.span_id,
+            "parent_span_id": self.parent.span_id if self.parent else None,
+            "span_kind": self.kind,
+            # Set for agents running in parallel, e.g. in a fan-out
+            **({"branch": self.attributes["branch"]} if self.attributes.get("branch") else {}),
+        }
+
+
+class SpanTracker:
+    """Open spans by key; thread-safe."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._open: dict[Hashable, Span] = {}
+        # Open agent spans per invocation, innermost last
+        self._agents: dict[str, list[Span]] = {}
+
+    def start_run(self, invocation_id: str) -> Span:
+        return self._start((RUN, invocation_id), Span(RUN, invocation_id))
+
+    def end_run(self, invocation_id: str) -> Span | None:
+        """Close the run, dropping spans of it left open, e.g. by failed calls."""
+        with self._lock:
+            self._agents.pop(invocation_id, None)
+            for key in [key for key in self._open if key[0] != RUN and key[1] == invocation_id]:
+                del self._open[key]
+        return self._end((RUN, invocation_id))
+
+    def start_agent(self, invocation_id: str, agent: str, branch: str | None = None) -> Span:
+        with self._lock:
+            parent = self._agent_parent(invocation_id, branch)
+            span = Span(AGENT, agent, parent, {"branch": branch})
+            self._open[(AGENT, invocation_id, branch or agent)] = span
+            self._agents.setdefault(invocation_id, []).append(span)
+        return span
+
+    def end_agent(self, invocation_id: str, agent: str, branch: str | None = None) -> Span | None:
+        span = self._end((AGENT, invocation_id, branch or agent))
+        with self._lock:
+            stack = self._agents.get(invocation_id, [])
+            if span in stack:
+                stack.remove(span)
+        return span
+
+    def start_model(self, invocation_id: str, agent: str, branch: str | None = None,
+                    **attributes: Any) -> Span:
+        parent = self.agent(invocation_id, agent, branch)
+        return self._start((MODEL, invocation_id, branch or agent), Span(MODEL, agent, parent, {"branch": branch, **attributes}))
+
+    def end_model(self, invocation_id: str, agent: str, branch: str | None = None) -> Span | None:
+        return self._end((MODEL, invocation_id, branch or agent))
+
+    def model(self, invocation_id: str, agent: str, branch: str | None = None) -> Span | None:
+        """The open span of a model call, e.g. while its response is streamed."""
+        with self._lock:
+            return self._open.get((MODEL, invocation_id, branch or agent))
+
+    def start_tool(self, invocation_id: str, call_id: str, tool: str, agent: str,
+                   branch: str | None = None) -> Span:
+        parent = self.agent(invocation_id, agent, branch)
+        return self._start((TOOL, invocation_id, call_id), Span(TOOL, tool, parent, {"branch": branch}))
+
+    def end_tool(self, invocation_id: str, call_id: str) -> Span | None:
+        return self._end((TOOL, invocation_id, call_id))
+
+    def run(self, invocation_id: str) -> Span | None:
+        with self._lock:
+            return self._open.get((RUN, invocation_id))
+
+    def agent(self, invocation_id: str, agent: str, branch: str | None = None) -> Span | None:
+        """The open span of an agent, or of the run when there is none."""
+        with self._lock:
+            return self._open.get((AGENT, invocation_id, branch or agent)) or self._open.get((RUN, invocation_id))
+
+    def _agent_parent(self, invocation_id: str, branch: str | None) -> Span | None:
+        # Parallel sub-agents run on branches named after their parents
+        if branch and "." in branch:
+            parent = self._open.get((AGENT, invocation_id, branch.rsplit(".", 1)[0]))
+            if parent is not None:
+                return parent
+        stack = self._agents.get(invocation_id)
+        return stack[-1] if stack else self._open.get((RUN, invocation_id))
+
+    def _start(self, key: Hashable, span: Span) -> Span:
+        with self._lock:
+            self._open[key] = span
+        return span
+
+    def _end(self, key: Hashable) -> Span | None:
+        with self._lock:
+            span = self._open.pop(key, None)
+        if span is not None:
+            span.end_ns = time.perf_counter_ns()
+        return span
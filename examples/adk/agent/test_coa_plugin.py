@@ -0,0 +1,99 @@
+import asyncio
+
+from typing import Any
+
+from coa_dev_coagent import CoagentClient
+from coa_dev_coagent.logapi import EventType
+from google.adk.agents import BaseAgent
+from google.adk.events import Event
+from google.adk.runners import InMemoryRunner, Runner
+from google.genai import types
+
+from agent.coa_plugin import CoaPlugin
+from agent.log_shipper import LogShipper
+from agent.session_sampler import SamplingPolicy
+
+APP = "plugin-test"
+
+
+class _Answer(BaseAgent):
+    """Answers after `delay` seconds, running `nested` on the same session first."""
+
+    delay: float = 0.0
+    nested: Any = None
+
+    async def _run_async_impl(self, ctx):
+        if self.nested is not None:
+            message = types.Content(role="user", parts=[types.Part(text="nested")])
+            async for _ in self.nested.run_async(user_id="user", session_id=ctx.session.id, new_message=message):
+                pass
+        await asyncio.sleep(self.delay)
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=f"{self.name} answer")]),
+        )
+
+
+def _plugin(tmp_path, monkeypatch, entries, head_rate=1.0):
+    monkeypatch.setenv("COAGENT_BLOB_DIR", str(tmp_path / "blobs"))
+    plugin = CoaPlugin(shipper=LogShipper(CoagentClient(base_url="http://127.0.0.1:9"), max_batch_delay=60))
+    plugin.sampler.sink = entries.append
+    plugin.sampler.policy = SamplingPolicy(head_rate=head_rate)
+    return plugin
+
+
+def _run(runner):
+    async def main():
+        session = await runner.session_service.create_session(app_name=APP, user_id="user")
+        message = types.Content(role="user", parts=[types.Part(text="go")])
+        async for _ in runner.run_async(user_id="user", session_id=session.id, new_message=message):
+            pass
+        return session.id
+
+    return asyncio.run(main())
+
+
+def _run_ends(entries):
+    return [entry for entry in entries if entry.event_type == EventType.SESSION_END]
+
+
+def test_run_end_is_logged_with_the_run_time(tmp_path, monkeypatch):
+    entries = []
+    plugin = _plugin(tmp_path, monkeypatch, entries)
+    session_id = _run(InMemoryRunner(agent=_Answer(name="advisor", delay=0.05), app_name=APP, plugins=[plugin]))
+
+    (run_end,) = _run_ends(entries)
+    assert run_end.session_id == session_id
+    assert run_end.output_data == {"response": "advisor answer"}
+    assert run_end.meta["span_kind"] == "run"
+    assert 50 <= run_end.meta["elapsed_time_ms"] < 5000
+    # Entries of the run nest under its span
+    assert all(entry.meta.get("parent_span_id") == run_end.meta["span_id"]
+               for entry in entries if (entry.meta or {}).get("span_kind") == "agent")
+
+
+def test_tail_sampler_sees_the_run_end(tmp_path, monkeypatch):
+    entries = []
+    plugin = _plugin(tmp_path, monkeypatch, entries, head_rate=0.0)
+    _run(InMemoryRunner(agent=_Answer(name="advisor"), app_name=APP, plugins=[plugin]))
+
+    # The run matched nothing, so it was dropped at its end instead of
+    # waiting in the buffer for the idle timeout
+    assert entries == []
+    assert plugin.sampler.metrics.dropped == 1
+    assert plugin.sampler.metrics.buffered_bytes == 0
+
+
+def test_nested_run_on_the_same_session_does_not_end_it(tmp_path, monkeypatch):
+    entries = []
+    plugin = _plugin(tmp_path, monkeypatch, entries)
+    runner = InMemoryRunner(agent=_Answer(name="advisor"), app_name=APP, plugins=[plugin])
+    runner.agent.nested = Runner(
+        agent=_Answer(name="analyst"), app_name=APP, session_service=runner.session_service, plugins=[plugin]
+    )
+    _run(runner)
+
+    (run_end,) = _run_ends(entries)
+    assert run_end.output_data == {"response": "advisor answer"}
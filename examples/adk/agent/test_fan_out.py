@@ -0,0 +1,95 @@
+import asyncio
+
+from typing import Any
+
+import pytest
+
+from google.adk.agents import BaseAgent
+from google.adk.events import Event, EventActions
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from agent.fan_out import FanOutAgent
+
+
+class _Step(BaseAgent):
+    """Stores its name under `output_key`, recording when it ran."""
+
+    output_key: str
+    delay: float = 0.0
+    log: Any = None
+
+    async def _run_async_impl(self, ctx):
+        self.log.append(("start", self.name, ctx.branch, dict(ctx.session.state)))
+        await asyncio.sleep(self.delay)
+        self.log.append(("end", self.name))
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=self.name)]),
+            actions=EventActions(state_delta={self.output_key: f"{self.name} result"}),
+        )
+
+
+def _run(agent):
+    runner = InMemoryRunner(agent=agent, app_name="fan-out-test")
+
+    async def main():
+        session = await runner.session_service.create_session(app_name="fan-out-test", user_id="user")
+        message = types.Content(role="user", parts=[types.Part(text="go")])
+        return [event async for event in runner.run_async(user_id="user", session_id=session.id, new_message=message)]
+
+    return asyncio.run(main())
+
+
+def _advisory(log, max_concurrency=4):
+    steps = {
+        name: _Step(name=name, output_key=f"{name}_output", delay=0.05, log=log)
+        for name in ("data", "trading", "execution", "risk")
+    }
+    return FanOutAgent(
+        name="advisory",
+        sub_agents=list(steps.values()),
+        dependencies={"trading": ["data"], "execution": ["trading"], "risk": ["trading"]},
+        max_concurrency=max_concurrency,
+    )
+
+
+def test_sub_agents_run_after_their_dependencies():
+    log = []
+    events = _run(_advisory(log))
+
+    order = [(kind, name) for kind, name, *_ in log]
+    assert order[:4] == [("start", "data"), ("end", "data"), ("start", "trading"), ("end", "trading")]
+    # Independent sub-agents run at once
+    assert {entry for entry in order[4:6]} == {("start", "execution"), ("start", "risk")}
+    # State written by a dependency is visible to the sub-agents after it
+    starts = {entry[1]: entry for entry in log if entry[0] == "start"}
+    assert starts["trading"][3] == {"data_output": "data result"}
+    assert starts["risk"][3]["trading_output"] == "trading result"
+    assert starts["risk"][2] == "advisory.risk"
+
+    summary = events[-1]
+    assert summary.author == "advisory"
+    assert "## execution\n\nexecution result" in summary.content.parts[0].text
+
+
+def test_max_concurrency_limits_running_sub_agents():
+    log = []
+    _run(_advisory(log, max_concurrency=1))
+
+    running = 0
+    for entry in log:
+        running += 1 if entry[0] == "start" else -1
+        assert running <= 1
+
+
+def test_invalid_graphs_are_rejected():
+    def steps():
+        return [_Step(name=name, output_key=name, log=[]) for name in ("a", "b")]
+
+    with pytest.raises(ValueError, match="cycle"):
+        FanOutAgent(name="loop", sub_agents=steps(), dependencies={"a": ["b"], "b": ["a"]})
+    with pytest.raises(ValueError, match="Unknown"):
+        FanOutAgent(name="typo", sub_agents=steps(), dependencies={"a": ["c"]})
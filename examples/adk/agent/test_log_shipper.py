@@ -0,0 +1,128 @@
+import asyncio
+import gzip
+import json
+import os
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from coa_dev_coagent import CoagentClient
+from coa_dev_coagent.logapi import create_user_input_log
+
+from agent.log_shipper import LogShipper
+from agent.log_spool import LogSpool
+
+
+class _LogsHandler(BaseHTTPRequestHandler):
+    """Accepts NDJSON batches, recording the size of each."""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        entries = [json.loads(line) for line in body.splitlines()]
+        self.server.batches.append(len(entries))
+        results = [{"index": i, "status": "ok"} for i in range(len(entries))]
+        payload = json.dumps({"success": True, "results": results}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _LogsHandler)
+    server.batches = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _entry(i, session_id="shipper-test"):
+    return create_user_input_log(session_id=session_id, prompt=f"question {i}", prompt_number=1, turn_number=i)
+
+
+def test_batches_are_sent_when_full():
+    server = _serve()
+    client = CoagentClient(base_url=f"http://127.0.0.1:{server.server_port}")
+
+    async def main():
+        shipper = LogShipper(client, max_batch_size=5, max_batch_delay=30)
+        started = time.monotonic()
+        for i in range(10):
+            shipper.submit(_entry(i))
+        await shipper.flush()
+        return shipper, time.monotonic() - started
+
+    shipper, elapsed = asyncio.run(main())
+    server.shutdown()
+
+    assert server.batches == [5, 5]
+    assert shipper.metrics.sent == 10 and shipper.metrics.batches == 2
+    assert elapsed < 5
+
+
+def test_partial_batch_is_sent_after_the_delay():
+    server = _serve()
+    client = CoagentClient(base_url=f"http://127.0.0.1:{server.server_port}")
+
+    async def main():
+        shipper = LogShipper(client, max_batch_size=100, max_batch_delay=0.1)
+        for i in range(3):
+            shipper.submit(_entry(i))
+        await asyncio.sleep(0.05)
+        sent_early = list(server.batches)
+        deadline = time.monotonic() + 5
+        while not server.batches and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        return sent_early
+
+    sent_early = asyncio.run(main())
+    server.shutdown()
+
+    assert sent_early == []
+    assert server.batches == [3]
+
+
+def test_entries_are_dropped_when_the_queue_is_full():
+    client = CoagentClient(base_url="http://127.0.0.1:9")
+    dropped = []
+
+    async def main():
+        shipper = LogShipper(client, max_queue_size=2, on_drop=dropped.append)
+        accepted = [shipper.submit(_entry(i, f"session-{i}")) for i in range(5)]
+        shipper._task.cancel()
+        return shipper, accepted
+
+    shipper, accepted = asyncio.run(main())
+
+    assert accepted == [True, True, False, False, False]
+    assert shipper.metrics.enqueued == 2 and shipper.metrics.dropped == 3
+    assert dropped == ["session-2", "session-3", "session-4"]
+
+
+def test_batches_are_spooled_while_the_server_is_down(tmp_path):
+    client = CoagentClient(base_url="http://127.0.0.1:9")
+    spool = LogSpool(client, directory=str(tmp_path), backoff_initial=60)
+
+    async def main():
+        shipper = LogShipper(client, max_batch_size=2, max_batch_delay=0.01, spool=spool)
+        for i in range(5):
+            shipper.submit(_entry(i))
+        await shipper.flush()
+        return shipper
+
+    shipper = asyncio.run(main())
+    spool.close(timeout=0)
+
+    assert shipper.metrics.spooled == 5 and shipper.metrics.sent == 0
+    spooled = []
+    for name in sorted(os.listdir(tmp_path)):
+        if name.endswith(".log"):
+            with open(tmp_path / name) as f:
+                spooled += [json.loads(line)["turn_number"] for line in f]
+    assert spooled == [0, 1, 2, 3, 4]
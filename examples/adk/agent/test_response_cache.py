@@ -0,0 +1,143 @@
+import asyncio
+import time
+
+import pytest
+
+from coa_dev_coagent import CoagentClient
+from google.adk.agents import LlmAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.models import LlmResponse
+from google.adk.models.llm_request import LlmRequest
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from agent.coa_plugin import CoaPlugin
+from agent.log_shipper import LogShipper
+from agent.response_cache import CACHE_FIELD, MemoryBackend, ResponseCache, SqliteBackend
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _request(text="What moved NVDA today?", call_id="call-1", signature=b"sig-1", temperature=0.2, http_options=None):
+    return LlmRequest(
+        model="gemini-2.5-flash",
+        contents=[
+            types.Content(role="user", parts=[types.Part(text=text)]),
+            types.Content(role="model", parts=[types.Part(
+                function_call=types.FunctionCall(id=call_id, name="search", args={"query": "NVDA"}),
+                thought_signature=signature,
+            )]),
+            types.Content(role="user", parts=[types.Part(
+                function_response=types.FunctionResponse(id=call_id, name="search", response={"result": "up 3%"}),
+            )]),
+        ],
+        config=types.GenerateContentConfig(temperature=temperature, http_options=http_options),
+    )
+
+
+def test_requests_differing_in_volatile_fields_share_responses(tmp_path, monkeypatch):
+    monkeypatch.setenv("COAGENT_BLOB_DIR", str(tmp_path / "blobs"))
+    plugin = CoaPlugin(
+        shipper=LogShipper(CoagentClient(base_url="http://127.0.0.1:9"), max_batch_delay=60),
+        cache=ResponseCache(MemoryBackend()),
+    )
+    plugin.sampler.sink = lambda entry: None
+
+    async def main():
+        service = InMemorySessionService()
+        session = await service.create_session(app_name="cache-test", user_id="user")
+        context = CallbackContext(InvocationContext(
+            session_service=service, invocation_id="inv", agent=LlmAgent(name="analyst"), session=session,
+        ))
+
+        async def lookup(request):
+            return await plugin.before_model_callback(callback_context=context, llm_request=request)
+
+        assert await lookup(_request()) is None
+        answer = types.Content(role="model", parts=[types.Part(text="NVDA rose 3%")])
+        await plugin.after_model_callback(callback_context=context, llm_response=LlmResponse(content=answer))
+
+        # Whitespace, function call ids, thought signatures and client
+        # settings don't change the answer
+        hit = await lookup(_request(
+            text="  What moved NVDA today?\n", call_id="call-2", signature=b"sig-2",
+            http_options=types.HttpOptions(timeout=1000),
+        ))
+        # The prompt and sampling parameters do
+        return hit, await lookup(_request(text="What moved AMD today?")), await lookup(_request(temperature=0.9))
+
+    hit, other_prompt, other_temperature = asyncio.run(main())
+
+    assert hit.content.parts[0].text == "NVDA rose 3%"
+    assert hit.custom_metadata[CACHE_FIELD]["hit"] is True
+    assert other_prompt is None and other_temperature is None
+    assert plugin.cache.metrics.hits == 1 and plugin.cache.metrics.misses == 3
+
+
+def test_entries_expire_after_ttl():
+    clock = _Clock()
+    cache = ResponseCache(MemoryBackend(), ttl_s=60, clock=clock)
+    cache.put("key", {"text": "answer"})
+
+    clock.now += 59
+    hit = cache.get("key")
+    assert hit.value == {"text": "answer"} and hit.age_s == 59
+
+    clock.now += 1
+    assert cache.get("key") is None
+    assert cache.metrics.hits == 1 and cache.metrics.expired == 1 and cache.metrics.misses == 1
+    # Expired entries are removed, not only skipped
+    assert len(cache.backend) == 0
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(MemoryBackend(max_entries=2), clock=_Clock())
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a").value == 1 and cache.get("c").value == 3
+    assert cache.metrics.evicted == 1 and cache.metrics.stores == 3
+
+
+def test_sqlite_entries_outlive_the_process(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    cache = ResponseCache(SqliteBackend(path, max_entries=2))
+    cache.put("a", {"text": "first"})
+    time.sleep(0.01)
+    cache.put("b", {"text": "second"})
+    cache.close()
+
+    cache = ResponseCache(SqliteBackend(path, max_entries=2))
+    assert cache.get("a").value == {"text": "first"}
+    time.sleep(0.01)
+    cache.put("c", {"text": "third"})
+    assert cache.metrics.evicted == 1
+    assert cache.get("b") is None
+    assert cache.get("a").value == {"text": "first"}
+    cache.close()
+
+
+def test_from_env(monkeypatch, tmp_path):
+    monkeypatch.delenv("COAGENT_RESPONSE_CACHE", raising=False)
+    assert ResponseCache.from_env() is None
+
+    monkeypatch.setenv("COAGENT_RESPONSE_CACHE", "sqlite")
+    monkeypatch.setenv("COAGENT_RESPONSE_CACHE_PATH", str(tmp_path / "cache" / "responses.sqlite3"))
+    monkeypatch.setenv("COAGENT_RESPONSE_CACHE_TTL", "5")
+    cache = ResponseCache.from_env()
+    assert isinstance(cache.backend, SqliteBackend) and cache.ttl_s == 5
+    cache.close()
+
+    monkeypatch.setenv("COAGENT_RESPONSE_CACHE", "redis")
+    with pytest.raises(ValueError):
+        ResponseCache.from_env()
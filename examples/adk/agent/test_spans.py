@@ -0,0 +1,65 @@
+from agent.spans import AGENT, MODEL, RUN, TOOL, SpanTracker
+
+
+def test_parallel_branches_nest_under_their_parent():
+    spans = SpanTracker()
+    run = spans.start_run("inv")
+    coordinator = spans.start_agent("inv", "coordinator")
+    advisory = spans.start_agent("inv", "advisory")
+    # Both branches are open at once, as in a fan-out
+    risk = spans.start_agent("inv", "risk", "advisory.risk")
+    execution = spans.start_agent("inv", "execution", "advisory.execution")
+    risk_model = spans.start_model("inv", "risk", "advisory.risk", model="gemini")
+    execution_tool = spans.start_tool("inv", "call-1", "search", "execution", "advisory.execution")
+
+    assert run.kind == RUN and run.parent is None
+    assert coordinator.kind == AGENT and coordinator.parent is run
+    assert advisory.parent is coordinator
+    assert risk.parent is advisory and execution.parent is advisory
+    assert risk_model.kind == MODEL and risk_model.parent is risk
+    assert execution_tool.kind == TOOL and execution_tool.parent is execution
+    assert risk_model.attributes["model"] == "gemini"
+    assert execution.meta() == {
+        "span_id": execution.span_id,
+        "parent_span_id": advisory.span_id,
+        "span_kind": AGENT,
+        "branch": "advisory.execution",
+    }
+
+    # Ending one branch leaves the other open
+    assert spans.end_agent("inv", "risk", "advisory.risk") is risk
+    assert risk.end_ns is not None
+    assert spans.agent("inv", "execution", "advisory.execution") is execution
+    assert spans.end_tool("inv", "call-1") is execution_tool
+    assert spans.end_agent("inv", "execution", "advisory.execution") is execution
+    assert spans.end_agent("inv", "advisory") is advisory
+
+    # An agent started afterwards nests under the innermost open agent
+    summary = spans.start_agent("inv", "summary")
+    assert summary.parent is coordinator
+
+
+def test_invocations_do_not_share_spans():
+    spans = SpanTracker()
+    first = spans.start_run("first")
+    second = spans.start_run("second")
+    first_agent = spans.start_agent("first", "coordinator")
+    second_agent = spans.start_agent("second", "coordinator")
+
+    assert first_agent.parent is first and second_agent.parent is second
+    assert spans.end_agent("second", "coordinator") is second_agent
+    assert spans.agent("first", "coordinator") is first_agent
+
+
+def test_end_run_drops_spans_left_open():
+    spans = SpanTracker()
+    run = spans.start_run("inv")
+    spans.start_agent("inv", "coordinator")
+    spans.start_model("inv", "coordinator")
+    spans.start_tool("inv", "call-1", "search", "coordinator")
+
+    assert spans.end_run("inv") is run
+    assert run.end_ns is not None
+    assert spans.model("inv", "coordinator") is None
+    assert spans.agent("inv", "coordinator") is None
+    assert spans.end_tool("inv", "call-1") is None
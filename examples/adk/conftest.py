@@ -0,0 +1,6 @@
+import os
+
+# agent/__init__.py builds the root agent on import, which needs a model name
+# and key; the tests never call the model
+os.environ.setdefault("GEMINI_MODEL", "gemini-2.5-flash-lite")
+os.environ.setdefault("GEMINI_API_KEY", "test")
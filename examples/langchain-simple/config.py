@@ -39,17 +39,47 @@ class RecipeConfig:
             ]
 
 
+@dataclass
+class SpoolConfig:
+    """Configuration for the on-disk log spool."""
+    directory: str = ".coagent_spool"
+    fsync: str = "interval"
+    segment_max_bytes: int = 4 * 1024 * 1024
+    max_total_bytes: int = 256 * 1024 * 1024
+    # Seconds to keep sending spooled logs before the script exits
+    drain_timeout: float = 5.0
+
+
+@dataclass
+class SemanticCacheConfig:
+    """Configuration for answering repeated requests from earlier responses."""
+    enabled: bool = False
+    # Served by the Ollama instance in ollama.base_url
+    embedding_model: str = "all-minilm"
+    # Lowest cosine similarity between ingredient lists for a hit
+    threshold: float = 0.92
+    max_entries: int = 1000
+    ttl_s: float = 24 * 3600.0
+    directory: str = ".coagent_cache/semantic"
+
+
 @dataclass
 class AppConfig:
     """Main application configuration."""
     ollama: OllamaConfig = None
     recipes: RecipeConfig = None
+    spool: SpoolConfig = None
+    semantic_cache: SemanticCacheConfig = None
 
     def __post_init__(self):
         if self.ollama is None:
             self.ollama = OllamaConfig()
         if self.recipes is None:
             self.recipes = RecipeConfig()
+        if self.spool is None:
+            self.spool = SpoolConfig()
+        if self.semantic_cache is None:
+            self.semantic_cache = SemanticCacheConfig()
 
 
 # Create default configuration instance
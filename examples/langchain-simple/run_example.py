@@ -4,7 +4,9 @@
 # dependencies = [
 #     "langchain",
 #     "langchain-ollama",
+#     "numpy",
 #     "pydantic",
+#     "requests",
 #     "coa-dev-coagent",
 # ]
 # ///
@@ -16,7 +18,7 @@ structured recipe data using Pydantic models, using the pip-installed
 coa-dev-coagent package.
 """
 
-from langchain_ollama import OllamaLLM
+from langchain_ollama import OllamaEmbeddings, OllamaLLM
 from langchain_core.callbacks import BaseCallbackHandler
 from langchain.prompts import ChatPromptTemplate
 from langchain.output_parsers import PydanticOutputParser
@@ -25,8 +27,19 @@ from typing import List, Dict, Any
 import json
 import time
 import uuid
+from coagent_clients import shared_client
 from config import default_config
 from coa_dev_coagent import CoagentClient
+from coa_dev_coagent.logapi import (
+    create_llm_call_log,
+    create_llm_response_log,
+    create_session_end_log,
+    create_session_start_log,
+)
+from log_spool import LogSpool
+from semantic_cache import SemanticCache, cache_context
+import semantic_cache
+import stream_timing
 
 
 class Recipe(BaseModel):
@@ -50,6 +63,7 @@ class MetadataExtractor(BaseCallbackHandler):
     def __init__(self):
         self.metadata: Dict[str, Any] = {}
         self.model: str = default_config.ollama.model_name
+        self.stream: stream_timing.StreamTimer | None = None
 
     def on_llm_start(self, serialized, prompts, **kwargs):
         print("LLM start")
@@ -57,6 +71,7 @@ class MetadataExtractor(BaseCallbackHandler):
         print(prompts)
         print(kwargs)
         self.metadata['start_time'] = time.time()
+        self.stream = stream_timing.StreamTimer()
         self.metadata['model_info'] = serialized
         self.metadata['input_prompts'] = prompts
 
@@ -87,11 +102,12 @@ class MetadataExtractor(BaseCallbackHandler):
         self.metadata['duration'] = self.metadata['end_time'] - \
             self.metadata['start_time']
         self.metadata['usage'] = usage
+        self.metadata['stream_timing'] = self.stream.to_dict(total_output) if self.stream else None
 
-    # def on_llm_new_token(self, token, **kwargs):
-    #     print("LLM new token")
-    #     print(token)
-    #     print(kwargs)
+    def on_llm_new_token(self, token, **kwargs):
+        # Only the arrival time is recorded, tokens aren't kept
+        if self.stream is not None:
+            self.stream.chunk()
 
     def on_llm_error(self, error, **kwargs):
         print("LLM error")
@@ -103,8 +119,14 @@ class MetadataExtractor(BaseCallbackHandler):
 class StructuredRecipeGenerator:
     """Advanced recipe generator with structured output."""
 
-    def __init__(self, model_name: str = None, metadata_extractor: MetadataExtractor = None):
-        """Initialize the structured recipe generator."""
+    def __init__(self, model_name: str = None, metadata_extractor: MetadataExtractor = None,
+                 spool: LogSpool = None, cache: SemanticCache = None):
+        """
+        Initialize the structured recipe generator.
+
+        With a `cache`, recipes for ingredients similar enough to ones asked
+        for before are taken from it instead of generated.
+        """
         if model_name is None:
             model_name = default_config.ollama.model_name
 
@@ -122,10 +144,11 @@ class StructuredRecipeGenerator:
 
         self.parser = PydanticOutputParser(pydantic_object=RecipeCollection)
 
-        # Initialize CoagentClient for logging
-        self.client = CoagentClient(
-            base_url="http://localhost:3000/api/v1"
-        )
+        # Log entries are written to the spool and sent to CoAgent in the background
+        if spool is None:
+            spool = create_spool(shared_client())
+        self.spool = spool
+        self.cache = cache
 
     def generate_structured_recipes(self, run_id: str, ingredients: List[str],
                                     metadata_extractor: MetadataExtractor = None) -> RecipeCollection:
@@ -176,52 +199,110 @@ class StructuredRecipeGenerator:
         - Specifies exact quantities for ingredients
         """
 
+        # The ingredients are compared by meaning; the rest of the request
+        # and the model settings must be the same
+        lookup = None
+        if self.cache is not None:
+            lookup = self.cache.lookup(ingredients_str, cache_context(
+                model=self.llm.model,
+                temperature=self.llm.temperature,
+                top_p=self.llm.top_p,
+                prompt=prompt_template.pretty_repr(),
+                format_instructions=self.parser.get_format_instructions(),
+            ))
+        hit = lookup.hit if lookup is not None else None
+
         # Generate structured response
         start_time = time.time()
-        result = chain.invoke({
-            "ingredients": ingredients_str,
-            "format_instructions": self.parser.get_format_instructions()
-        })
+        if hit is not None:
+            result = RecipeCollection.model_validate(hit.value)
+            print(f"Recipes from the semantic cache (similarity {hit.similarity:.3f}): {hit.question}")
+        else:
+            result = chain.invoke({
+                "ingredients": ingredients_str,
+                "format_instructions": self.parser.get_format_instructions()
+            })
+            if lookup is not None:
+                self.cache.store(lookup, result.model_dump())
         end_time = time.time()
+        # Nothing was spent on recipes from the cache
+        usage = ({'input_tokens': 0, 'output_tokens': 0, 'total_tokens': 0} if hit is not None
+                 else metadata_extractor.metadata.get('usage', {}))
 
         # Log the LLM call and response
         try:
             # Log the LLM call (request)
-            self.client.log_llm_call_new(
+            self.spool.append(create_llm_call_log(
                 session_id=run_id,
                 prompt=full_prompt,
                 prompt_number=1,
                 turn_number=1,
                 issuer="langchain",
                 system_prompt="You are a professional chef and cooking assistant."
-            )
+            ))
 
             # Log the LLM response with token usage
-            self.client.log_llm_response(
+            self.spool.append(create_llm_response_log(
                 session_id=run_id,
                 response=result.model_dump_json(),
                 prompt_number=1,
                 turn_number=1,
-                input_tokens=metadata_extractor.metadata.get('usage', {}).get('input_tokens'),
-                output_tokens=metadata_extractor.metadata.get('usage', {}).get('output_tokens'),
-                total_tokens=metadata_extractor.metadata.get('usage', {}).get('total_tokens')
-            )
+                input_tokens=usage.get('input_tokens'),
+                output_tokens=usage.get('output_tokens'),
+                total_tokens=usage.get('total_tokens'),
+                execution_time_ms=int(
+                    (end_time - start_time if hit is not None
+                     else metadata_extractor.metadata.get('duration', end_time - start_time)) * 1000
+                ),
+                # Dimensions of the ClickHouse usage rollups
+                meta={"model": self.llm.model, "issuer": "langchain"},
+                # Similarity and age of a cache hit, or time to first token
+                # and gaps between tokens
+                **(semantic_cache.log_fields(hit) if hit is not None else stream_timing.log_fields(
+                    metadata_extractor.stream, usage.get('output_tokens'),
+                )),
+            ))
         except Exception as e:
             print(f"Warning: Failed to log LLM call: {e}")
 
         return result
 
 
+def create_spool(client: CoagentClient) -> LogSpool:
+    """Create the log spool described by the default configuration."""
+    return LogSpool(
+        client,
+        directory=default_config.spool.directory,
+        fsync=default_config.spool.fsync,
+        segment_max_bytes=default_config.spool.segment_max_bytes,
+        max_total_bytes=default_config.spool.max_total_bytes,
+    )
+
+
+def create_semantic_cache() -> SemanticCache | None:
+    """Create the semantic cache described by the default configuration, if enabled."""
+    config = default_config.semantic_cache
+    if not config.enabled:
+        return None
+    embeddings = OllamaEmbeddings(model=config.embedding_model, base_url=default_config.ollama.base_url)
+    return SemanticCache(
+        embeddings.embed_documents,
+        threshold=config.threshold,
+        max_entries=config.max_entries,
+        ttl_s=config.ttl_s,
+        directory=config.directory,
+    )
+
+
 def main():
     """Demonstrate structured recipe generation."""
     print("🍳 Advanced LangChain Recipe Generator (Structured Output)")
     print("=" * 60)
 
-    # Initialize CoagentClient for logging
-    client = CoagentClient(
-        base_url="http://localhost:3000/api/v1",
-        debug=True
-    )
+    # Entries are spooled to disk first and sent with the shared CoagentClient
+    spool = create_spool(shared_client())
+    # Loaded from disk, and saved when the run is done
+    cache = create_semantic_cache()
 
     # Generate a unique run ID for this execution
     run_id = f"recipe-gen-{uuid.uuid4().hex[:8]}"
@@ -229,18 +310,18 @@ def main():
     try:
         # Log the start of the run
         try:
-            client.log_session_start(
+            spool.append(create_session_start_log(
                 session_id=run_id,
                 prompt="Generate structured recipes using LangChain with Ollama",
                 prompt_number=1,
                 turn_number=0
-            )
+            ))
         except Exception as e:
             print(f"Warning: Failed to log session start: {e}")
 
         # Initialize generator
         metadata_extractor = MetadataExtractor()
-        generator = StructuredRecipeGenerator(None, metadata_extractor)
+        generator = StructuredRecipeGenerator(None, metadata_extractor, spool, cache)
 
         # Define ingredients from config
         ingredients = default_config.recipes.default_ingredients
@@ -286,14 +367,17 @@ def main():
 
         # Log the end of the session
         try:
-            client.log_session_end(
+            spool.append(create_session_end_log(
                 session_id=run_id,
                 response=f"Generated {len(recipe_collection.recipes)} recipes successfully",
                 prompt_number=1,
                 turn_number=0,
                 elapsed_time_ms=elapsed_time,
-                meta={"context": metadata_extractor.metadata}
-            )
+                meta={
+                    "context": metadata_extractor.metadata,
+                    **({"semantic_cache": cache.metrics.to_dict()} if cache else {}),
+                }
+            ))
         except Exception as e:
             print(f"Warning: Failed to log session end: {e}")
 
@@ -306,16 +390,24 @@ def main():
 
         # Log the error if possible
         try:
-            client.log_session_end(
+            spool.append(create_session_end_log(
                 session_id=run_id,
                 response=f"Error: {str(e)}",
                 prompt_number=1,
                 turn_number=0,
                 elapsed_time_ms=0
-            )
+            ))
         except Exception as log_error:
             print(f"Warning: Failed to log error: {log_error}")
 
+    finally:
+        if cache is not None:
+            cache.save()
+            print(f"Semantic cache: {cache.metrics.to_dict()}")
+        # Whatever is not sent in time is replayed on the next run
+        spool.close(timeout=default_config.spool.drain_timeout)
+        print(f"Log spool: {spool.metrics.to_dict()}")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,316 @@
+# Shared by the examples: edit examples/smolagents/src/semantic_cache.py and run tools/shared_modules.py sync
+"""
+Cache of model responses to questions asked before in other words.
+
+An exact-match cache misses most repeated questions, because people rarely
+ask them the same way twice. `SemanticCache` embeds each question with a
+local embedding model (`all-minilm` from the `local-llm` Ollama service by
+default) and answers it with the response to the most similar earlier
+question, when their cosine similarity is at least `threshold`.
+
+Only the question is compared by meaning. Everything else the response
+depends on, such as the model, its settings, the system prompt and earlier
+turns, is passed as `context` and must match exactly; entries with a
+different context are never considered. So a paraphrased task for the same
+agent hits, and the same task for another model doesn't.
+
+Embeddings are kept, normalized, in one NumPy matrix, and a lookup is a
+single matrix-vector product over at most `max_entries` rows: well under a
+millisecond for a few thousand 384-dimension vectors, and exact rather
+than approximate. Entries expire `ttl_s` seconds after they were stored,
+and the least recently used are evicted beyond `max_entries`. With a
+`directory`, the cache is loaded from and `save()`d to disk, so it outlives
+the process.
+
+    cache = SemanticCache(OllamaEmbedder())
+    lookup = cache.lookup(question, context=cache_context(model=..., system=...))
+    if lookup.hit:
+        answer = lookup.hit.value
+    else:
+        answer = call_model(...)
+        cache.store(lookup, answer)
+
+Values must be JSON-serializable to be saved.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Sequence
+
+import numpy as np
+import requests
+
+SEMANTIC_CACHE_FIELD = "semantic_cache"
+DEFAULT_EMBEDDING_MODEL = "all-minilm"
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+
+_VECTORS_FILE = "vectors.npy"
+_ENTRIES_FILE = "entries.json"
+
+
+def cache_context(**parts: Any) -> str:
+    """SHA-256 of the parts as canonical JSON, for `context`."""
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class OllamaEmbedder:
+    """Embeds texts with an Ollama embedding model through `POST /api/embed`."""
+
+    def __init__(self, base_url: str = DEFAULT_OLLAMA_URL, model: str = DEFAULT_EMBEDDING_MODEL,
+                 timeout: float = 10.0) -> None:
+        self.url = base_url.rstrip("/") + "/api/embed"
+        self.model = model
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def __call__(self, texts: Sequence[str]) -> list[list[float]]:
+        response = self._session.post(
+            self.url, json={"model": self.model, "input": list(texts)}, timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["embeddings"]
+
+
+@dataclass
+class SemanticCacheMetrics:
+    """Counters describing the cache."""
+
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    expired: int = 0
+    evicted: int = 0
+    embed_failures: int = 0
+    embed_ms: float = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {**asdict(self), "embed_ms": round(self.embed_ms, 3)}
+
+
+@dataclass
+class SemanticHit:
+    """The cached value of the most similar question."""
+
+    value: Any
+    question: str
+    similarity: float
+    age_s: float
+
+    def to_dict(self) -> dict[str, Any]:
+        """What to log about the hit; the value itself is logged as the response."""
+        return {"hit": True, "similarity": round(self.similarity, 4), "age_s": round(self.age_s, 3)}
+
+
+@dataclass
+class SemanticLookup:
+    """A question looked up, with its embedding for storing the answer."""
+
+    question: str
+    context: str
+    vector: np.ndarray | None
+    hit: SemanticHit | None = None
+
+
+class SemanticCache:
+    """
+    Values by the meaning of a question and the exact context it was asked in.
+
+    Args:
+        embed: Returns one embedding per text, e.g. an `OllamaEmbedder`
+        threshold: Lowest cosine similarity of a hit, in [-1, 1]
+        max_entries: Entries kept; the least recently used are evicted
+        ttl_s: Seconds an entry is used after it was stored
+        directory: Where the cache is loaded from and saved; None to keep
+            it in memory only
+        clock: Returns the current time in seconds since the epoch
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[Sequence[str]], Sequence[Sequence[float]]],
+        threshold: float = 0.92,
+        max_entries: int = 1000,
+        ttl_s: float = 24 * 3600.0,
+        directory: str | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.directory = directory
+        self.clock = clock
+        self.metrics = SemanticCacheMetrics()
+        self._lock = threading.Lock()
+        # Row i of _vectors belongs to _entries[i]; rows are allocated on first store
+        self._vectors: np.ndarray | None = None
+        self._clear()
+        if directory is not None:
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> "SemanticCache | None":
+        """
+        Cache from COAGENT_SEMANTIC_CACHE (off by default), COAGENT_SEMANTIC_THRESHOLD,
+        COAGENT_SEMANTIC_CACHE_SIZE, COAGENT_SEMANTIC_CACHE_TTL,
+        COAGENT_SEMANTIC_CACHE_DIR, COAGENT_EMBEDDING_MODEL and
+        OLLAMA_API_BASE_URL, or None when off.
+        """
+        if os.environ.get("COAGENT_SEMANTIC_CACHE", "0").strip().lower() in ("", "0", "false", "no", "off"):
+            return None
+        embedder = OllamaEmbedder(
+            os.environ.get("OLLAMA_API_BASE_URL", DEFAULT_OLLAMA_URL),
+            os.environ.get("COAGENT_EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL),
+        )
+        return cls(
+            embedder,
+            threshold=float(os.environ.get("COAGENT_SEMANTIC_THRESHOLD", 0.92)),
+            max_entries=int(os.environ.get("COAGENT_SEMANTIC_CACHE_SIZE", 1000)),
+            ttl_s=float(os.environ.get("COAGENT_SEMANTIC_CACHE_TTL", 24 * 3600.0)),
+            directory=os.environ.get("COAGENT_SEMANTIC_CACHE_DIR") or None,
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, question: str, context: str = "") -> SemanticLookup:
+        """
+        Look up the answer to `question` asked in `context`. When the
+        embedding model fails, the lookup misses and its answer isn't stored.
+        """
+        vector = self._embed(question)
+        lookup = SemanticLookup(question, context, vector)
+        if vector is None:
+            self.metrics.misses += 1
+            return lookup
+        now = self.clock()
+        with self._lock:
+            expired = np.flatnonzero((self._contexts == context) & (now - self._stored_at >= self.ttl_s))
+            if len(expired):
+                self.metrics.expired += len(expired)
+                self._drop(expired)
+            lookup.hit = self._nearest(vector, context, now)
+        if lookup.hit is not None:
+            self.metrics.hits += 1
+        else:
+            self.metrics.misses += 1
+        return lookup
+
+    def store(self, lookup: SemanticLookup, value: Any) -> None:
+        """Store the answer to a question that missed."""
+        if lookup.vector is None or lookup.hit is not None:
+            return
+        now = self.clock()
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(lookup.vector):
+                # First entry, or the embedding model changed: start over
+                self._clear()
+                self._vectors = np.zeros((self.max_entries, len(lookup.vector)), dtype=np.float32)
+            if len(self._entries) >= self.max_entries:
+                self._drop([int(np.argmin(self._used_at))])
+                self.metrics.evicted += 1
+            self._vectors[len(self._entries)] = lookup.vector
+            self._entries.append({"question": lookup.question, "value": value})
+            self._contexts = np.append(self._contexts, np.array([lookup.context], dtype=object))
+            self._stored_at = np.append(self._stored_at, now)
+            self._used_at = np.append(self._used_at, now)
+        self.metrics.stores += 1
+
+    def save(self) -> None:
+        """Write the cache to `directory`, replacing what was there."""
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            n = len(self._entries)
+            vectors = self._vectors[:n] if self._vectors is not None else np.zeros((0, 0), dtype=np.float32)
+            entries = [
+                {**entry, "context": context, "stored_at": stored_at, "used_at": used_at}
+                for entry, context, stored_at, used_at in zip(
+                    self._entries, self._contexts, self._stored_at.tolist(), self._used_at.tolist()
+                )
+            ]
+        # The entries file is written last; a crash in between leaves a
+        # vectors file that doesn't match and the next load starts empty
+        self._replace(_VECTORS_FILE, lambda f: np.save(f, vectors))
+        self._replace(_ENTRIES_FILE, lambda f: f.write(json.dumps(entries, default=str).encode("utf-8")))
+
+    def _embed(self, question: str) -> np.ndarray | None:
+        start = time.perf_counter()
+        try:
+            vector = np.asarray(self.embed([question])[0], dtype=np.float32)
+        except Exception:
+            self.metrics.embed_failures += 1
+            return None
+        finally:
+            self.metrics.embed_ms += (time.perf_counter() - start) * 1e3
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def _nearest(self, vector: np.ndarray, context: str, now: float) -> SemanticHit | None:
+        # Called with the lock held
+        if not self._entries or self._vectors.shape[1] != len(vector):
+            return None
+        similarity = self._vectors[: len(self._entries)] @ vector
+        similarity = np.where(self._contexts == context, similarity, -np.inf)
+        best = int(np.argmax(similarity))
+        if similarity[best] < self.threshold:
+            return None
+        self._used_at[best] = now
+        entry = self._entries[best]
+        return SemanticHit(entry["value"], entry["question"], float(similarity[best]), float(now - self._stored_at[best]))
+
+    def _clear(self) -> None:
+        self._entries: list[dict[str, Any]] = []
+        self._contexts = np.empty(0, dtype=object)
+        self._stored_at = np.empty(0)
+        self._used_at = np.empty(0)
+
+    def _drop(self, rows: Sequence[int]) -> None:
+        # Called with the lock held; the remaining rows move up in order
+        keep = np.setdiff1d(np.arange(len(self._entries)), rows)
+        self._vectors[: len(keep)] = self._vectors[keep]
+        self._entries = [self._entries[i] for i in keep]
+        self._contexts = self._contexts[keep]
+        self._stored_at = self._stored_at[keep]
+        self._used_at = self._used_at[keep]
+
+    def _load(self) -> None:
+        try:
+            vectors = np.load(os.path.join(self.directory, _VECTORS_FILE))
+            with open(os.path.join(self.directory, _ENTRIES_FILE), encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        if len(entries) != len(vectors):
+            return
+        # The newest entries, if the cache was saved with a larger size
+        entries = entries[-self.max_entries:]
+        vectors = vectors[len(vectors) - len(entries):]
+        if len(entries):
+            self._vectors = np.zeros((self.max_entries, vectors.shape[1]), dtype=np.float32)
+            self._vectors[: len(entries)] = vectors
+        self._entries = [{"question": e["question"], "value": e["value"]} for e in entries]
+        self._contexts = np.array([e["context"] for e in entries], dtype=object)
+        self._stored_at = np.array([e["stored_at"] for e in entries], dtype=float)
+        self._used_at = np.array([e["used_at"] for e in entries], dtype=float)
+
+    def _replace(self, name: str, write: Callable[[Any], Any]) -> None:
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+
+
+def log_fields(hit: SemanticHit | None) -> dict[str, Any]:
+    """Keyword arguments for `create_llm_response_log` describing a hit."""
+    if hit is None:
+        return {}
+    return {"additional_properties": {SEMANTIC_CACHE_FIELD: hit.to_dict()}}
@@ -0,0 +1,132 @@
+# Shared by the examples: edit examples/adk/agent/stream_timing.py and run tools/shared_modules.py sync
+"""
+Latency of streamed model responses, as the user sees it.
+
+The total duration of a model call hides how long the user waited for the
+first token, and how evenly the rest arrived. `StreamTimer` is told when a
+call starts and when each chunk of its response arrives, and reports:
+
+    ttft_ms            time to the first chunk
+    stream_ms          time from the first chunk to the last
+    chunks             chunks received
+    tokens_per_second  output tokens (or chunks) per second after the first
+    inter_token_ms     p50, p90, p99 and max of the gaps between chunks
+
+Gaps are counted in a histogram of logarithmic buckets, each about 9% wide,
+so the timer's size doesn't grow with the length of the response and
+percentiles are within a few percent of the exact value.
+
+The report is logged with the `llm_response` entry of the call, in the
+`stream_timing` property (see `log_fields`), and rolled up per model and
+agent by `config/clickhouse/initdb.d/07-stream-rollups.sql`.
+"""
+
+import math
+import time
+
+from typing import Any
+
+STREAM_TIMING_FIELD = "stream_timing"
+
+# Buckets per doubling of the gap, and the lower bound of the first bucket
+_BUCKETS_PER_OCTAVE = 8
+_MIN_MS = 0.01
+
+
+class LatencyHistogram:
+    """Counts of durations in logarithmic buckets, for approximate percentiles."""
+
+    def __init__(self) -> None:
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.min_ms = math.inf
+        self.max_ms = 0.0
+
+    def add(self, ms: float) -> None:
+        index = int(math.log2(max(ms, _MIN_MS) / _MIN_MS) * _BUCKETS_PER_OCTAVE)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.min_ms = min(self.min_ms, ms)
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> float | None:
+        """Duration below which a share `q` of the counted durations fall."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                # Geometric middle of the bucket, within the observed range
+                middle = _MIN_MS * 2 ** ((index + 0.5) / _BUCKETS_PER_OCTAVE)
+                return min(max(middle, self.min_ms), self.max_ms)
+        return self.max_ms
+
+
+class StreamTimer:
+    """
+    Times the chunks of one streamed model call.
+
+    Args:
+        start_ns: `time.perf_counter_ns()` when the request was sent;
+            defaults to now
+    """
+
+    def __init__(self, start_ns: int | None = None) -> None:
+        self.start_ns = start_ns if start_ns is not None else time.perf_counter_ns()
+        self.first_ns: int | None = None
+        self.last_ns: int | None = None
+        self.chunks = 0
+        self.gaps = LatencyHistogram()
+
+    def chunk(self, now_ns: int | None = None) -> None:
+        """Record the arrival of a chunk of the response."""
+        now_ns = now_ns if now_ns is not None else time.perf_counter_ns()
+        if self.first_ns is None:
+            self.first_ns = now_ns
+        else:
+            self.gaps.add((now_ns - self.last_ns) / 1e6)
+        self.last_ns = now_ns
+        self.chunks += 1
+
+    @property
+    def ttft_ms(self) -> float | None:
+        if self.first_ns is None:
+            return None
+        return (self.first_ns - self.start_ns) / 1e6
+
+    def to_dict(self, output_tokens: int | None = None) -> dict[str, Any] | None:
+        """
+        The timing report, or None when no chunk arrived (the response
+        wasn't streamed). Pass the call's output token count, when known,
+        for `tokens_per_second`; otherwise chunks are counted as tokens.
+        """
+        if self.first_ns is None:
+            return None
+        stream_ms = (self.last_ns - self.first_ns) / 1e6
+        # The first chunk's tokens arrived with the time to first token
+        tokens = (output_tokens or self.chunks) * (self.chunks - 1) / self.chunks
+        return {
+            "ttft_ms": round(self.ttft_ms, 3),
+            "stream_ms": round(stream_ms, 3),
+            "chunks": self.chunks,
+            "tokens_per_second": round(tokens / (stream_ms / 1e3), 3) if stream_ms > 0 else None,
+            "inter_token_ms": {
+                name: round(value, 3) if value is not None else None
+                for name, value in (
+                    ("p50", self.gaps.quantile(0.5)),
+                    ("p90", self.gaps.quantile(0.9)),
+                    ("p99", self.gaps.quantile(0.99)),
+                    ("max", self.gaps.max_ms if self.gaps.count else None),
+                )
+            },
+        }
+
+
+def log_fields(timer: StreamTimer | None, output_tokens: int | None = None) -> dict[str, Any]:
+    """Keyword arguments for `create_llm_response_log` carrying the timing report."""
+    report = timer.to_dict(output_tokens) if timer is not None else None
+    if report is None:
+        return {}
+    return {"additional_properties": {STREAM_TIMING_FIELD: report}}
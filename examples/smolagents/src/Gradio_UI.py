@@ -13,6 +13,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import logging
 import mimetypes
 import os
 import re
@@ -21,13 +22,19 @@ import shutil
 from datetime import datetime
 from typing import Optional
 
-from coa_dev_coagent import CoagentClient
+from coa_dev_coagent.logapi import create_session_start_log, create_user_input_log
 from smolagents.agent_types import AgentAudio, AgentImage, AgentText, handle_agent_output_types
 from smolagents.agents import ActionStep, MultiStepAgent
 from smolagents.memory import MemoryStep
 from smolagents.utils import _is_package_available
 
-from counters import get_session_id, get_prompt_number, get_turn_number
+from coagent_clients import shared_client
+from counters import SessionContext, current_session, end_session, get_session
+from instrumentation import Instrumentation
+from log_spool import LogSpool
+from session_sampler import SessionSampler
+
+log = logging.getLogger("coagent.ui")
 
 def pull_messages_from_step(
     step_log: MemoryStep,
@@ -182,31 +189,43 @@ def stream_to_gradio(
 class GradioUI:
     """A one-line interface to launch your agent in Gradio"""
 
-    def __init__(self, agent: MultiStepAgent, file_upload_folder: str | None = None):
+    def __init__(self, agent: MultiStepAgent, file_upload_folder: str | None = None,
+                 sampler: SessionSampler | None = None, instrumentation: Instrumentation | None = None):
         if not _is_package_available("gradio"):
             raise ModuleNotFoundError(
                 "Please install 'gradio' extra to use the GradioUI: `pip install 'smolagents[gradio]'`"
             )
-        self.coa = CoagentClient()
+        self.sampler = sampler or SessionSampler(LogSpool(shared_client()).append)
+        self.instrumentation = instrumentation or Instrumentation(self.sampler.offer, accepts=self.sampler.accepts)
         self.agent = agent
         self.file_upload_folder = file_upload_folder
         if self.file_upload_folder is not None:
             if not os.path.exists(file_upload_folder):
                 os.mkdir(file_upload_folder)
 
-    def interact_with_agent(self, prompt, messages):
+    def _session(self, session_key: str | None) -> SessionContext:
+        """Counters for a Gradio session, or the current session when no key is given."""
+        return get_session(session_key) if session_key else current_session()
+
+    def interact_with_agent(self, prompt, messages, session_key: str | None = None):
+        # Agent step callbacks read the session from the context
+        yield from self._session(session_key).bind(self._interact_with_agent(prompt, messages))
+
+    def _interact_with_agent(self, prompt, messages):
         import gradio as gr
 
+        session = current_session()
+
         # Log user input to CoAgent
         try:
-            self.coa.log_user_input(
-                session_id=get_session_id(),
+            self.instrumentation.emit(session.session_id, "user_input", lambda: create_user_input_log(
+                session_id=session.session_id,
                 prompt=prompt,
-                prompt_number=get_prompt_number(False),
-                turn_number=get_turn_number(False),
-            )
+                prompt_number=session.get_prompt_number(False),
+                turn_number=session.get_turn_number(False),
+            ))
         except Exception as e:
-            print(f"Failed to log user input: {e}")
+            log.error("Failed to log user input: %s", e)
 
         messages.append(gr.ChatMessage(role="user", content=prompt))
         yield messages
@@ -263,18 +282,19 @@ class GradioUI:
 
         return gr.Textbox(f"File uploaded: {file_path}", visible=True), file_uploads_log + [file_path]
 
-    def log_user_message(self, text_input, file_uploads_log):
+    def log_user_message(self, text_input, file_uploads_log, session_key: str | None = None):
+        session = self._session(session_key)
         try:
-            prompt_number = get_prompt_number(True)
-            turn_number = get_turn_number(True)
+            prompt_number = session.get_prompt_number(True)
+            turn_number = session.get_turn_number(True)
 
             if prompt_number == 1 and turn_number == 1:
-                self.coa.log_session_start(
-                    session_id=get_session_id(),
+                self.instrumentation.emit(session.session_id, "session_start", lambda: create_session_start_log(
+                    session_id=session.session_id,
                     prompt=text_input,
                     prompt_number=prompt_number,
                     turn_number=turn_number,
-                )
+                ))
         except Exception:
             pass  # Ignore if CoagentClient is not properly initialized
 
@@ -291,6 +311,17 @@ class GradioUI:
     def launch(self, **kwargs):
         import gradio as gr
 
+        # Gradio passes the request to handlers annotated with gr.Request,
+        # its session hash keys the CoAgent session of each browser tab
+        def log_user_message(text_input, file_uploads_log, request: gr.Request):
+            return self.log_user_message(text_input, file_uploads_log, request.session_hash)
+
+        def interact_with_agent(prompt, messages, request: gr.Request):
+            yield from self.interact_with_agent(prompt, messages, request.session_hash)
+
+        def close_session(request: gr.Request):
+            end_session(request.session_hash)
+
         with gr.Blocks(fill_height=True) as demo:
             stored_messages = gr.State([])
             file_uploads_log = gr.State([])
@@ -315,10 +346,11 @@ class GradioUI:
                 )
             text_input = gr.Textbox(lines=1, label="Chat Message")
             text_input.submit(
-                self.log_user_message,
+                log_user_message,
                 [text_input, file_uploads_log],
                 [stored_messages, text_input],
-            ).then(self.interact_with_agent, [stored_messages, chatbot], [chatbot])
+            ).then(interact_with_agent, [stored_messages, chatbot], [chatbot])
+            demo.unload(close_session)
 
         demo.launch(debug=True, share=True, **kwargs)
 
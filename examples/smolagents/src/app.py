@@ -1,17 +1,35 @@
+import atexit
+import logging
 import os
 import json
 
 from dotenv import load_dotenv
-from smolagents import CodeAgent, OpenAIModel, MemoryStep, MultiStepAgent, ActionStep
+from smolagents import CodeAgent, MemoryStep, MultiStepAgent, ActionStep
 from Gradio_UI import GradioUI
 
-from coa_dev_coagent import CoagentClient
-from coa_dev_coagent.logapi import create_tool_call_log, create_tool_response_log
+from coa_dev_coagent.logapi import (
+    create_error_log,
+    create_llm_call_log,
+    create_llm_response_log,
+    create_session_end_log,
+    create_tool_call_log,
+    create_tool_response_log,
+)
 
 from tools.flight_search import FlightSearchTool
 from tools.final_answer import FinalAnswerTool
 
-from counters import get_session_id, get_prompt_number, get_turn_number
+import hook_logging
+import semantic_cache
+from cached_model import CachedOpenAIModel, semantic_hit
+from coagent_clients import shared_client
+from counters import current_session
+from instrumentation import Instrumentation
+from log_spool import LogSpool
+from session_sampler import SessionSampler
+from payload_governor import DEFAULT_BLOB_DIR, BlobStore, PayloadGovernor
+from prompt_dedup import PromptDeduplicator
+from semantic_cache import SemanticCache
 
 load_dotenv()
 
@@ -22,81 +40,132 @@ llm_api_base = os.environ.get("LLM_API_BASE")
 if not llm_model or not llm_api_key:
     raise ValueError("LLM_MODEL and LLM_API_KEY must be set in the environment variables.")
 
-client = CoagentClient()
+# One client, and connection pool, for the whole process
+client = shared_client()
+# Log entries are written ahead to disk and shipped in the background, so a
+# slow or unreachable CoAgent server never holds up the agent
+# Prompts are logged as content-addressed message chunks with
+# COAGENT_PROMPT_DEDUP=1; a session whose entries are lost sends its next
+# prompt whole
+prompt_dedup = PromptDeduplicator()
+spool = LogSpool(
+    client,
+    directory=os.environ.get("COAGENT_SPOOL_DIR", ".coagent_spool"),
+    on_drop=prompt_dedup.forget,
+)
+atexit.register(spool.close)
+# Sessions outside the head sample are only logged when they fail, run slow
+# or use many tokens; prompt chunks of dropped runs are sent again
+sampler = SessionSampler(spool.append, on_drop=prompt_dedup.forget)
+# Oversized tool arguments, outputs and observations are truncated; a sample
+# of them is kept whole in a local blob store
+payloads = PayloadGovernor(blob_store=BlobStore(os.environ.get("COAGENT_BLOB_DIR", DEFAULT_BLOB_DIR)))
+# Events and content to log, from COAGENT_LOG_LEVEL; entries that won't be
+# logged are never built
+instrumentation = Instrumentation(sampler.offer, accepts=sampler.accepts)
+# Hooks log through a queue, so they never wait on stdout
+hook_logging.configure_logging(logging.DEBUG if instrumentation.debug_enabled else logging.INFO)
+log = logging.getLogger("coagent.app")
+# Paraphrased repeat tasks are answered from earlier responses, when
+# COAGENT_SEMANTIC_CACHE is set
+response_cache = SemanticCache.from_env()
+if response_cache is not None:
+    atexit.register(response_cache.save)
+
+
+def render_messages(step: ActionStep) -> list[str]:
+    """One prompt chunk per message, using render_as_markdown when available."""
+    return [
+        (
+            msg.render_as_markdown()  # preferred rich text
+            if hasattr(msg, "render_as_markdown")
+            else str(getattr(msg, "content", ""))
+        )
+        for msg in step.model_input_messages
+        if hasattr(msg, "content") or hasattr(msg, "render_as_markdown")
+    ]
+
+# Agents run by another agent; their final answer is reported back to it and
+# doesn't end the session, which the tail sampler decides runs on
+managed_agent_names: set[str] = set()
 
 # Callbacks used to log CoAgent
 def logging_step_callback(
     step: MemoryStep,
     agent: MultiStepAgent
 ):
+    if not instrumentation.active:
+        return
+    session = current_session()
     match step:
         case ActionStep():
             # Log raw LLM call early (prompt + model output) if we have input messages
             if step.model_input_messages:
                 try:
-                    # Original simple join approach, but use render_as_markdown when available.
-                    prompt = "\n".join(
-                        (
-                            msg.render_as_markdown()  # preferred rich text
-                            if hasattr(msg, "render_as_markdown")
-                            else str(getattr(msg, "content", ""))
-                        )
-                        for msg in step.model_input_messages
-                        if hasattr(msg, "content") or hasattr(msg, "render_as_markdown")
-                    )
-                    client.log_llm_call_new(
-                        session_id=get_session_id(),
+                    instrumentation.emit(session.session_id, "llm_call", lambda: create_llm_call_log(
+                        session_id=session.session_id,
                         issuer=agent.name,
-                        prompt=prompt,
-                        prompt_number=get_prompt_number(False),
-                        turn_number=get_turn_number(False),
-                    )
+                        prompt_number=session.get_prompt_number(False),
+                        turn_number=session.get_turn_number(False),
+                        # Messages sent in earlier steps are only referenced by hash
+                        **instrumentation.content(
+                            lambda: prompt_dedup.log_fields(
+                                session.session_id, render_messages(step), issuer=agent.name
+                            ),
+                            {"prompt": None},
+                        ),
+                    ))
                 except Exception as e:
-                    print(f"Failed to log LLM call: {e}")
+                    log.error("Failed to log LLM call: %s", e)
 
             try:
                 # Lock counters for this step so multiple logs share the same numbers
-                pn = get_prompt_number(True)
-                tn = get_turn_number(True)
+                pn = session.get_prompt_number(True)
+                tn = session.get_turn_number(True)
 
                 if step.error is not None:
-                    client.log_error(
-                        session_id=get_session_id(),
+                    instrumentation.emit(session.session_id, "error", lambda: create_error_log(
+                        session_id=session.session_id,
                         prompt_number=pn,
                         turn_number=tn,
                         error_message=str(step.error),
-                    )
+                    ))
 
                 if step.model_output:
-                    input_tokens = getattr(step.token_usage, "input_tokens", None)
-                    output_tokens = getattr(step.token_usage, "output_tokens", None)
-                    total_tokens = getattr(step.token_usage, "total_tokens", None)
-                    client.log_llm_response(
-                        session_id=get_session_id(),
-                        response=step.model_output,
+                    instrumentation.emit(session.session_id, "llm_response", lambda: create_llm_response_log(
+                        session_id=session.session_id,
+                        response=instrumentation.content(lambda: step.model_output, ""),
                         prompt_number=pn,
                         turn_number=tn,
-                        total_tokens=total_tokens,
-                        input_tokens=input_tokens,
-                        output_tokens=output_tokens,
-                    )
+                        total_tokens=getattr(step.token_usage, "total_tokens", None),
+                        input_tokens=getattr(step.token_usage, "input_tokens", None),
+                        output_tokens=getattr(step.token_usage, "output_tokens", None),
+                        # Dimensions of the ClickHouse usage rollups
+                        meta={
+                            "model": getattr(agent.model, "model_id", None) or "",
+                            "issuer": agent.name,
+                        },
+                        # Similarity and age of the cached answer, when there was one
+                        **semantic_cache.log_fields(semantic_hit(step.model_output_message)),
+                    ))
 
                 if step.tool_calls and create_tool_call_log is not None:
                     for tc in step.tool_calls:
                         try:
-                            client.store_log(
-                                create_tool_call_log(
-                                    session_id=get_session_id(),
-                                    prompt_number=pn,
-                                    turn_number=tn,
-                                    tool_name=tc.name,
-                                    parameters=tc.arguments,
-                                )
-                            )
+                            instrumentation.emit(session.session_id, "tool_call", lambda: create_tool_call_log(
+                                session_id=session.session_id,
+                                prompt_number=pn,
+                                turn_number=tn,
+                                tool_name=tc.name,
+                                parameters=instrumentation.content(
+                                    lambda: payloads.govern("parameters", tc.arguments)
+                                ),
+                            ))
                         except Exception as e:
-                            print(f"Failed to log tool call {getattr(tc, 'name', 'unknown')}: {e}")
+                            log.error("Failed to log tool call %s: %s", getattr(tc, 'name', 'unknown'), e)
 
-                if (step.observations is not None or step.action_output is not None):
+                if ((step.observations is not None or step.action_output is not None)
+                        and instrumentation.enabled("tool_response")):
                     result_payload = {}
                     if step.action_output is not None:
                         result_payload["action_output"] = step.action_output
@@ -117,23 +186,23 @@ def logging_step_callback(
                         exec_time_ms = None
 
                     try:
-                        client.store_log(
-                            create_tool_response_log(
-                                session_id=get_session_id(),
-                                prompt_number=pn,
-                                turn_number=tn,
-                                tool_name=first_tool_name,
-                                parameters=first_params,
-                                result=result_payload,
-                                success=step.error is None,
-                                error_message=str(step.error) if step.error else None,
-                                execution_time_ms=exec_time_ms,
-                            )
-                        )
+                        instrumentation.emit(session.session_id, "tool_response", lambda: create_tool_response_log(
+                            session_id=session.session_id,
+                            prompt_number=pn,
+                            turn_number=tn,
+                            tool_name=first_tool_name,
+                            parameters=instrumentation.content(
+                                lambda: payloads.govern("parameters", first_params)
+                            ),
+                            result=instrumentation.content(lambda: payloads.govern_fields(result_payload)),
+                            success=step.error is None,
+                            error_message=str(step.error) if step.error else None,
+                            execution_time_ms=exec_time_ms,
+                        ))
                     except Exception as e:
-                        print(f"Failed to log tool response: {e}")
+                        log.error("Failed to log tool response: %s", e)
 
-                if step.is_final_answer:
+                if step.is_final_answer and agent.name not in managed_agent_names:
                     final_elapsed_ms = None
                     try:
                         if step.timing is not None and getattr(step.timing, "duration", None) is not None:
@@ -141,23 +210,28 @@ def logging_step_callback(
                     except Exception:
                         final_elapsed_ms = None
 
-                    client.log_session_end(
-                        session_id=get_session_id(),
-                        response=step.model_output,
+                    instrumentation.emit(session.session_id, "session_end", lambda: create_session_end_log(
+                        session_id=session.session_id,
+                        response=instrumentation.content(lambda: step.model_output, ""),
                         prompt_number=pn,
                         turn_number=tn,
                         elapsed_time_ms=final_elapsed_ms,
-                    )
+                        meta={
+                            "hook_log": hook_logging.metrics.to_dict(),
+                            **({"semantic_cache": response_cache.metrics.to_dict()} if response_cache else {}),
+                        },
+                    ))
             except Exception as e:
-                print(f"Failed to log action step: {e}")
+                log.error("Failed to log action step: %s", e)
             return
         case _:
-            print(f"[{agent.name}] {step}")
+            instrumentation.debug("[%s] %s", agent.name, step)
 
-model = OpenAIModel(
+model = CachedOpenAIModel(
     model_id=llm_model,
     api_key=llm_api_key,
-    api_base=llm_api_base
+    api_base=llm_api_base,
+    cache=response_cache,
 )
 
 transportation_agent = CodeAgent(
@@ -190,5 +264,6 @@ agent = CodeAgent(
         logging_step_callback,
     ],
 )
+managed_agent_names.update(agent.managed_agents)
 
-GradioUI(agent).launch(server_name="0.0.0.0")
+GradioUI(agent, sampler=sampler, instrumentation=instrumentation).launch(server_name="0.0.0.0")
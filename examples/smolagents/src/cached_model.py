@@ -0,0 +1,92 @@
+"""
+`OpenAIModel` answering paraphrased repeat questions from a `SemanticCache`.
+
+The question compared by meaning is the latest user message, i.e. the task
+of the run (or, when a session runs several tasks, the latest of them).
+All other messages, with the question left out, and the model id, stop
+sequences, tools and response format must match exactly. So the first step
+of a paraphrased task is answered from the cache; when its code runs into
+the same observations as before, the steps after it are too.
+"""
+
+import json
+
+from typing import Any
+
+from smolagents import ChatMessage, MessageRole, OpenAIModel, TokenUsage, Tool
+
+from semantic_cache import SEMANTIC_CACHE_FIELD, SemanticCache, SemanticHit, cache_context
+
+
+class CachedOpenAIModel(OpenAIModel):
+    """
+    OpenAIModel that looks up each call in `cache` first; with no cache it
+    behaves as OpenAIModel.
+    """
+
+    def __init__(self, *args: Any, cache: SemanticCache | None = None, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.cache = cache
+
+    def generate(
+        self,
+        messages: list[ChatMessage | dict],
+        stop_sequences: list[str] | None = None,
+        response_format: dict[str, str] | None = None,
+        tools_to_call_from: list[Tool] | None = None,
+        **kwargs: Any,
+    ) -> ChatMessage:
+        def call() -> ChatMessage:
+            return super(CachedOpenAIModel, self).generate(
+                messages, stop_sequences, response_format, tools_to_call_from, **kwargs
+            )
+
+        rendered = [(_role(m), _text(m)) for m in messages]
+        questions = [i for i, (role, _) in enumerate(rendered) if role == MessageRole.USER]
+        if self.cache is None or not questions:
+            return call()
+
+        question = questions[-1]
+        lookup = self.cache.lookup(
+            rendered[question][1],
+            cache_context(
+                model=self.model_id,
+                messages=[m if i != question else (MessageRole.USER, None) for i, m in enumerate(rendered)],
+                stop_sequences=stop_sequences,
+                response_format=response_format,
+                tools=[tool.name for tool in tools_to_call_from or []],
+                kwargs=kwargs,
+            ),
+        )
+        if lookup.hit is not None:
+            data = dict(lookup.hit.value)
+            data["role"] = MessageRole(data["role"])
+            # Nothing was spent on this answer
+            return ChatMessage.from_dict(data, raw={SEMANTIC_CACHE_FIELD: lookup.hit}, token_usage=TokenUsage(0, 0))
+
+        message = call()
+        # The raw API response and token usage belong to the original call
+        data = json.loads(message.model_dump_json())
+        data.pop("token_usage", None)
+        self.cache.store(lookup, data)
+        return message
+
+
+def semantic_hit(message: ChatMessage | None) -> SemanticHit | None:
+    """The cache hit a message was answered from, if it was."""
+    raw = getattr(message, "raw", None)
+    return raw.get(SEMANTIC_CACHE_FIELD) if isinstance(raw, dict) else None
+
+
+def _role(message: ChatMessage | dict) -> str:
+    return message["role"] if isinstance(message, dict) else message.role
+
+
+def _text(message: ChatMessage | dict) -> str:
+    content = message["content"] if isinstance(message, dict) else message.content
+    if isinstance(content, list):
+        return "\n".join(
+            part.get("text", "") if part.get("type") == "text" else json.dumps(part, default=str)
+            for part in content
+        )
+    return content or ""
@@ -1,28 +1,103 @@
+import itertools
 import os
+import threading
 
+from collections import OrderedDict
+from contextvars import ContextVar
 from datetime import datetime
+from typing import Iterator, TypeVar
+
+T = TypeVar("T")
 
-prompt_number = 1
-turn_number = 1
 session_date = datetime.now().astimezone().isoformat()
 
-def get_session_id():
+# Oldest sessions are forgotten once this many are tracked
+MAX_SESSIONS = 1024
+
+
+class SessionContext:
+    """
+    Session id and prompt/turn counters for one user session.
+
+    Increments go through `itertools.count`, whose `next()` is atomic in
+    CPython, so concurrent callbacks of the same session never hand out the
+    same number. Reading the current value without incrementing is a
+    best-effort snapshot.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self._prompt_counter = itertools.count(1)
+        self._turn_counter = itertools.count(1)
+        self._prompt_number = 1
+        self._turn_number = 1
+
+    def get_prompt_number(self, add: bool = False) -> int:
+        """Return the current prompt number, moving to the next one when `add` is set."""
+        if add:
+            current = next(self._prompt_counter)
+            self._prompt_number = max(self._prompt_number, current + 1)
+            return current
+        return self._prompt_number
+
+    def get_turn_number(self, add: bool = False) -> int:
+        """Return the current turn number, moving to the next one when `add` is set."""
+        if add:
+            current = next(self._turn_counter)
+            self._turn_number = max(self._turn_number, current + 1)
+            return current
+        return self._turn_number
+
+    def bind(self, iterator: Iterator[T]) -> Iterator[T]:
+        """
+        Advance `iterator` with this session as the current one.
+
+        The session is set around each `next()` call rather than once, since
+        Gradio runs every step of a generator handler in a worker thread with
+        its own copy of the context.
+        """
+        while True:
+            token = _current_session.set(self)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current_session.reset(token)
+            yield item
+
+
+def _base_session_id() -> str:
     return os.environ.get("SESSION_ID", f'smolagents-{session_date}')
 
-def get_prompt_number(add: bool = False):
-    global prompt_number
 
-    if add:
-        current = prompt_number
-        prompt_number += 1
-        return current
-    return prompt_number
+_default_session = SessionContext(_base_session_id())
+_current_session: ContextVar[SessionContext] = ContextVar("coagent_session", default=_default_session)
+_sessions: OrderedDict[str, SessionContext] = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def get_session(key: str) -> SessionContext:
+    """Return the session for `key` (e.g. a Gradio session hash), creating it if needed."""
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = SessionContext(f'{_base_session_id()}-{key}')
+            _sessions[key] = session
+            if len(_sessions) > MAX_SESSIONS:
+                _sessions.popitem(last=False)
+        else:
+            _sessions.move_to_end(key)
+        return session
+
+
+def end_session(key: str) -> None:
+    """Forget the session for `key`."""
+    with _sessions_lock:
+        _sessions.pop(key, None)
+
 
-def get_turn_number(add: bool):
-    global turn_number
+def current_session() -> SessionContext:
+    """Return the session bound to the running context, or the process-wide default one."""
+    return _current_session.get()
 
-    if add:
-        current = turn_number
-        turn_number += 1
-        return current
-    return turn_number
@@ -0,0 +1,572 @@
+# Shared by the examples: edit examples/adk/agent/log_spool.py and run tools/shared_modules.py sync
+"""
+Durable, disk-backed spool for CoAgent log entries.
+
+Entries are appended as JSON lines to numbered segment files and shipped to
+`POST /logs` in batches by a background replay thread. Appending is a local
+file write, so the agent never waits on the CoAgent server; when the server
+is slow or down the entries stay on disk and are re-sent with exponential
+backoff, including after a restart of the process.
+
+Batches are sent as gzip-compressed NDJSON (one entry per line) when the
+server accepts it, with a per-event status for every entry, and as a plain
+JSON array otherwise. See `BulkSender`.
+
+Delivery is at-least-once: a crash between sending a batch and recording
+its position can send that batch again.
+"""
+
+import gzip
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Iterable
+
+from coa_dev_coagent import CoagentClient
+from coa_dev_coagent.logapi import LogEntry, LogRequest
+
+log = logging.getLogger("coagent.spool")
+
+# fsync policies
+FSYNC_ALWAYS = "always"      # fsync after every append
+FSYNC_INTERVAL = "interval"  # fsync at most every `fsync_interval` seconds
+FSYNC_NEVER = "never"        # leave flushing to the OS
+
+SEGMENT_SUFFIX = ".log"
+# Evicted segments are renamed, so they can be read outside the lock
+EVICTED_SUFFIX = ".evicted"
+CURSOR_FILE = "cursor.json"
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+@dataclass
+class SpoolMetrics:
+    """Counters describing what went through the spool."""
+
+    appended: int = 0
+    sent: int = 0
+    rejected: int = 0
+    send_failures: int = 0
+    evicted_segments: int = 0
+    pending_bytes: int = 0
+    bytes_sent: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass
+class EventStatus:
+    """Outcome of one entry of a bulk request."""
+
+    index: int
+    event_id: str | None
+    ok: bool
+    error: str | None = None
+
+
+@dataclass
+class BulkResult:
+    """Outcome of a bulk request: the HTTP status and one status per entry."""
+
+    status_code: int
+    statuses: list[EventStatus]
+    bytes_sent: int
+
+    @property
+    def accepted(self) -> int:
+        return sum(status.ok for status in self.statuses)
+
+    @property
+    def rejected(self) -> int:
+        return len(self.statuses) - self.accepted
+
+    @property
+    def retryable(self) -> bool:
+        """True when the whole request failed in a way worth retrying."""
+        return self.status_code >= 500 or self.status_code in (408, 429)
+
+
+class BulkSender:
+    """
+    Sends batches of serialized log entries to `POST /logs` in one request.
+
+    The batch is encoded as NDJSON and gzip-compressed once it is larger than
+    `compress_min_bytes`. The response is expected to carry a `results` list
+    with the status of each entry:
+
+        {"success": false, "accepted": 1, "rejected": 1,
+         "results": [{"index": 0, "status": "ok"},
+                     {"index": 1, "status": "error", "error": "..."}]}
+
+    Servers that only take JSON arrays (responding 400, 404, 405 or 415 to
+    the first NDJSON request) get JSON arrays from then on, and the status of
+    the whole request is applied to every entry.
+
+    `send` posts with the client's `requests` session and blocks; `asend`
+    posts with `async_client` (an `AsyncCoagentClient`) from the event loop.
+    """
+
+    def __init__(self, client: CoagentClient, compress: bool = True,
+                 compress_min_bytes: int = 1024, async_client=None) -> None:
+        self.client = client
+        self.async_client = async_client
+        self.compress = compress
+        self.compress_min_bytes = compress_min_bytes
+        # None until the first NDJSON request tells whether it is supported
+        self.ndjson_supported: bool | None = None
+
+    def send(self, entries: list[dict[str, Any]]) -> BulkResult:
+        """
+        POST one batch. Raises the `requests` exception when the server can't
+        be reached; HTTP errors are reported in the result.
+        """
+        if self.ndjson_supported is not False:
+            body, headers = self._encode_ndjson(entries)
+            response = self._post(body, headers)
+            if self._accepts_ndjson(response):
+                return self._result(entries, response, len(body))
+
+        body = self._encode_json(entries)
+        response = self._post(body, {"Content-Type": "application/json"})
+        return self._result(entries, response, len(body))
+
+    async def asend(self, entries: list[dict[str, Any]]) -> BulkResult:
+        """
+        POST one batch with `async_client`. Raises the `httpx` exception when
+        the server can't be reached; HTTP errors are reported in the result.
+        """
+        if self.ndjson_supported is not False:
+            body, headers = self._encode_ndjson(entries)
+            response = await self.async_client.post_logs(body, headers)
+            if self._accepts_ndjson(response):
+                return self._result(entries, response, len(body))
+
+        body = self._encode_json(entries)
+        response = await self.async_client.post_logs(body, {"Content-Type": "application/json"})
+        return self._result(entries, response, len(body))
+
+    def _accepts_ndjson(self, response) -> bool:
+        """Record from the first NDJSON response whether the server takes NDJSON."""
+        if self.ndjson_supported is None:
+            if response.status_code in (400, 404, 405, 415) and "results" not in self._json(response):
+                log.warning("CoAgent did not accept NDJSON (HTTP %s), sending JSON arrays instead",
+                            response.status_code)
+                self.ndjson_supported = False
+            elif response.status_code < 300:
+                self.ndjson_supported = True
+        return self.ndjson_supported is not False
+
+    @staticmethod
+    def _encode_json(entries: list[dict[str, Any]]) -> bytes:
+        return json.dumps(entries, separators=(",", ":"), default=str).encode("utf-8")
+
+    def _encode_ndjson(self, entries: list[dict[str, Any]]) -> tuple[bytes, dict[str, str]]:
+        body = b"".join(
+            json.dumps(entry, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+            for entry in entries
+        )
+        headers = {"Content-Type": NDJSON_CONTENT_TYPE}
+        if self.compress and len(body) >= self.compress_min_bytes:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        return body, headers
+
+    def _post(self, body: bytes, headers: dict[str, str]):
+        return self.client.session.post(
+            f"{self.client.base_url}/logs", data=body, headers=headers, timeout=self.client.timeout
+        )
+
+    @staticmethod
+    def _json(response) -> dict[str, Any]:
+        try:
+            result = response.json()
+        except ValueError:
+            return {}
+        return result if isinstance(result, dict) else {}
+
+    def _result(self, entries: list[dict[str, Any]], response, bytes_sent: int) -> BulkResult:
+        result = self._json(response)
+        ok = response.status_code < 300 and result.get("success") is not False
+        error = None if ok else result.get("message") or f"HTTP {response.status_code}"
+        statuses = [EventStatus(i, entry.get("event_id"), ok, error) for i, entry in enumerate(entries)]
+
+        for item in result.get("results") or []:
+            index = item.get("index")
+            if isinstance(index, int) and 0 <= index < len(statuses):
+                statuses[index].ok = item.get("status") == "ok"
+                statuses[index].error = item.get("error")
+        return BulkResult(response.status_code, statuses, bytes_sent)
+
+
+class LogSpool:
+    """
+    Append-only, segment-rotated write-ahead log of CoAgent log entries.
+
+    Args:
+        client: Client whose base URL, session and timeout are used to send
+        directory: Directory holding the segment files and the replay cursor
+        segment_max_bytes: Size after which the active segment is rotated
+        max_total_bytes: Cap of the bytes not sent yet; the oldest segments
+            are evicted first
+        fsync: One of FSYNC_ALWAYS, FSYNC_INTERVAL or FSYNC_NEVER
+        fsync_interval: Seconds between fsyncs with FSYNC_INTERVAL
+        batch_size: Maximum number of entries sent per request
+        compress: Gzip NDJSON batches larger than a kilobyte
+        backoff_initial: First delay in seconds after a failed send
+        backoff_max: Upper bound of the delay between retries
+        on_drop: Called with the session id of entries that are lost, i.e.
+            rejected by the server or evicted, once per session and batch
+    """
+
+    def __init__(
+        self,
+        client: CoagentClient,
+        directory: str = ".coagent_spool",
+        segment_max_bytes: int = 4 * 1024 * 1024,
+        max_total_bytes: int = 256 * 1024 * 1024,
+        fsync: str = FSYNC_INTERVAL,
+        fsync_interval: float = 1.0,
+        batch_size: int = 100,
+        compress: bool = True,
+        backoff_initial: float = 0.5,
+        backoff_max: float = 60.0,
+        on_drop: Callable[[str], None] | None = None,
+    ) -> None:
+        if fsync not in (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER):
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+
+        self.client = client
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.max_total_bytes = max_total_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.batch_size = batch_size
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.on_drop = on_drop
+        self.metrics = SpoolMetrics()
+        self.sender = BulkSender(client, compress=compress)
+        # False while the server can't be reached; writers may then spool
+        # directly instead of trying the server first
+        self.healthy = True
+
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            # Left over from an eviction interrupted by a crash
+            if name.endswith(EVICTED_SUFFIX):
+                os.remove(os.path.join(directory, name))
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._draining = threading.Event()
+        self._stopped = threading.Event()
+
+        segments = self._segments()
+        self._active_seq = segments[-1] if segments else 1
+        self._truncate_torn_line(self._segment_path(self._active_seq))
+        self._active = open(self._segment_path(self._active_seq), "ab")
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+        # Bytes of the segments on disk, and how many of them were sent from
+        # the segment the cursor is in; the difference is pending
+        self._stored_bytes = sum(os.path.getsize(self._segment_path(seq)) for seq in self._segments())
+        self._sent_seq, self._sent_offset = self._load_cursor()
+        if self._sent_seq not in self._segments():
+            self._sent_offset = 0
+        self._update_pending_locked()
+
+        self._thread = threading.Thread(target=self._run, name="coa-log-spool", daemon=True)
+        self._thread.start()
+
+    def append(self, entry: LogEntry | dict[str, Any]) -> None:
+        """Write one entry to the spool; it is sent in the background."""
+        self.append_many([entry])
+
+    def append_many(self, entries: Iterable[LogEntry | dict[str, Any]]) -> None:
+        """Write several entries to the spool with a single write."""
+        lines = []
+        for entry in entries:
+            # The JSON object `POST /logs` expects, as `CoagentClient` sends it
+            data = entry if isinstance(entry, dict) else LogRequest(entry=entry).to_dict()
+            lines.append(json.dumps(data, separators=(",", ":"), default=str))
+        if not lines:
+            return
+        payload = ("\n".join(lines) + "\n").encode("utf-8")
+
+        evicted: list[str] = []
+        with self._lock:
+            self._active.write(payload)
+            # Hand the bytes to the OS so the replay thread can read them
+            self._active.flush()
+            self._dirty = True
+            self._stored_bytes += len(payload)
+            self._update_pending_locked()
+            self.metrics.appended += len(lines)
+
+            if self.fsync == FSYNC_ALWAYS:
+                self._fsync_locked()
+            if self._active.tell() >= self.segment_max_bytes:
+                self._rotate_locked()
+            if self.metrics.pending_bytes > self.max_total_bytes:
+                evicted = self._evict_locked()
+
+        if evicted:
+            self._drop_evicted(evicted)
+        self._wakeup.set()
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Try to send what is spooled for up to `timeout` seconds, then stop.
+
+        Entries that could not be sent stay on disk and are replayed by the
+        next spool opened on the same directory.
+        """
+        self._draining.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join()
+        with self._lock:
+            self._fsync_locked()
+            self._active.close()
+
+    # ------------------------------------------------------------------
+    # Segments
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq:012d}{SEGMENT_SUFFIX}")
+
+    def _segments(self) -> list[int]:
+        return sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+
+    @staticmethod
+    def _truncate_torn_line(path: str) -> None:
+        """
+        Cut off a last line left incomplete by a crash, so the next entry
+        isn't appended to it and lost with it.
+        """
+        try:
+            f = open(path, "r+b")
+        except FileNotFoundError:
+            return
+        with f:
+            size = f.seek(0, os.SEEK_END)
+            end = size
+            while end > 0:
+                start = max(end - 65536, 0)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline >= 0:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end < size:
+                f.truncate(end)
+                log.warning("Log spool dropped %s bytes of an entry torn by a crash in %s", size - end, path)
+
+    def _update_pending_locked(self) -> None:
+        self.metrics.pending_bytes = self._stored_bytes - self._sent_offset
+
+    def _remove_bytes_locked(self, seq: int, size: int) -> None:
+        """Account for a segment of `size` bytes that was deleted."""
+        self._stored_bytes -= size
+        if seq == self._sent_seq:
+            self._sent_offset = 0
+        self._update_pending_locked()
+
+    def _mark_sent(self, seq: int, offset: int) -> None:
+        """Record that the segment `seq` was sent up to `offset`."""
+        with self._lock:
+            # Unless the segment was evicted in the meantime
+            if os.path.exists(self._segment_path(seq)):
+                self._sent_seq, self._sent_offset = seq, offset
+                self._update_pending_locked()
+
+    def _fsync_locked(self) -> None:
+        if self._dirty and self.fsync != FSYNC_NEVER:
+            os.fsync(self._active.fileno())
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+
+    def _rotate_locked(self) -> None:
+        self._fsync_locked()
+        self._active.close()
+        self._active_seq += 1
+        self._active = open(self._segment_path(self._active_seq), "ab")
+
+    def _evict_locked(self) -> list[str]:
+        """
+        Evict the oldest sealed segments until the spool fits its cap.
+
+        Returns the paths they were moved to, for `_drop_evicted`.
+        """
+        evicted = []
+        for seq in self._segments():
+            if self.metrics.pending_bytes <= self.max_total_bytes or seq >= self._active_seq:
+                break
+            path = self._segment_path(seq)
+            try:
+                size = os.path.getsize(path)
+                os.replace(path, path + EVICTED_SUFFIX)
+            except FileNotFoundError:
+                continue
+            evicted.append(path + EVICTED_SUFFIX)
+            self._remove_bytes_locked(seq, size)
+            self.metrics.evicted_segments += 1
+        return evicted
+
+    def _drop_evicted(self, paths: list[str]) -> None:
+        """Report the sessions of evicted segments to `on_drop` and delete them."""
+        log.warning("Log spool over %s bytes, evicted %s segments", self.max_total_bytes, len(paths))
+        session_ids = set()
+        for path in paths:
+            if self.on_drop is not None:
+                with open(path, "rb") as f:
+                    for line in f:
+                        try:
+                            session_ids.add(json.loads(line).get("session_id"))
+                        except (ValueError, AttributeError):
+                            pass
+            os.remove(path)
+        self._dropped(session_ids)
+
+    def _dropped(self, session_ids: Iterable[str | None]) -> None:
+        if self.on_drop is None:
+            return
+        for session_id in set(session_ids) - {None}:
+            self.on_drop(session_id)
+
+    # ------------------------------------------------------------------
+    # Replay
+
+    def _load_cursor(self) -> tuple[int, int]:
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as f:
+                cursor = json.load(f)
+            return int(cursor["segment"]), int(cursor["offset"])
+        except (OSError, ValueError, KeyError):
+            return 0, 0
+
+    def _store_cursor(self, seq: int, offset: int) -> None:
+        path = os.path.join(self.directory, CURSOR_FILE)
+        staging_path = f"{path}.tmp"
+        with open(staging_path, "w") as f:
+            json.dump({"segment": seq, "offset": offset}, f)
+        os.replace(staging_path, path)
+
+    def _read_batch(self, seq: int, offset: int) -> tuple[list[dict], int, int]:
+        """
+        Read up to `batch_size` complete entries starting at the cursor.
+
+        Fully read sealed segments are deleted along the way. Returns the
+        entries and the cursor position after them.
+        """
+        while True:
+            segments = self._segments()
+            if not segments:
+                return [], seq, offset
+            if seq not in segments:
+                # Evicted, or the cursor is fresh: continue at the oldest one
+                seq, offset = next((s for s in segments if s > seq), segments[0]), 0
+
+            entries = []
+            try:
+                with open(self._segment_path(seq), "rb") as f:
+                    f.seek(offset)
+                    while len(entries) < self.batch_size:
+                        line = f.readline()
+                        # A line without newline is still being written
+                        if not line.endswith(b"\n"):
+                            break
+                        offset += len(line)
+                        try:
+                            entries.append(json.loads(line))
+                        except ValueError:
+                            self.metrics.rejected += 1
+            except FileNotFoundError:
+                continue
+
+            if entries or seq >= self._active_seq:
+                return entries, seq, offset
+
+            # Sealed segment fully sent
+            path = self._segment_path(seq)
+            with self._lock:
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                    self._remove_bytes_locked(seq, size)
+                except FileNotFoundError:
+                    pass
+            seq, offset = seq + 1, 0
+            self._store_cursor(seq, offset)
+
+    def _send(self, entries: list[dict]) -> bool:
+        """
+        Send a batch in one bulk request.
+
+        Returns False when the batch should be retried later. Entries the
+        server refuses as invalid are dropped, since retrying can't help.
+        """
+        try:
+            result = self.sender.send(entries)
+        except Exception as e:
+            log.warning("Log spool failed to reach CoAgent: %s", e)
+            self.healthy = False
+            return False
+
+        if result.retryable:
+            log.warning("CoAgent could not store spooled log entries: HTTP %s", result.status_code)
+            self.healthy = False
+            return False
+
+        self.metrics.bytes_sent += result.bytes_sent
+        self.metrics.sent += result.accepted
+        if result.rejected:
+            self.metrics.rejected += result.rejected
+            error = next(status.error for status in result.statuses if not status.ok)
+            log.error("CoAgent rejected %s spooled log entries: %s", result.rejected, error)
+            self._dropped(entries[status.index].get("session_id") for status in result.statuses if not status.ok)
+        self.healthy = True
+        return True
+
+    def _run(self) -> None:
+        seq, offset = self._load_cursor()
+        backoff = self.backoff_initial
+
+        while not self._stopped.is_set():
+            with self._lock:
+                if self._dirty and time.monotonic() - self._last_fsync >= self.fsync_interval:
+                    self._fsync_locked()
+
+            entries, next_seq, next_offset = self._read_batch(seq, offset)
+            if not entries:
+                if self._draining.is_set():
+                    return
+                self._wakeup.wait(self.fsync_interval)
+                self._wakeup.clear()
+                continue
+
+            if not self._send(entries):
+                self.metrics.send_failures += 1
+                # Full jitter keeps many workers from retrying in lockstep
+                self._stopped.wait(random.uniform(0, backoff))
+                backoff = min(backoff * 2, self.backoff_max)
+                continue
+
+            backoff = self.backoff_initial
+            seq, offset = next_seq, next_offset
+            self._store_cursor(seq, offset)
+            self._mark_sent(seq, offset)
@@ -0,0 +1,201 @@
+# Shared by the examples: edit examples/adk/agent/payload_governor.py and run tools/shared_modules.py sync
+"""
+Size limits for the payloads of CoAgent log entries.
+
+Tool results and observations can be arbitrarily large: a flight search
+returns thousands of records, and logging them whole makes one entry
+megabytes big. `PayloadGovernor` checks each payload field against a byte
+budget before the entry is created. Payloads within budget are logged as
+they are. Larger ones are replaced by a reference of this shape:
+
+    {
+      "coagent_payload": "blob",          # or "truncated"
+      "bytes": 5242880,                   # size as UTF-8 JSON, or text for strings
+      "sha256": "9f86d081884c7d65...",
+      "head": "[{\\"flight\\": \\"LH 400\\", ...",
+      "tail": "... \\"price\\": 612}]",
+      "blob": "9f/9f86d081884c7d65..."    # blob entries only
+    }
+
+With a `BlobStore`, a sampled share of the oversized payloads
+(`offload_sample_rate`) is written whole to a local content-addressed store,
+and `blob` is its path there. The others are only truncated to their head
+and tail; `sha256` still identifies the full payload.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable
+
+log = logging.getLogger("coagent.payloads")
+
+PAYLOAD_MARKER = "coagent_payload"
+DEFAULT_BLOB_DIR = os.path.join("coagent_demo_storage", "blobs")
+
+
+@dataclass
+class PayloadPolicy:
+    """
+    Byte budgets for payload fields.
+
+    Attributes:
+        max_field_bytes: Budget of fields not in `field_budgets`
+        field_budgets: Budgets per field name, e.g. {"observations": 4096}
+        tail_fraction: Share of the budget kept from the end of a truncated
+            payload; the rest is kept from the start
+        offload_sample_rate: Probability that an oversized payload is kept
+            whole in the blob store instead of only truncated
+    """
+
+    max_field_bytes: int = 16 * 1024
+    field_budgets: dict[str, int] = field(default_factory=dict)
+    tail_fraction: float = 0.25
+    offload_sample_rate: float = 1.0
+
+    @classmethod
+    def from_env(cls) -> "PayloadPolicy":
+        """
+        Policy from COAGENT_MAX_FIELD_BYTES, COAGENT_FIELD_BUDGETS
+        ("observations=4096,result=32768") and COAGENT_OFFLOAD_SAMPLE_RATE.
+        """
+        budgets = {}
+        for item in filter(None, os.environ.get("COAGENT_FIELD_BUDGETS", "").split(",")):
+            name, _, size = item.partition("=")
+            budgets[name.strip()] = int(size)
+        return cls(
+            max_field_bytes=int(os.environ.get("COAGENT_MAX_FIELD_BYTES", cls.max_field_bytes)),
+            field_budgets=budgets,
+            offload_sample_rate=float(os.environ.get("COAGENT_OFFLOAD_SAMPLE_RATE", cls.offload_sample_rate)),
+        )
+
+    def budget(self, name: str) -> int:
+        return self.field_budgets.get(name, self.max_field_bytes)
+
+
+@dataclass
+class GovernorMetrics:
+    """Counters describing what the governor did to payloads."""
+
+    inline: int = 0
+    truncated: int = 0
+    offloaded: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class BlobStore:
+    """
+    Content-addressed store of payloads on the local disk.
+
+    A blob is stored once under `<directory>/<first two hex digits>/<sha256>`;
+    writing the same content again is a no-op.
+    """
+
+    def __init__(self, directory: str = DEFAULT_BLOB_DIR) -> None:
+        self.directory = directory
+
+    def key(self, digest: str) -> str:
+        return f"{digest[:2]}/{digest}"
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, *key.split("/"))
+
+    def put(self, data: bytes, digest: str | None = None) -> str:
+        """Store `data` and return its key."""
+        key = self.key(digest or hashlib.sha256(data).hexdigest())
+        path = self.path(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return key
+
+    def get(self, key: str) -> bytes:
+        with open(self.path(key), "rb") as f:
+            return f.read()
+
+
+def _encode(value: Any) -> bytes:
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    return json.dumps(value, default=str, ensure_ascii=False).encode("utf-8")
+
+
+class PayloadGovernor:
+    """
+    Applies a `PayloadPolicy` to payload fields of log entries.
+
+    Args:
+        policy: Budgets and sampling; read from the environment when omitted
+        blob_store: Where sampled oversized payloads are kept whole; None to
+            only truncate
+        sample: Returns a float in [0, 1) for each sampling decision
+    """
+
+    def __init__(
+        self,
+        policy: PayloadPolicy | None = None,
+        blob_store: BlobStore | None = None,
+        sample: Callable[[], float] = random.random,
+    ) -> None:
+        self.policy = policy or PayloadPolicy.from_env()
+        self.blob_store = blob_store
+        self.sample = sample
+        self.metrics = GovernorMetrics()
+        self._lock = threading.Lock()
+
+    def govern(self, name: str, value: Any) -> Any:
+        """Return `value`, or a reference to it when it exceeds the budget of field `name`."""
+        if value is None:
+            return None
+        data = _encode(value)
+        budget = self.policy.budget(name)
+        if len(data) <= budget:
+            self._count(inline=1, bytes_in=len(data), bytes_out=len(data))
+            return value
+
+        digest = hashlib.sha256(data).hexdigest()
+        tail_bytes = int(budget * self.policy.tail_fraction)
+        reference = {
+            PAYLOAD_MARKER: "truncated",
+            "bytes": len(data),
+            "sha256": digest,
+            # Cut on byte boundaries; a split character is dropped
+            "head": data[:budget - tail_bytes].decode("utf-8", "ignore"),
+            "tail": data[len(data) - tail_bytes:].decode("utf-8", "ignore") if tail_bytes else "",
+        }
+        offloaded = 0
+        if self.blob_store is not None and self.sample() < self.policy.offload_sample_rate:
+            try:
+                reference["blob"] = self.blob_store.put(data, digest)
+                reference[PAYLOAD_MARKER] = "blob"
+                offloaded = 1
+            except OSError as e:
+                log.error("Failed to store payload blob %s: %s", digest, e)
+        self._count(
+            truncated=1 - offloaded,
+            offloaded=offloaded,
+            bytes_in=len(data),
+            bytes_out=budget,
+        )
+        return reference
+
+    def govern_fields(self, values: dict[str, Any]) -> dict[str, Any]:
+        """Govern each value of a dict of fields."""
+        return {name: self.govern(name, value) for name, value in values.items()}
+
+    def _count(self, **counts: int) -> None:
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self.metrics, name, getattr(self.metrics, name) + count)
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+
+
+class ColumnarTable:
+    """
+    A read-only table stored as one NumPy array per column.
+
+    String columns are dictionary-encoded: the column holds integer codes and
+    a separate array holds the distinct values. Arrays loaded from a cache
+    directory are memory-mapped, so processes reading the same cache share
+    one copy in the page cache.
+    """
+
+    def __init__(self, columns: dict[str, np.ndarray],
+                 dictionaries: dict[str, np.ndarray],
+                 extras: dict[str, np.ndarray] | None = None):
+        self.columns = columns
+        self.dictionaries = dictionaries
+        self.extras = extras or {}
+        self.names = list(columns)
+
+    def __len__(self) -> int:
+        return len(self.columns[self.names[0]]) if self.names else 0
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "ColumnarTable":
+        """Encode a DataFrame, dictionary-encoding its string columns."""
+        columns = {}
+        dictionaries = {}
+        for name in frame.columns:
+            series = frame[name]
+            if pd.api.types.is_numeric_dtype(series):
+                if pd.api.types.is_integer_dtype(series):
+                    series = pd.to_numeric(series, downcast="integer")
+                columns[name] = series.to_numpy()
+            else:
+                codes, uniques = pd.factorize(series.astype(str), sort=True)
+                columns[name] = codes.astype(np.min_scalar_type(max(len(uniques) - 1, 0)))
+                dictionaries[name] = np.asarray(uniques, dtype=str)
+        return cls(columns, dictionaries)
+
+    def values(self, name: str, rows=slice(None)) -> np.ndarray:
+        """Return the decoded values of a column, optionally for some rows."""
+        column = self.columns[name][rows]
+        if name in self.dictionaries:
+            return self.dictionaries[name][column]
+        return column
+
+    def records(self, rows) -> list[dict]:
+        """Build record dictionaries for the given rows only."""
+        values = [self.values(name, rows).tolist() for name in self.names]
+        return [dict(zip(self.names, row)) for row in zip(*values)]
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({name: self.values(name) for name in self.names})
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory)
+        layout = []
+        for name in self.names:
+            file_name = f"{len(layout)}"
+            np.save(os.path.join(directory, f"{file_name}.npy"), self.columns[name])
+            if name in self.dictionaries:
+                np.save(os.path.join(directory, f"{file_name}.dict.npy"), self.dictionaries[name])
+            layout.append({"name": name, "file": file_name,
+                           "dictionary": name in self.dictionaries})
+        for name, array in self.extras.items():
+            np.save(os.path.join(directory, f"extra.{name}.npy"), array)
+        with open(os.path.join(directory, "layout.json"), "w") as f:
+            json.dump({"columns": layout, "extras": list(self.extras)}, f)
+
+    @classmethod
+    def load(cls, directory: str) -> "ColumnarTable":
+        with open(os.path.join(directory, "layout.json")) as f:
+            layout = json.load(f)
+
+        def load_array(file_name: str) -> np.ndarray:
+            return np.load(os.path.join(directory, file_name), mmap_mode="r")
+
+        columns = {}
+        dictionaries = {}
+        for column in layout["columns"]:
+            columns[column["name"]] = load_array(f"{column['file']}.npy")
+            if column["dictionary"]:
+                dictionaries[column["name"]] = load_array(f"{column['file']}.dict.npy")
+        extras = {name: load_array(f"extra.{name}.npy") for name in layout["extras"]}
+        return cls(columns, dictionaries, extras)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_cache_dir(csv_file_path: str) -> str:
+    """Cache directory next to the CSV, e.g. `data/.flight_dataset.cache`."""
+    head, tail = os.path.split(csv_file_path)
+    return os.path.join(head, f".{os.path.splitext(tail)[0]}.cache")
+
+
+def load_cached_table(csv_file_path: str,
+                      build: Callable[[pd.DataFrame], ColumnarTable],
+                      cache_dir: str | None = None) -> ColumnarTable:
+    """
+    Load the columnar form of a CSV file, building the cache when stale.
+
+    The cache directory holds a `manifest.json` recording the CSV's mtime,
+    size and SHA-256, and one subdirectory per CSV hash with the encoded
+    arrays. A matching mtime and size is trusted as is; otherwise the CSV is
+    hashed and the cache is only rebuilt when the content changed. `build`
+    turns the parsed CSV into the table to store.
+
+    Rebuilds write a fresh subdirectory and then atomically replace the
+    manifest, so concurrent readers never see a partially written cache. If
+    the cache can't be written (e.g. a read-only data directory) the table
+    is built in memory.
+    """
+    cache_dir = cache_dir or default_cache_dir(csv_file_path)
+    manifest_path = os.path.join(cache_dir, "manifest.json")
+    stat = os.stat(csv_file_path)
+
+    manifest = None
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("format") != CACHE_FORMAT_VERSION:
+            manifest = None
+    except (OSError, ValueError):
+        manifest = None
+
+    if manifest is not None and manifest["csv_size"] == stat.st_size:
+        sha256 = None
+        if manifest["csv_mtime_ns"] != stat.st_mtime_ns:
+            sha256 = _file_sha256(csv_file_path)
+        if sha256 is None or sha256 == manifest["csv_sha256"]:
+            try:
+                table = ColumnarTable.load(os.path.join(cache_dir, manifest["csv_sha256"]))
+            except (OSError, ValueError, KeyError):
+                table = None
+            if table is not None:
+                if sha256 is not None:
+                    # Content is unchanged, remember the new mtime
+                    manifest["csv_mtime_ns"] = stat.st_mtime_ns
+                    _write_manifest(manifest_path, manifest)
+                return table
+
+    sha256 = _file_sha256(csv_file_path)
+    table = build(pd.read_csv(csv_file_path))
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        data_dir = os.path.join(cache_dir, sha256)
+        if not os.path.isdir(data_dir):
+            staging_dir = f"{data_dir}.tmp-{os.getpid()}"
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            table.save(staging_dir)
+            try:
+                os.rename(staging_dir, data_dir)
+            except OSError:
+                # Another process published the same content first
+                shutil.rmtree(staging_dir, ignore_errors=True)
+
+        _write_manifest(manifest_path, {
+            "format": CACHE_FORMAT_VERSION,
+            "csv_mtime_ns": stat.st_mtime_ns,
+            "csv_size": stat.st_size,
+            "csv_sha256": sha256,
+        })
+
+        for entry in os.listdir(cache_dir):
+            if entry not in (sha256, "manifest.json") and ".tmp-" not in entry:
+                shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+
+        return ColumnarTable.load(data_dir)
+    except OSError as e:
+        log.warning("Could not write columnar cache to %s: %s", cache_dir, e)
+        return table
+
+
+def _write_manifest(path: str, manifest: dict) -> None:
+    staging_path = f"{path}.tmp-{os.getpid()}"
+    with open(staging_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(staging_path, path)
@@ -1,27 +1,166 @@
+import threading
+
+from datetime import datetime
+
+import numpy as np
 import pandas as pd
 
+from .columnar_cache import ColumnarTable, load_cached_table
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_flight_search_service() -> "FlightSearchService":
+    """
+    Return the process-wide FlightSearchService, loading it on first use.
+
+    The dataset and its indexes are built once and shared by every caller,
+    so tools should use this instead of constructing their own service.
+    """
+    global _service
+
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = FlightSearchService()
+    return _service
+
+
+def _key_ranges(*keys: np.ndarray) -> list[tuple[int, int]]:
+    """Return the [start, stop) row ranges of equal keys in sorted key arrays."""
+    n = len(keys[0])
+    if n == 0:
+        return []
+    changed = np.zeros(n - 1, dtype=bool)
+    for key in keys:
+        changed |= key[1:] != key[:-1]
+    bounds = np.concatenate(([0], np.flatnonzero(changed) + 1, [n])).tolist()
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# Sort keys accepted by FlightSearchService.query
+SORT_KEYS = ('price', 'duration', 'departure', 'stops')
+
+
+def _date_key(year, month, day):
+    return year * 10000 + month * 100 + day
+
+
+def _parse_date(name: str, value: str) -> int:
+    """Turn an ISO `YYYY-MM-DD` date into a sortable integer key."""
+    try:
+        date = datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a date formatted as YYYY-MM-DD, not {value!r}") from None
+    return _date_key(date.year, date.month, date.day)
+
+
+def _parse_time(name: str, value: str) -> int:
+    """Turn an `HH:MM` time into minutes after midnight."""
+    try:
+        time = datetime.strptime(value, '%H:%M')
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a time formatted as HH:MM, not {value!r}") from None
+    return time.hour * 60 + time.minute
+
+
+def _casefold_all(values: np.ndarray) -> list[str]:
+    return [value.casefold() for value in values.tolist()]
+
+
+def _build_table(data: pd.DataFrame) -> ColumnarTable:
+    """Encode the parsed CSV sorted by route, with the row ranges of each key."""
+    source_keys = data['Source'].str.casefold().to_numpy()
+    destination_keys = data['Destination'].str.casefold().to_numpy()
+
+    # Stable sort, so rows of a route keep their order from the CSV
+    order = np.lexsort((destination_keys, source_keys))
+    table = ColumnarTable.from_frame(data.iloc[order].reset_index(drop=True))
+    source_keys = source_keys[order]
+    destination_keys = destination_keys[order]
+
+    # Destinations are spread across source ranges, so index them through
+    # a second ordering of the rows
+    destination_rows = np.argsort(destination_keys, kind='stable')
+
+    table.extras = {
+        'route_ranges': np.array(_key_ranges(source_keys, destination_keys), dtype=np.int64),
+        'source_ranges': np.array(_key_ranges(source_keys), dtype=np.int64),
+        'destination_rows': destination_rows,
+        'destination_ranges': np.array(
+            _key_ranges(destination_keys[destination_rows]), dtype=np.int64
+        ),
+    }
+    return table
+
+
 class FlightSearchService:
     """
     A class to search airline records based on source and destination.
+
+    Records are kept sorted by case-folded (Source, Destination) so that every
+    route and every source city occupies a contiguous range of rows. Lookups
+    resolve that range through a dictionary and only decode the matching rows
+    from the columnar table.
+
+    The sorted columns and their row ranges are stored in a memory-mapped
+    cache next to the CSV (see `columnar_cache`), so only the first process
+    after a dataset change pays for parsing the CSV.
     """
 
-    def __init__(self):
-        self.csv_file_path = "data/flight_dataset.csv"
-        self.data = None
+    def __init__(self, csv_file_path: str = "data/flight_dataset.csv"):
+        self.csv_file_path = csv_file_path
+        self.table: ColumnarTable | None = None
+        self._data: pd.DataFrame | None = None
+        self._route_index: dict[tuple[str, str], tuple[int, int]] = {}
+        self._source_index: dict[str, tuple[int, int]] = {}
+        self._destination_index: dict[str, tuple[int, int]] = {}
         self._load_data()
+        self._build_index()
+
+    @property
+    def data(self) -> pd.DataFrame | None:
+        """The dataset as a DataFrame, decoded from the table on first use."""
+        if self._data is None and self.table is not None:
+            self._data = self.table.to_frame()
+        return self._data
 
     def _load_data(self):
-        """Load data from CSV file."""
+        """Load data from the columnar cache, parsing the CSV file if needed."""
         try:
-            self.data = pd.read_csv(self.csv_file_path)
-            print(f"Loaded {len(self.data)} records from {self.csv_file_path}")
+            self.table = load_cached_table(self.csv_file_path, _build_table)
+            print(f"Loaded {len(self.table)} records from {self.csv_file_path}")
         except FileNotFoundError:
             raise FileNotFoundError(f"CSV file not found: {self.csv_file_path}")
         except Exception as e:
             raise Exception(f"Error loading CSV file: {e}")
 
+    def _build_index(self):
+        """Map case-folded keys to the row ranges stored with the table."""
+        extras = self.table.extras
+        source_codes = self.table.columns['Source']
+        destination_codes = self.table.columns['Destination']
+        source_names = _casefold_all(self.table.dictionaries['Source'])
+        destination_names = _casefold_all(self.table.dictionaries['Destination'])
+
+        self._route_index = {
+            (source_names[source_codes[start]], destination_names[destination_codes[start]]):
+                (start, stop)
+            for start, stop in extras['route_ranges'].tolist()
+        }
+        self._source_index = {
+            source_names[source_codes[start]]: (start, stop)
+            for start, stop in extras['source_ranges'].tolist()
+        }
+        destination_rows = extras['destination_rows']
+        self._destination_index = {
+            destination_names[destination_codes[destination_rows[start]]]: (start, stop)
+            for start, stop in extras['destination_ranges'].tolist()
+        }
+
     def find_by_route(self, source: str, destination: str,
-                      case_sensitive: bool = False) -> pd.DataFrame:
+                      case_sensitive: bool = False) -> list[dict]:
         """
         Find records by source and destination.
 
@@ -31,22 +170,24 @@ class FlightSearchService:
             case_sensitive (bool): Whether to perform case-sensitive search
 
         Returns:
-            pd.DataFrame: Filtered records matching the criteria
+            list[dict]: Records matching the criteria
         """
-        if self.data is None:
+        if self.table is None:
             raise ValueError("No data loaded")
 
-        if not case_sensitive:
-            source_mask = self.data['Source'].str.lower() == source.lower()
-            dest_mask = self.data['Destination'].str.lower() == destination.lower()
-        else:
-            source_mask = self.data['Source'] == source
-            dest_mask = self.data['Destination'] == destination
+        start, stop = self._route_index.get(
+            (source.casefold(), destination.casefold()), (0, 0)
+        )
+        records = self.table.records(slice(start, stop))
 
-        result = self.data[source_mask & dest_mask]
-        return result.to_dict('records')
+        if case_sensitive:
+            records = [
+                r for r in records
+                if r['Source'] == source and r['Destination'] == destination
+            ]
+        return records
 
-    def find_by_source(self, source: str, case_sensitive: bool = False) -> pd.DataFrame:
+    def find_by_source(self, source: str, case_sensitive: bool = False) -> list[dict]:
         """
         Find all records from a specific source city.
 
@@ -55,19 +196,19 @@ class FlightSearchService:
             case_sensitive (bool): Whether to perform case-sensitive search
 
         Returns:
-            pd.DataFrame: All records from the source city
+            list[dict]: All records from the source city
         """
-        if self.data is None:
+        if self.table is None:
             raise ValueError("No data loaded")
 
-        if not case_sensitive:
-            mask = self.data['Source'].str.lower() == source.lower()
-        else:
-            mask = self.data['Source'] == source
+        start, stop = self._source_index.get(source.casefold(), (0, 0))
+        records = self.table.records(slice(start, stop))
 
-        return self.data[mask].to_dict('records')
+        if case_sensitive:
+            records = [r for r in records if r['Source'] == source]
+        return records
 
-    def find_by_destination(self, destination: str, case_sensitive: bool = False) -> pd.DataFrame:
+    def find_by_destination(self, destination: str, case_sensitive: bool = False) -> list[dict]:
         """
         Find all records to a specific destination city.
 
@@ -76,14 +217,161 @@ class FlightSearchService:
             case_sensitive (bool): Whether to perform case-sensitive search
 
         Returns:
-            pd.DataFrame: All records to the destination city
+            list[dict]: All records to the destination city
+        """
+        if self.table is None:
+            raise ValueError("No data loaded")
+
+        start, stop = self._destination_index.get(destination.casefold(), (0, 0))
+        records = self.table.records(self.table.extras['destination_rows'][start:stop])
+
+        if case_sensitive:
+            records = [r for r in records if r['Destination'] == destination]
+        return records
+
+    def query(self, source: str | None = None, destination: str | None = None,
+              airline: str | None = None,
+              min_price: float | None = None, max_price: float | None = None,
+              max_stops: int | None = None,
+              date_from: str | None = None, date_to: str | None = None,
+              departure_after: str | None = None, departure_before: str | None = None,
+              max_duration_minutes: int | None = None,
+              sort_by: str = 'price', descending: bool = False,
+              limit: int = 10, offset: int = 0) -> dict:
+        """
+        Filter, sort and paginate flights without materializing the full result.
+
+        Route filters narrow the candidate rows through the indexes; every
+        other filter is a NumPy boolean mask over the cached columns. Only the
+        requested page is sorted (via `argpartition`) and decoded into records.
+
+        Args:
+            source (str): Source city, case-insensitive
+            destination (str): Destination city, case-insensitive
+            airline (str): Airline name, case-insensitive
+            min_price (float): Minimum price, inclusive
+            max_price (float): Maximum price, inclusive
+            max_stops (int): Maximum number of stops, inclusive
+            date_from (str): Earliest travel date as `YYYY-MM-DD`, inclusive
+            date_to (str): Latest travel date as `YYYY-MM-DD`, inclusive
+            departure_after (str): Earliest departure time as `HH:MM`, inclusive
+            departure_before (str): Latest departure time as `HH:MM`, inclusive
+            max_duration_minutes (int): Maximum flight duration, inclusive
+            sort_by (str): One of `price`, `duration`, `departure` or `stops`
+            descending (bool): Sort from the highest value down
+            limit (int): Maximum number of records to return
+            offset (int): Number of sorted matches to skip
+
+        Returns:
+            dict: `total` matches, the `offset` and `limit` used, and the
+            `flights` records of the requested page
+
+        Raises:
+            ValueError: For an unknown sort key, a negative limit or offset,
+            or a malformed date or time
         """
-        if self.data is None:
+        if self.table is None:
             raise ValueError("No data loaded")
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"sort_by must be one of {', '.join(SORT_KEYS)}")
+        if limit < 0 or offset < 0:
+            raise ValueError("limit and offset must not be negative")
+        # Check every argument before filtering anything
+        date_range = [None if value is None else _parse_date(name, value)
+                      for name, value in (('date_from', date_from), ('date_to', date_to))]
+        departure_range = [None if value is None else _parse_time(name, value)
+                           for name, value in (('departure_after', departure_after),
+                                               ('departure_before', departure_before))]
+
+        rows = self._candidate_rows(source, destination)
+
+        def column(name: str) -> np.ndarray:
+            return self.table.columns[name][rows]
 
-        if not case_sensitive:
-            mask = self.data['Destination'].str.lower() == destination.lower()
+        mask = np.ones(len(rows), dtype=bool)
+        if airline is not None:
+            names = _casefold_all(self.table.dictionaries['Airline'])
+            codes = [code for code, name in enumerate(names) if name == airline.casefold()]
+            mask &= np.isin(column('Airline'), codes)
+        if min_price is not None:
+            mask &= column('Price') >= min_price
+        if max_price is not None:
+            mask &= column('Price') <= max_price
+        if max_stops is not None:
+            mask &= column('Total_Stops') <= max_stops
+        if date_range != [None, None]:
+            dates = _date_key(column('Year').astype(np.int64),
+                              column('Month').astype(np.int64),
+                              column('Date').astype(np.int64))
+            first, last = date_range
+            if first is not None:
+                mask &= dates >= first
+            if last is not None:
+                mask &= dates <= last
+        if departure_range != [None, None]:
+            departures = column('Dep_hours').astype(np.int64) * 60 + column('Dep_min')
+            first, last = departure_range
+            if first is not None:
+                mask &= departures >= first
+            if last is not None:
+                mask &= departures <= last
+        if max_duration_minutes is not None:
+            durations = column('Duration_hours').astype(np.int64) * 60 + column('Duration_min')
+            mask &= durations <= max_duration_minutes
+
+        rows = rows[mask]
+        total = len(rows)
+        page = self._sorted_page(rows, sort_by, descending, offset, limit)
+
+        return {
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+            'flights': self.table.records(page),
+        }
+
+    def _candidate_rows(self, source: str | None, destination: str | None) -> np.ndarray:
+        """Row positions narrowed by the route indexes, before any masks."""
+        if source is not None and destination is not None:
+            start, stop = self._route_index.get(
+                (source.casefold(), destination.casefold()), (0, 0)
+            )
+        elif source is not None:
+            start, stop = self._source_index.get(source.casefold(), (0, 0))
+        elif destination is not None:
+            start, stop = self._destination_index.get(destination.casefold(), (0, 0))
+            return np.asarray(self.table.extras['destination_rows'][start:stop])
         else:
-            mask = self.data['Destination'] == destination
+            start, stop = 0, len(self.table)
+        return np.arange(start, stop)
+
+    def _sorted_page(self, rows: np.ndarray, sort_by: str, descending: bool,
+                     offset: int, limit: int) -> np.ndarray:
+        """Return the rows of one page, partially sorting only what it needs."""
+        end = min(offset + limit, len(rows))
+        if offset >= end:
+            return rows[:0]
 
-        return self.data[mask].to_dict('records')
+        columns = self.table.columns
+        if sort_by == 'price':
+            keys = columns['Price'][rows].astype(np.int64)
+        elif sort_by == 'duration':
+            keys = columns['Duration_hours'][rows].astype(np.int64) * 60 + columns['Duration_min'][rows]
+        elif sort_by == 'departure':
+            keys = columns['Dep_hours'][rows].astype(np.int64) * 60 + columns['Dep_min'][rows]
+        else:
+            keys = columns['Total_Stops'][rows].astype(np.int64)
+        if descending:
+            keys = -keys
+
+        if end < len(rows):
+            # Keep every row sorting up to the end of the page, including all
+            # rows tied with the last one, so ties resolve the same way on
+            # every page
+            last_key = keys[np.argpartition(keys, end - 1)[end - 1]]
+            head = np.flatnonzero(keys <= last_key)
+        else:
+            head = np.arange(len(rows))
+        # Ties are broken by row position so pages are stable
+        head = head[np.lexsort((rows[head], keys[head]))]
+        return rows[head[offset:end]]
@@ -1,4 +1,10 @@
-from src.services.flight_search.flight_search import FlightSearchService
+import numpy as np
+import pytest
+
+from src.services.flight_search.flight_search import (
+    FlightSearchService,
+    get_flight_search_service,
+)
 
 def test_flight_service_search():
     fss = FlightSearchService()
@@ -6,3 +12,105 @@ def test_flight_service_search():
 
     assert isinstance(results, list)
     assert len(results) > 0
+
+def test_flight_service_is_shared():
+    assert get_flight_search_service() is get_flight_search_service()
+
+def test_flight_service_lookups_match_scan():
+    fss = get_flight_search_service()
+    data = fss.data
+
+    for source, destination in [("madrid", "BARCELONA"), ("Banglore", "New Delhi")]:
+        expected = data[
+            (data['Source'].str.lower() == source.lower())
+            & (data['Destination'].str.lower() == destination.lower())
+        ]
+        assert fss.find_by_route(source, destination) == expected.to_dict('records')
+
+    assert fss.find_by_route("madrid", "barcelona", case_sensitive=True) == []
+    assert len(fss.find_by_source("Delhi")) == (data['Source'] == "Delhi").sum()
+    assert len(fss.find_by_destination("cochin")) == (data['Destination'] == "Cochin").sum()
+    assert fss.find_by_route("Nowhere", "Barcelona") == []
+
+def test_flight_service_columnar_cache(tmp_path):
+    csv_path = tmp_path / "flights.csv"
+    csv_path.write_text(
+        "Airline,Source,Destination,Price\n"
+        "Iberia,Madrid,Barcelona,95\n"
+        "Vueling,madrid,Barcelona,80\n"
+    )
+
+    fss = FlightSearchService(str(csv_path))
+    assert [r['Price'] for r in fss.find_by_route("MADRID", "barcelona")] == [95, 80]
+    assert (tmp_path / ".flights.cache" / "manifest.json").exists()
+
+    # A cached load memory-maps the stored columns
+    cached = FlightSearchService(str(csv_path))
+    assert isinstance(cached.table.columns['Price'], np.memmap)
+    assert cached.find_by_route("Madrid", "Barcelona") == fss.find_by_route("Madrid", "Barcelona")
+
+    # Changing the CSV invalidates the cache
+    csv_path.write_text(
+        "Airline,Source,Destination,Price\n"
+        "Iberia,Madrid,Sevilla,120\n"
+    )
+    changed = FlightSearchService(str(csv_path))
+    assert changed.find_by_route("Madrid", "Barcelona") == []
+    assert len(changed.find_by_route("Madrid", "Sevilla")) == 1
+
+def test_flight_service_query():
+    fss = get_flight_search_service()
+    data = fss.data
+
+    expected = data[
+        (data['Source'] == "Banglore")
+        & (data['Destination'] == "New Delhi")
+        & (data['Price'] <= 8000)
+        & (data['Total_Stops'] <= 1)
+    ].sort_values('Price', kind='stable')
+
+    page = fss.query(source="banglore", destination="new delhi",
+                     max_price=8000, max_stops=1, limit=5)
+    assert page['total'] == len(expected)
+    assert page['flights'] == expected.head(5).to_dict('records')
+
+    # Pages are consecutive slices of one stable ordering
+    pages = [
+        fss.query(source="Banglore", destination="New Delhi", max_price=8000,
+                  max_stops=1, limit=7, offset=offset)['flights']
+        for offset in range(0, 28, 7)
+    ]
+    assert sum(pages, []) == expected.head(28).to_dict('records')
+
+def test_flight_service_query_filters():
+    fss = get_flight_search_service()
+
+    page = fss.query(destination="cochin", date_from="2019-05-01", date_to="2019-05-31",
+                     departure_after="06:00", departure_before="11:59",
+                     sort_by="duration", descending=True, limit=20)
+    durations = [f['Duration_hours'] * 60 + f['Duration_min'] for f in page['flights']]
+    assert 0 < len(page['flights']) <= 20
+    assert durations == sorted(durations, reverse=True)
+    for flight in page['flights']:
+        assert flight['Destination'] == "Cochin"
+        assert (flight['Year'], flight['Month']) == (2019, 5)
+        assert 6 <= flight['Dep_hours'] < 12
+
+    assert fss.query(airline="iberia", source="madrid")['total'] > 0
+    assert fss.query(source="Madrid", limit=0)['flights'] == []
+
+def test_flight_service_query_rejects_malformed_dates_and_times():
+    fss = get_flight_search_service()
+
+    for arguments, message in [
+        ({'date_from': "24/03/2019"}, "date_from must be a date formatted as YYYY-MM-DD, not '24/03/2019'"),
+        ({'date_to': "tomorrow"}, "date_to must be a date formatted as YYYY-MM-DD"),
+        ({'date_from': "2019-02-30"}, "date_from must be a date"),
+        ({'departure_after': "6pm"}, "departure_after must be a time formatted as HH:MM"),
+        ({'departure_before': "25:00"}, "departure_before must be a time"),
+    ]:
+        with pytest.raises(ValueError, match=message):
+            fss.query(source="Banglore", **arguments)
+
+    # Unpadded values are still dates and times
+    assert fss.query(source="Banglore", date_from="2019-5-1", departure_after="6:00")['total'] > 0
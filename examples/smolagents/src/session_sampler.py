@@ -0,0 +1,250 @@
+# Shared by the examples: edit examples/adk/agent/session_sampler.py and run tools/shared_modules.py sync
+"""
+Head and tail sampling of CoAgent sessions.
+
+At production volume logging every session at full fidelity costs more than
+it is worth, but errored and slow sessions are the ones worth keeping.
+`SessionSampler` sits between the logging hooks and the spool or shipper:
+
+- Head sampling keeps a fixed share of sessions, chosen by a hash of the
+  session id, so every process makes the same choice for a session. Their
+  entries are passed on right away.
+- Tail sampling buffers the entries of the other sessions in memory until
+  the run ends (`session_end`). A run is kept when it logs an error or a
+  failed tool response, gets slower or uses more tokens than a threshold,
+  or one of the rules matches an entry; from then on its entries are
+  passed on right away too. Runs that end without any of that are dropped.
+
+Buffered runs are capped in total size; past the cap, and after a run has
+been idle for `idle_timeout`, the least recently active runs are dropped.
+
+Only the top-level agent should log `session_end`; a sub-agent's final
+answer doesn't end the run.
+
+Decisions are made under a lock, but `sink` and `on_drop` are called after
+it is released, so a sink writing to disk doesn't hold up other threads.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable
+
+from coa_dev_coagent.logapi import EventType, LogEntry
+
+Rule = Callable[[LogEntry], bool]
+
+
+@dataclass
+class SamplingPolicy:
+    """
+    When sessions are kept.
+
+    Attributes:
+        head_rate: Share of sessions kept whole, 0 to 1; 1 keeps everything
+        tail: Buffer the other sessions and keep those that match below;
+            False drops them right away
+        latency_threshold_ms: Keep runs with an LLM call, tool call or run
+            slower than this
+        token_threshold: Keep runs whose LLM responses total more tokens
+        rules: Keep runs with an entry for which one of these returns True
+        max_buffered_bytes: Cap on the JSON size of all buffered entries
+        idle_timeout: Seconds after which an unfinished buffered run is dropped
+    """
+
+    head_rate: float = 1.0
+    tail: bool = True
+    latency_threshold_ms: int = 30_000
+    token_threshold: int = 50_000
+    rules: list[Rule] = field(default_factory=list)
+    max_buffered_bytes: int = 16 * 1024 * 1024
+    idle_timeout: float = 600.0
+
+    @classmethod
+    def from_env(cls) -> "SamplingPolicy":
+        """
+        Policy from COAGENT_HEAD_SAMPLE_RATE, COAGENT_TAIL_SAMPLING,
+        COAGENT_TAIL_LATENCY_MS, COAGENT_TAIL_TOKENS and COAGENT_SAMPLER_MAX_BYTES.
+        """
+        return cls(
+            head_rate=float(os.environ.get("COAGENT_HEAD_SAMPLE_RATE", cls.head_rate)),
+            tail=os.environ.get("COAGENT_TAIL_SAMPLING", "1").lower() not in ("0", "false", "no"),
+            latency_threshold_ms=int(os.environ.get("COAGENT_TAIL_LATENCY_MS", cls.latency_threshold_ms)),
+            token_threshold=int(os.environ.get("COAGENT_TAIL_TOKENS", cls.token_threshold)),
+            max_buffered_bytes=int(os.environ.get("COAGENT_SAMPLER_MAX_BYTES", cls.max_buffered_bytes)),
+        )
+
+
+@dataclass
+class SamplerMetrics:
+    """Counters describing the sampling decisions."""
+
+    head_entries: int = 0
+    tail_kept: int = 0
+    dropped: int = 0
+    evicted: int = 0
+    entries_dropped: int = 0
+    buffered_bytes: int = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def head_sampled(session_id: str, rate: float) -> bool:
+    """Whether a session is in the head sample; the same answer everywhere."""
+    if rate >= 1.0:
+        return True
+    digest = hashlib.sha256(session_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") < rate * 2**64
+
+
+class _Run:
+    """Buffered entries of an undecided run."""
+
+    def __init__(self, now: float) -> None:
+        self.entries: list[LogEntry] = []
+        self.bytes = 0
+        self.first_timestamp: int | None = None
+        self.tokens = 0
+        self.last_seen = now
+
+
+class SessionSampler:
+    """
+    Passes the log entries of sampled sessions on to `sink`.
+
+    Args:
+        sink: Receives the kept entries in order, e.g. `LogSpool.append`
+        policy: When sessions are kept; read from the environment when omitted
+        on_drop: Called with the session id when buffered entries are
+            dropped, e.g. so prompt chunks they carried are sent again
+        clock: Seconds, for idle timeouts
+    """
+
+    def __init__(
+        self,
+        sink: Callable[[LogEntry], Any],
+        policy: SamplingPolicy | None = None,
+        on_drop: Callable[[str], Any] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.sink = sink
+        self.policy = policy or SamplingPolicy.from_env()
+        self.on_drop = on_drop
+        self.clock = clock
+        self.metrics = SamplerMetrics()
+        self._lock = threading.Lock()
+        self._runs: OrderedDict[str, _Run] = OrderedDict()
+        # Runs of head-unsampled sessions kept by the tail sampler
+        self._kept: set[str] = set()
+
+    def accepts(self, session_id: str) -> bool:
+        """Whether entries of a session may be kept; False when they'd be dropped right away."""
+        return self.policy.tail or head_sampled(session_id, self.policy.head_rate)
+
+    def offer(self, entry: LogEntry) -> None:
+        """Pass `entry` on, buffer it, or drop it, depending on its session."""
+        forward: list[LogEntry] = []
+        dropped: list[str] = []
+        with self._lock:
+            self._decide(entry, forward, dropped)
+        for kept in forward:
+            self.sink(kept)
+        if self.on_drop is not None:
+            for session_id in dropped:
+                self.on_drop(session_id)
+
+    def _decide(self, entry: LogEntry, forward: list[LogEntry], dropped: list[str]) -> None:
+        """
+        Called with the lock held; adds the entries to pass on to `forward`
+        and the sessions whose entries were dropped to `dropped`.
+        """
+        session_id = entry.session_id
+        ends_run = entry.event_type == EventType.SESSION_END
+        if head_sampled(session_id, self.policy.head_rate):
+            self.metrics.head_entries += 1
+            forward.append(entry)
+            return
+        if session_id in self._kept:
+            forward.append(entry)
+            if ends_run:
+                self._kept.discard(session_id)
+            return
+        if not self.policy.tail:
+            self.metrics.entries_dropped += 1
+            return
+
+        now = self.clock()
+        self._expire(now, dropped)
+        run = self._runs.pop(session_id, None) or _Run(now)
+        # Most recently active last
+        self._runs[session_id] = run
+        run.last_seen = now
+        run.entries.append(entry)
+        size = len(json.dumps(entry.to_dict(), default=str))
+        run.bytes += size
+        self.metrics.buffered_bytes += size
+
+        if self._matches(run, entry):
+            self._keep(session_id, run, ends_run, forward)
+        elif ends_run:
+            self._drop(session_id, dropped)
+            self.metrics.dropped += 1
+        else:
+            while self.metrics.buffered_bytes > self.policy.max_buffered_bytes and self._runs:
+                self._drop(next(iter(self._runs)), dropped)
+                self.metrics.evicted += 1
+
+    def _matches(self, run: _Run, entry: LogEntry) -> bool:
+        """Whether the run is worth keeping, given its latest entry."""
+        policy = self.policy
+        if entry.event_type == EventType.ERROR:
+            return True
+        if entry.tool_response is not None and entry.tool_response.success is False:
+            return True
+
+        durations = [
+            entry.llm_response.execution_time_ms if entry.llm_response is not None else None,
+            entry.tool_response.execution_time_ms if entry.tool_response is not None else None,
+            entry.meta.get("elapsed_time_ms") if isinstance(entry.meta, dict) else None,
+        ]
+        if run.first_timestamp is None:
+            run.first_timestamp = entry.timestamp
+        elif entry.timestamp is not None:
+            durations.append(entry.timestamp - run.first_timestamp)
+        if any((duration or 0) > policy.latency_threshold_ms for duration in durations):
+            return True
+
+        if entry.llm_response is not None:
+            run.tokens += entry.llm_response.total_tokens or 0
+            if run.tokens > policy.token_threshold:
+                return True
+
+        return any(rule(entry) for rule in policy.rules)
+
+    def _keep(self, session_id: str, run: _Run, ends_run: bool, forward: list[LogEntry]) -> None:
+        del self._runs[session_id]
+        self.metrics.buffered_bytes -= run.bytes
+        self.metrics.tail_kept += 1
+        forward.extend(run.entries)
+        if not ends_run:
+            self._kept.add(session_id)
+
+    def _drop(self, session_id: str, dropped: list[str]) -> None:
+        run = self._runs.pop(session_id)
+        self.metrics.buffered_bytes -= run.bytes
+        self.metrics.entries_dropped += len(run.entries)
+        dropped.append(session_id)
+
+    def _expire(self, now: float, dropped: list[str]) -> None:
+        while self._runs:
+            session_id, run = next(iter(self._runs.items()))
+            if now - run.last_seen < self.policy.idle_timeout:
+                return
+            self._drop(session_id, dropped)
+            self.metrics.evicted += 1
@@ -0,0 +1,41 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.counters import current_session, end_session, get_session
+
+def test_sessions_are_isolated():
+    first = get_session("tab-1")
+    second = get_session("tab-2")
+
+    assert first is get_session("tab-1")
+    assert first.session_id != second.session_id
+    assert first.get_prompt_number(True) == 1
+    assert first.get_prompt_number() == 2
+    assert second.get_prompt_number() == 1
+
+    end_session("tab-1")
+    assert get_session("tab-1") is not first
+
+def test_increments_are_unique_across_threads():
+    session = get_session("tab-concurrent")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        numbers = list(pool.map(lambda _: session.get_turn_number(True), range(1000)))
+
+    assert sorted(numbers) == list(range(1, 1001))
+    assert session.get_turn_number() == 1001
+
+def test_bind_sets_current_session_for_each_step():
+    session = get_session("tab-bound")
+    default = current_session()
+
+    def steps():
+        for _ in range(3):
+            yield current_session()
+
+    # Each step may run on a different thread, as Gradio does
+    bound = session.bind(steps())
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        seen = [pool.submit(next, bound).result() for _ in range(3)]
+
+    assert seen == [session] * 3
+    assert current_session() is default
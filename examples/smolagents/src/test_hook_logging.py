@@ -0,0 +1,52 @@
+import io
+import json
+import logging
+import queue
+
+from src import hook_logging
+from src.hook_logging import NonBlockingQueueHandler, RateLimitFilter, StructuredFormatter
+
+def record(msg, *args, level=logging.ERROR, **extra):
+    entry = logging.LogRecord("coagent.test", level, __file__, 1, msg, args, None)
+    entry.__dict__.update(extra)
+    return entry
+
+def test_rate_limit_counts_suppressed_errors():
+    limit = RateLimitFilter(per_minute=2)
+    before = hook_logging.metrics.suppressed
+
+    passed = [limit.filter(record("Failed to log: %s", n)) for n in range(5)]
+
+    assert passed == [True, True, False, False, False]
+    assert limit.filter(record("Other failure"))
+    assert limit.filter(record("Step %s", 1, level=logging.INFO))
+    assert hook_logging.metrics.suppressed - before == 3
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    before = hook_logging.metrics.dropped
+
+    handler.handle(record("first"))
+    handler.handle(record("second"))
+
+    assert handler.queue.qsize() == 1
+    assert hook_logging.metrics.dropped - before == 1
+
+def test_json_lines_include_extra_fields():
+    line = StructuredFormatter(json_lines=True).format(record("Failed: %s", "boom", session_id="s1"))
+
+    fields = json.loads(line)
+    assert fields["message"] == "Failed: boom"
+    assert fields["level"] == "ERROR"
+    assert fields["session_id"] == "s1"
+
+def test_configured_logger_writes_from_listener():
+    stream = io.StringIO()
+    logger = hook_logging.configure_logging(stream=stream, json_lines=False)
+    try:
+        logging.getLogger("coagent.test").info("Logged %s entries", 3, extra={"session_id": "s1"})
+    finally:
+        hook_logging.shutdown_logging()
+
+    assert logger.name == "coagent"
+    assert "INFO coagent.test: Logged 3 entries session_id=s1" in stream.getvalue()
@@ -0,0 +1,47 @@
+from coa_dev_coagent.logapi import create_error_log, create_tool_call_log
+
+from src.instrumentation import CALLS, ERRORS, OFF, Instrumentation, InstrumentationConfig
+
+def tool_call(instrumentation, session_id="s"):
+    return lambda: create_tool_call_log(
+        session_id=session_id,
+        prompt_number=1,
+        turn_number=1,
+        tool_name="search",
+        parameters=instrumentation.content(lambda: {"query": "flights"}),
+    )
+
+def test_off_is_inactive_and_builds_nothing():
+    logged = []
+    instrumentation = Instrumentation(logged.append, InstrumentationConfig(level=OFF))
+
+    def build():
+        raise AssertionError("entry built while logging is off")
+
+    instrumentation.emit("s", "error", build)
+
+    assert not instrumentation.active
+    assert logged == []
+
+def test_level_selects_events_and_content():
+    logged = []
+    instrumentation = Instrumentation(logged.append, InstrumentationConfig(level=CALLS))
+
+    instrumentation.emit("s", "tool_call", tool_call(instrumentation))
+
+    assert [entry.event_type.value for entry in logged] == ["tool_call"]
+    assert logged[0].tool_call.parameters is None
+
+def test_event_overrides_and_sampler():
+    logged = []
+    config = InstrumentationConfig(level=ERRORS, events={"tool_call"}, disabled_events={"error"})
+    instrumentation = Instrumentation(logged.append, config, accepts=lambda session_id: session_id != "dropped")
+
+    instrumentation.emit("s", "error", lambda: create_error_log(
+        session_id="s", prompt_number=1, turn_number=1, error_message="boom",
+    ))
+    instrumentation.emit("dropped", "tool_call", tool_call(instrumentation, "dropped"))
+    instrumentation.emit("s", "tool_call", tool_call(instrumentation))
+
+    assert instrumentation.active
+    assert [(entry.session_id, entry.event_type.value) for entry in logged] == [("s", "tool_call")]
@@ -0,0 +1,216 @@
+import asyncio
+import gzip
+import json
+import os
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from coa_dev_coagent import CoagentClient
+
+from src.coagent_clients import AsyncCoagentClient
+from src.log_spool import FSYNC_ALWAYS, BulkSender, LogSpool
+
+
+class _LogsHandler(BaseHTTPRequestHandler):
+    """Accepts NDJSON with a status per entry, rejecting entries without session_id or event_type."""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+
+        if self.headers["Content-Type"] == "application/x-ndjson":
+            if not self.server.ndjson:
+                return self._reply(415, {"success": False, "message": "unsupported"})
+            entries = [json.loads(line) for line in body.splitlines()]
+            results = []
+            for i, entry in enumerate(entries):
+                if entry.get("session_id") and entry.get("event_type"):
+                    self.server.received.append(entry)
+                    results.append({"index": i, "status": "ok"})
+                else:
+                    results.append({"index": i, "status": "error", "error": "missing session_id"})
+            return self._reply(200, {"success": True, "results": results})
+
+        self.server.received.extend(json.loads(body))
+        self._reply(200, {"success": True, "message": "All log entries stored successfully"})
+
+    def _reply(self, status, payload):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(payload).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(ndjson=True):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _LogsHandler)
+    server.received = []
+    server.ndjson = ndjson
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def _entry(i):
+    return {"session_id": "spool-test", "event_id": f"event-{i}", "event_type": "user_input"}
+
+
+def test_spool_ships_entries(tmp_path):
+    server = _serve()
+    client = CoagentClient(base_url=f"http://127.0.0.1:{server.server_port}")
+    spool = LogSpool(client, directory=str(tmp_path), batch_size=7)
+
+    spool.append_many(_entry(i) for i in range(20))
+    assert _wait_for(lambda: len(server.received) == 20)
+    spool.close()
+    server.shutdown()
+
+    assert [e["event_id"] for e in server.received] == [f"event-{i}" for i in range(20)]
+    assert spool.metrics.sent == 20
+    # Sent bytes of the active segment are no longer pending
+    assert spool.metrics.pending_bytes == 0
+    assert spool.sender.ndjson_supported is True
+
+
+def test_spool_drops_rejected_entries(tmp_path):
+    server = _serve()
+    client = CoagentClient(base_url=f"http://127.0.0.1:{server.server_port}")
+    spool = LogSpool(client, directory=str(tmp_path))
+
+    spool.append_many([_entry(0), {"event_id": "invalid"}, _entry(2)])
+    assert _wait_for(lambda: spool.metrics.sent + spool.metrics.rejected == 3)
+    spool.close()
+    server.shutdown()
+
+    assert [e["event_id"] for e in server.received] == ["event-0", "event-2"]
+    assert spool.metrics.rejected == 1
+
+
+def test_spool_reports_sessions_of_rejected_entries(tmp_path):
+    server = _serve()
+    client = CoagentClient(base_url=f"http://127.0.0.1:{server.server_port}")
+    dropped = []
+    spool = LogSpool(client, directory=str(tmp_path), on_drop=dropped.append)
+
+    spool.append_many([_entry(0), {"session_id": "other", "event_id": "invalid"}, _entry(2)])
+    assert _wait_for(lambda: spool.metrics.sent + spool.metrics.rejected == 3)
+    spool.close()
+    server.shutdown()
+
+    assert dropped == ["other"]
+
+
+def test_spool_falls_back_to_json_arrays(tmp_path):
+    server = _serve(ndjson=False)
+    client = CoagentClient(base_url=f"http://127.0.0.1:{server.server_port}")
+    spool = LogSpool(client, directory=str(tmp_path))
+
+    spool.append_many(_entry(i) for i in range(3))
+    assert _wait_for(lambda: len(server.received) == 3)
+    spool.close()
+    server.shutdown()
+
+    assert spool.sender.ndjson_supported is False
+    assert spool.metrics.sent == 3
+
+
+def test_spool_replays_after_outage(tmp_path):
+    # Nothing listens on the port yet, the entries stay on disk
+    server = _serve()
+    port = server.server_port
+    server.shutdown()
+    server.server_close()
+
+    client = CoagentClient(base_url=f"http://127.0.0.1:{port}")
+    spool = LogSpool(client, directory=str(tmp_path), fsync=FSYNC_ALWAYS,
+                     segment_max_bytes=200, backoff_initial=0.01, backoff_max=0.05)
+    for i in range(10):
+        spool.append(_entry(i))
+    spool.close(timeout=0.2)
+    assert spool.metrics.sent == 0
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".log")]) > 1
+
+    # A new spool on the same directory sends the backlog once the server is up
+    server = ThreadingHTTPServer(("127.0.0.1", port), _LogsHandler)
+    server.received = []
+    server.ndjson = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    spool = LogSpool(client, directory=str(tmp_path))
+    assert _wait_for(lambda: len(server.received) == 10)
+    spool.close()
+    server.shutdown()
+
+    assert [e["event_id"] for e in server.received] == [f"event-{i}" for i in range(10)]
+
+
+def test_spool_truncates_entry_torn_by_crash(tmp_path):
+    with open(tmp_path / "000000000001.log", "wb") as f:
+        f.write(json.dumps(_entry(0)).encode() + b'\n{"session_id": "spool-te')
+    server = _serve()
+    client = CoagentClient(base_url=f"http://127.0.0.1:{server.server_port}")
+    spool = LogSpool(client, directory=str(tmp_path))
+
+    spool.append(_entry(1))
+    assert _wait_for(lambda: len(server.received) == 2)
+    spool.close()
+    server.shutdown()
+
+    assert [e["event_id"] for e in server.received] == ["event-0", "event-1"]
+    assert spool.metrics.rejected == 0
+
+
+def test_spool_evicts_oldest_segments(tmp_path):
+    client = CoagentClient(base_url="http://127.0.0.1:9")
+    dropped = []
+    spool = LogSpool(client, directory=str(tmp_path), segment_max_bytes=300,
+                     max_total_bytes=1000, backoff_initial=60, on_drop=dropped.append)
+    for i in range(50):
+        spool.append(_entry(i))
+    spool.close(timeout=0)
+
+    segments = sorted(n for n in os.listdir(tmp_path) if n.endswith(".log"))
+    size = sum(os.path.getsize(tmp_path / n) for n in segments)
+    assert size <= 1000
+    assert spool.metrics.evicted_segments > 0
+    assert set(dropped) == {"spool-test"}
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".evicted")]
+
+    # The newest entries are the ones kept
+    with open(tmp_path / segments[-1]) as f:
+        last = [json.loads(line) for line in f][-1]
+    assert last["event_id"] == "event-49"
+
+
+def test_bulk_sender_sends_with_async_client():
+    pytest.importorskip("httpx")
+    server = _serve(ndjson=False)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    client = AsyncCoagentClient(base_url=base_url, max_concurrency=2)
+    sender = BulkSender(CoagentClient(base_url=base_url), async_client=client)
+
+    async def send_all():
+        try:
+            return await asyncio.gather(*(sender.asend([_entry(i)]) for i in range(5)))
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(send_all())
+    server.shutdown()
+
+    assert all(result.accepted == 1 for result in results)
+    assert sorted(e["event_id"] for e in server.received) == [f"event-{i}" for i in range(5)]
+    assert sender.ndjson_supported is False
+    assert client.metrics.max_in_flight <= 2
@@ -0,0 +1,44 @@
+import hashlib
+import json
+
+from src.payload_governor import PAYLOAD_MARKER, BlobStore, PayloadGovernor, PayloadPolicy
+
+FLIGHTS = [{"flight": f"LH {n}", "price": 100 + n} for n in range(2000)]
+
+def test_small_payloads_are_logged_as_they_are():
+    governor = PayloadGovernor(PayloadPolicy(max_field_bytes=1024))
+
+    assert governor.govern("result", {"status": "ok"}) == {"status": "ok"}
+    assert governor.govern("result", None) is None
+    assert governor.metrics.inline == 1
+
+def test_oversized_payloads_are_truncated_with_digest():
+    governor = PayloadGovernor(PayloadPolicy(max_field_bytes=1024, field_budgets={"observations": 200}))
+
+    reference = governor.govern("observations", "é" * 1000)
+    data = ("é" * 1000).encode("utf-8")
+
+    assert reference[PAYLOAD_MARKER] == "truncated"
+    assert reference["bytes"] == len(data)
+    assert reference["sha256"] == hashlib.sha256(data).hexdigest()
+    assert len(json.dumps(reference, ensure_ascii=False).encode("utf-8")) < 1024
+    assert reference["head"] == "é" * 75 and reference["tail"] == "é" * 25
+    assert governor.metrics.truncated == 1
+
+def test_sampled_payloads_are_offloaded_to_blob_store(tmp_path):
+    store = BlobStore(str(tmp_path))
+    samples = iter([0.1, 0.9])
+    governor = PayloadGovernor(
+        PayloadPolicy(max_field_bytes=1024, offload_sample_rate=0.5),
+        blob_store=store,
+        sample=lambda: next(samples),
+    )
+
+    kept = governor.govern("result", FLIGHTS)
+    dropped = governor.govern("result", FLIGHTS)
+
+    assert kept[PAYLOAD_MARKER] == "blob"
+    assert json.loads(store.get(kept["blob"])) == FLIGHTS
+    assert kept["blob"].endswith(kept["sha256"])
+    assert dropped[PAYLOAD_MARKER] == "truncated" and "blob" not in dropped
+    assert governor.metrics.offloaded == 1 and governor.metrics.truncated == 1
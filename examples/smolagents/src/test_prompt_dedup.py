@@ -0,0 +1,69 @@
+from src.prompt_dedup import PROMPT_CHUNKS_FIELD, PromptDeduplicator, chunk_hash
+
+SYSTEM = "You are a travel agent. " * 10
+
+def rebuild(blocks):
+    chunks = {}
+    prompts = []
+    for block in blocks:
+        chunks.update((chunk["hash"], chunk["text"]) for chunk in block["chunks"])
+        prompts.append(block["separator"].join(chunks[digest] for digest in block["refs"]))
+    return prompts
+
+def test_only_new_messages_are_sent():
+    dedup = PromptDeduplicator(enabled=True)
+    history = [SYSTEM]
+    blocks = []
+    for step in range(5):
+        history.append(f"Step {step}: " + "observation " * 20)
+        blocks.append(dedup.encode("session-1", list(history)))
+
+    assert [len(block["chunks"]) for block in blocks] == [2, 1, 1, 1, 1]
+    assert blocks[-1]["refs"][0] == chunk_hash(SYSTEM)
+    assert rebuild(blocks)[-1] == "\n".join(history)
+
+def test_sessions_and_short_messages_are_not_shared():
+    dedup = PromptDeduplicator(enabled=True, min_chunk_bytes=64)
+
+    dedup.encode("session-1", [SYSTEM, "ok"])
+    second = dedup.encode("session-1", [SYSTEM, "ok"])
+    other = dedup.encode("session-2", [SYSTEM])
+
+    # Short messages are cheaper to resend than to reference
+    assert [chunk["text"] for chunk in second["chunks"]] == ["ok"]
+    assert [chunk["text"] for chunk in other["chunks"]] == [SYSTEM]
+
+def test_forgotten_sessions_send_everything_again():
+    dedup = PromptDeduplicator(enabled=True, max_sessions=1)
+
+    dedup.encode("session-1", [SYSTEM])
+    dedup.encode("session-2", [SYSTEM])
+
+    assert len(dedup.encode("session-1", [SYSTEM])["chunks"]) == 1
+
+def test_disabled_logs_full_prompt():
+    dedup = PromptDeduplicator(enabled=False)
+
+    assert dedup.log_fields("session-1", ["a", "b"]) == {"prompt": "a\nb"}
+    fields = PromptDeduplicator(enabled=True).log_fields("session-1", ["a", "b"])
+    assert fields["prompt"] is None
+    assert rebuild([fields["additional_properties"][PROMPT_CHUNKS_FIELD]]) == ["a\nb"]
+
+def test_consecutive_prompts_are_sent_as_delta():
+    dedup = PromptDeduplicator(enabled=True)
+    history = [SYSTEM]
+    full_refs = {}
+    for step in range(12):
+        history.append(f"Step {step}: " + "observation " * 20)
+        event_id = f"event-{step}"
+        block = dedup.encode("session-1", list(history), event_id=event_id, issuer="agent")
+        prefix = full_refs[block["base"]][:block["base_length"]] if "base" in block else []
+        full_refs[event_id] = prefix + block["refs"]
+
+        assert full_refs[event_id] == [chunk_hash(text) for text in history]
+
+    # Once the shared prefix outweighs the reference, only new refs are sent
+    assert block["base"] == "event-10"
+    assert block["refs"] == [chunk_hash(history[-1])]
+    # Other issuers don't share the prefix
+    assert "base" not in dedup.encode("session-1", list(history), event_id="other", issuer="planner")
@@ -0,0 +1,59 @@
+from src.semantic_cache import SemanticCache, cache_context
+
+WORDS = ["flight", "paris", "london", "cheap", "tomorrow", "hotel"]
+
+def embed(texts):
+    # Bag of words: questions with the same words are identical
+    return [[text.lower().count(word) for word in WORDS] for text in texts]
+
+def test_paraphrase_hits_only_in_the_same_context():
+    cache = SemanticCache(embed, threshold=0.9)
+    context = cache_context(model="qwen3:4b", system="You are a travel agent")
+    lookup = cache.lookup("Cheap flight from London to Paris tomorrow", context)
+    cache.store(lookup, "Take the 9:15")
+
+    hit = cache.lookup("Tomorrow, a cheap Paris flight from London?", context).hit
+    other_model = cache.lookup("Cheap flight from London to Paris tomorrow", cache_context(model="gpt-4o")).hit
+    other_question = cache.lookup("Cheap hotel in Paris", context).hit
+
+    assert hit.value == "Take the 9:15"
+    assert hit.similarity > 0.99
+    assert other_model is None and other_question is None
+    assert cache.metrics.hits == 1 and cache.metrics.misses == 3
+
+def test_expired_and_least_recently_used_entries_go():
+    now = [1000.0]
+    cache = SemanticCache(embed, max_entries=2, ttl_s=60, clock=lambda: now[0])
+    for question in ("flight paris", "flight london", "hotel paris"):
+        now[0] += 1
+        if question == "hotel paris":
+            cache.lookup("flight paris")
+        cache.store(cache.lookup(question), question)
+
+    assert cache.lookup("flight london").hit is None
+    assert cache.lookup("flight paris").hit.value == "flight paris"
+    now[0] += 61
+    assert cache.lookup("hotel paris").hit is None
+    assert len(cache) == 0
+    assert cache.metrics.evicted == 1 and cache.metrics.expired == 2
+
+def test_saved_cache_is_loaded(tmp_path):
+    cache = SemanticCache(embed, directory=str(tmp_path))
+    cache.store(cache.lookup("flight paris", "ctx"), {"answer": 42})
+    cache.save()
+
+    loaded = SemanticCache(embed, directory=str(tmp_path))
+
+    assert loaded.lookup("Paris flight", "ctx").hit.value == {"answer": 42}
+
+def test_embedding_failure_misses_without_storing():
+    def broken(texts):
+        raise ConnectionError("ollama is down")
+
+    cache = SemanticCache(broken)
+    lookup = cache.lookup("flight paris")
+    cache.store(lookup, "answer")
+
+    assert lookup.hit is None
+    assert len(cache) == 0
+    assert cache.metrics.embed_failures == 1
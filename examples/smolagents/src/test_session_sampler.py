@@ -0,0 +1,64 @@
+from coa_dev_coagent.logapi import (
+    create_error_log,
+    create_llm_response_log,
+    create_session_end_log,
+    create_user_input_log,
+)
+
+from src.session_sampler import SamplingPolicy, SessionSampler, head_sampled
+
+def run(session_id, *middle):
+    return [
+        create_user_input_log(session_id=session_id, prompt="Find a flight", prompt_number=1, turn_number=1),
+        *middle,
+        create_session_end_log(session_id=session_id, response="Done", prompt_number=1, turn_number=1),
+    ]
+
+def response(session_id, total_tokens):
+    return create_llm_response_log(
+        session_id=session_id, response="...", prompt_number=1, turn_number=1, total_tokens=total_tokens,
+    )
+
+def test_head_sampling_is_deterministic():
+    sessions = [f"session-{n}" for n in range(2000)]
+    sampled = [s for s in sessions if head_sampled(s, 0.25)]
+
+    assert 400 < len(sampled) < 600
+    assert sampled == [s for s in sessions if head_sampled(s, 0.25)]
+    assert all(head_sampled(s, 1.0) for s in sessions)
+
+def test_tail_keeps_errored_and_expensive_runs():
+    kept, dropped = [], []
+    sampler = SessionSampler(kept.append, SamplingPolicy(head_rate=0.0, token_threshold=1000), dropped.append)
+
+    quiet = run("quiet", response("quiet", 10))
+    errored = run("errored", create_error_log(session_id="errored", prompt_number=1, turn_number=1, error_message="boom"))
+    expensive = run("expensive", response("expensive", 600), response("expensive", 600))
+    for entry in quiet + errored + expensive:
+        sampler.offer(entry)
+
+    assert kept == errored + expensive
+    assert dropped == ["quiet"]
+    assert sampler.metrics.tail_kept == 2 and sampler.metrics.dropped == 1
+    assert sampler.metrics.buffered_bytes == 0
+
+def test_buffered_runs_are_capped():
+    kept, dropped = [], []
+    sampler = SessionSampler(kept.append, SamplingPolicy(head_rate=0.0, max_buffered_bytes=2000), dropped.append)
+
+    for n in range(10):
+        sampler.offer(run(f"open-{n}")[0])
+
+    assert sampler.metrics.buffered_bytes <= 2000
+    assert sampler.metrics.evicted == len(dropped) > 0
+    assert dropped[0] == "open-0"
+    assert kept == []
+
+def test_sink_is_called_without_the_lock():
+    held = []
+    sampler = SessionSampler(lambda entry: held.append(sampler._lock.locked()), SamplingPolicy(head_rate=0.0))
+
+    for entry in run("errored", create_error_log(session_id="errored", prompt_number=1, turn_number=1, error_message="boom")):
+        sampler.offer(entry)
+
+    assert held == [False, False, False]
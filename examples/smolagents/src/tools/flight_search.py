@@ -1,10 +1,15 @@
 from smolagents.tools import Tool
 
-from services.flight_search.flight_search import FlightSearchService
+from services.flight_search.flight_search import get_flight_search_service
 
 class FlightSearchTool(Tool):
     name = "flight_search"
-    description = "Search for flights between two locations"
+    description = (
+        "Search for flights between two locations. Returns the matching flights "
+        "sorted by `sort_by`, one page of at most `limit` flights at a time, along "
+        "with the `total` number of matches. Use the filters instead of searching "
+        "broadly and filtering the results yourself."
+    )
     inputs = {
         'source': {
             'type': 'string',
@@ -16,17 +21,74 @@ class FlightSearchTool(Tool):
             'description': "The name or code of the destination airport or city.",
             'optional': True,
         },
+        'max_price': {
+            'type': 'number',
+            'description': "Only return flights up to this price.",
+            'nullable': True,
+        },
+        'max_stops': {
+            'type': 'integer',
+            'description': "Only return flights with at most this many stops.",
+            'nullable': True,
+        },
+        'date_from': {
+            'type': 'string',
+            'description': "Earliest travel date, formatted as YYYY-MM-DD.",
+            'nullable': True,
+        },
+        'date_to': {
+            'type': 'string',
+            'description': "Latest travel date, formatted as YYYY-MM-DD.",
+            'nullable': True,
+        },
+        'sort_by': {
+            'type': 'string',
+            'description': "One of 'price' (default), 'duration', 'departure' or 'stops'.",
+            'nullable': True,
+        },
+        'limit': {
+            'type': 'integer',
+            'description': "Maximum number of flights to return, 10 by default.",
+            'nullable': True,
+        },
+        'offset': {
+            'type': 'integer',
+            'description': "Number of flights to skip, to fetch the next page.",
+            'nullable': True,
+        },
     }
-    output_type = 'string'
+    output_type = 'object'
 
     def __init__(self, **kwargs):
         super().__init__()
 
-    def forward(self, source: str, destination: str) -> str:
-        fss = FlightSearchService()
-        flights = fss.find_by_route(source, destination)
+    def forward(self, source: str, destination: str,
+                max_price: float | None = None, max_stops: int | None = None,
+                date_from: str | None = None, date_to: str | None = None,
+                sort_by: str | None = None, limit: int | None = None,
+                offset: int | None = None) -> dict:
+        fss = get_flight_search_service()
+        try:
+            page = fss.query(
+                source=source,
+                destination=destination,
+                max_price=max_price,
+                max_stops=max_stops,
+                date_from=date_from,
+                date_to=date_to,
+                sort_by=sort_by or 'price',
+                limit=10 if limit is None else limit,
+                offset=offset or 0,
+            )
+        except ValueError as e:
+            # Malformed arguments from the model; tell it what to fix
+            return f"Invalid flight search: {e}"
+        flights = page['flights']
+        filtered = any(
+            value is not None for value in (max_price, max_stops, date_from, date_to, offset)
+        )
 
-        if len(flights) == 0:
+        if page['total'] == 0 and not filtered:
             flights = [
                 {
                     "Airline": "Mock Airline",
@@ -65,5 +127,6 @@ class FlightSearchTool(Tool):
                     "Price": 229.99
                 }
             ]
+            page = {'total': len(flights), 'offset': 0, 'limit': len(flights), 'flights': flights}
 
-        return flights
+        return page
@@ -0,0 +1,211 @@
+"""
+Compare storage and query latency of the log_entries schemas.
+
+Creates the original schema (`01-init-coagent.sql`) and schema v2
+(`03-log-entries-v2.sql`) side by side in a scratch database, fills both with
+the same synthetic events, and reports per table:
+
+- rows, compressed and uncompressed bytes, and the largest columns
+- median latency, rows read and bytes read of typical lookups: by event_id,
+  by log_id, by session_id, and a one-hour time range across sessions
+
+The table definitions are taken from the init scripts, so the benchmark
+always measures the schemas that ship. Only the standard library is used;
+ClickHouse is reached over its HTTP interface.
+
+Usage:
+    python tools/clickhouse_bench.py --events 1000000 --output bench.json
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+
+from clickhouse_http import ClickHouse
+
+INITDB_DIR = os.path.join(os.path.dirname(__file__), "..", "config", "clickhouse", "initdb.d")
+SCHEMAS = {
+    "log_entries_v1": ("01-init-coagent.sql", "log_entries"),
+    "log_entries_v2": ("03-log-entries-v2.sql", "log_entries_v2"),
+}
+
+# Words for compressible, text-like prompts and responses
+WORDS = ("find a flight from delhi to mumbai next week under five thousand rupees "
+         "the cheapest option departs in the morning with one stop and the agent "
+         "checks availability before booking the final itinerary for the user")
+
+
+def table_ddl(script: str, table: str, database: str, name: str) -> str:
+    """Extract the CREATE TABLE statement of `table` from an init script."""
+    with open(os.path.join(INITDB_DIR, script)) as f:
+        sql = "\n".join(line for line in f.read().splitlines() if not line.lstrip().startswith("--"))
+    for statement in sql.split(";"):
+        match = re.match(rf"\s*CREATE TABLE (IF NOT EXISTS )?{table}\s*\(", statement)
+        if match:
+            return f"CREATE TABLE {database}.{name} (" + statement[match.end():]
+    raise ValueError(f"No CREATE TABLE {table} in {script}")
+
+
+def synthetic_events_sql(table: str, events: int, events_per_session: int) -> str:
+    """INSERT ... SELECT generating events shaped like the example integrations."""
+    per = events_per_session
+    return f"""
+    INSERT INTO {table}
+    WITH
+        number % {per} AS pos,
+        intDiv(number, {per}) AS session,
+        splitByChar(' ', '{WORDS}') AS words,
+        arrayStringConcat(arraySlice(words, 1 + rand(1) % 12, 8 + rand(2) % 16), ' ') AS text,
+        multiIf(
+            pos = 0, 'session_start',
+            pos = {per - 1}, 'session_end',
+            rand(3) % 50 = 0, 'error',
+            ['llm_call', 'llm_response', 'tool_call', 'tool_response'][pos % 4 + 1]
+        ) AS kind
+    SELECT
+        toString(generateUUIDv4(number)),
+        toDateTime64('2025-01-01 00:00:00', 3)
+            + toIntervalMillisecond(session * 60000 + pos * 1500 + rand(4) % 1000),
+        '2.0.0',
+        concat('session-', leftPad(toString(session), 8, '0')),
+        toUInt32(1 + intDiv(pos, 8)),
+        toUInt32(pos % 8),
+        toString(generateUUIDv4(number + {events})),
+        kind,
+        CAST(concat(
+            '{{"issuer":"', ['manager_agent', 'transportation_agent', 'trading_agent'][number % 3 + 1],
+            '","model":"qwen3:4b","input_tokens":', toString(rand(5) % 4000),
+            ',"output_tokens":', toString(rand(6) % 800),
+            ',"execution_time_ms":', toString(rand(7) % 5000),
+            ',"response":"', text, '"}}'
+        ), 'JSON'),
+        ['coordinator', ['manager_agent', 'transportation_agent', 'trading_agent'][number % 3 + 1]],
+        if(kind IN ('session_start', 'llm_call'), text, NULL),
+        NULL,
+        CAST('{{"provider":"ollama","temperature":0.7}}', 'Nullable(JSON)'),
+        NULL,
+        NULL
+    FROM numbers({events})
+    """
+
+
+def storage(ch: ClickHouse, database: str) -> dict:
+    tables = ch.rows(f"""
+        SELECT table, sum(rows) AS rows, count() AS parts,
+               sum(data_compressed_bytes) AS compressed_bytes,
+               sum(data_uncompressed_bytes) AS uncompressed_bytes,
+               sum(bytes_on_disk) AS bytes_on_disk
+        FROM system.parts
+        WHERE database = '{database}' AND active
+        GROUP BY table ORDER BY table
+    """)["data"]
+    columns = ch.rows(f"""
+        SELECT table, name, data_compressed_bytes AS compressed_bytes,
+               data_uncompressed_bytes AS uncompressed_bytes
+        FROM system.columns
+        WHERE database = '{database}'
+        ORDER BY table, data_compressed_bytes DESC
+    """)["data"]
+    result = {}
+    for row in tables:
+        row = {key: int(value) if key != "table" else value for key, value in row.items()}
+        row["columns"] = [
+            {key: column[key] for key in ("name", "compressed_bytes", "uncompressed_bytes")}
+            for column in columns if column["table"] == row["table"]
+        ]
+        result[row.pop("table")] = row
+    return result
+
+
+def benchmark_queries(ch: ClickHouse, database: str, repeat: int) -> dict:
+    sample = ch.rows(f"""
+        SELECT event_id, log_id, session_id, timestamp
+        FROM {database}.log_entries_v1
+        ORDER BY cityHash64(event_id) LIMIT 1
+    """)["data"][0]
+    queries = {
+        "by_event_id": "SELECT * FROM {table} WHERE event_id = '%s'" % sample["event_id"],
+        "by_log_id": "SELECT * FROM {table} WHERE log_id = '%s'" % sample["log_id"],
+        "by_session_id": "SELECT * FROM {table} WHERE session_id = '%s'" % sample["session_id"],
+        "time_range_1h": (
+            "SELECT event_type, count() FROM {table} "
+            "WHERE timestamp >= toDateTime64('%s', 3) "
+            "AND timestamp < toDateTime64('%s', 3) + INTERVAL 1 HOUR GROUP BY event_type"
+        ) % (sample["timestamp"], sample["timestamp"]),
+    }
+
+    results = {}
+    for table in SCHEMAS:
+        results[table] = {}
+        for name, sql in queries.items():
+            # Neither cache should let later runs skip the work of the first
+            runs = [
+                ch.rows(sql.format(table=f"{database}.{table}"),
+                        use_query_cache=0, use_query_condition_cache=0)["statistics"]
+                for _ in range(repeat)
+            ]
+            results[table][name] = {
+                "median_ms": round(statistics.median(run["elapsed"] for run in runs) * 1000, 3),
+                "rows_read": runs[-1]["rows_read"],
+                "bytes_read": runs[-1]["bytes_read"],
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark log_entries schemas in ClickHouse")
+    parser.add_argument("--url", help="default: $CLICKHOUSE_URL or http://localhost:8123")
+    parser.add_argument("--user", help="default: $CLICKHOUSE_USER or coagent")
+    parser.add_argument("--password", help="default: $CLICKHOUSE_PASSWORD or coagent")
+    parser.add_argument("--database", default="coagent_bench")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--events-per-session", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    args = parser.parse_args()
+
+    ch = ClickHouse(args.url, args.user, args.password)
+    database = args.database
+
+    ch.execute(f"DROP DATABASE IF EXISTS {database}")
+    ch.execute(f"CREATE DATABASE {database}")
+    try:
+        for name, (script, table) in SCHEMAS.items():
+            ch.execute(table_ddl(script, table, database, name))
+
+        print(f"Generating {args.events} events...", file=sys.stderr)
+        ch.execute(synthetic_events_sql(f"{database}.log_entries_v1", args.events, args.events_per_session))
+        ch.execute(f"INSERT INTO {database}.log_entries_v2 SELECT * FROM {database}.log_entries_v1")
+        for name in SCHEMAS:
+            ch.execute(f"OPTIMIZE TABLE {database}.{name} FINAL")
+
+        print("Running queries...", file=sys.stderr)
+        report = {
+            "events": args.events,
+            "storage": storage(ch, database),
+            "queries": benchmark_queries(ch, database, args.repeat),
+        }
+    finally:
+        if not args.keep:
+            ch.execute(f"DROP DATABASE IF EXISTS {database}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{'table':<16}{'rows':>10}{'compressed':>14}{'uncompressed':>14}")
+    for name, row in report["storage"].items():
+        print(f"{name:<16}{row['rows']:>10}{row['compressed_bytes']:>14}{row['uncompressed_bytes']:>14}")
+    print()
+    print(f"{'query':<16}{'table':<16}{'median ms':>10}{'rows read':>12}{'bytes read':>14}")
+    for name, queries in report["queries"].items():
+        for query, stats in queries.items():
+            print(f"{query:<16}{name:<16}{stats['median_ms']:>10}{stats['rows_read']:>12}{stats['bytes_read']:>14}")
+
+
+if __name__ == "__main__":
+    main()
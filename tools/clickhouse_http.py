@@ -0,0 +1,36 @@
+"""Minimal client for the ClickHouse HTTP interface, shared by the tools."""
+
+import base64
+import json
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+class ClickHouse:
+    """Runs queries over the ClickHouse HTTP interface (port 8123)."""
+
+    def __init__(self, url: str | None = None, user: str | None = None,
+                 password: str | None = None) -> None:
+        self.url = (url or os.environ.get("CLICKHOUSE_URL", "http://localhost:8123")).rstrip("/")
+        user = user or os.environ.get("CLICKHOUSE_USER", "coagent")
+        password = password or os.environ.get("CLICKHOUSE_PASSWORD", "coagent")
+        credentials = base64.b64encode(f"{user}:{password}".encode()).decode()
+        self.headers = {"Authorization": f"Basic {credentials}"}
+
+    def execute(self, sql: str, **settings) -> str:
+        """Run a statement; settings and query parameters go in the URL."""
+        query = urllib.parse.urlencode(settings)
+        request = urllib.request.Request(
+            f"{self.url}/?{query}", data=sql.encode("utf-8"), headers=self.headers
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.read().decode("utf-8")
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"{e.code}: {e.read().decode('utf-8', 'replace')}") from None
+
+    def rows(self, sql: str, **settings) -> dict:
+        """Run a query with `FORMAT JSON`; returns data and statistics."""
+        return json.loads(self.execute(f"{sql} FORMAT JSON", **settings))
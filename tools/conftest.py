@@ -0,0 +1,15 @@
+import threading
+
+import pytest
+
+from ingest_server import API_PREFIX, create_server
+
+
+@pytest.fixture
+def ingest_server():
+    """The stand-in log API on an ephemeral port; yields its base URL."""
+    server = create_server(port=0, quiet=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}{API_PREFIX}"
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,499 @@
+"""
+Measure how fast the CoAgent log API ingests log entries.
+
+Replays synthetic sessions shaped like those the example integrations log
+against `POST /api/v1/logs`:
+
+    smolagents  a manager agent and the flight search agent taking CodeAgent
+                steps: llm_call with prompt chunks, llm_response, python
+                tool calls and the odd error
+    adk         the financial coordinator and its analysts, with span ids,
+                parallel branches, search tool calls and stream timing
+    langchain   one structured-output recipe call with stream timing
+
+Sessions are generated up front from `--seed`, so runs with the same
+settings send the same content (with fresh ids). They are sent the way the
+examples' spools ship them: each of `--concurrency` worker threads, like
+one agent process, takes whole sessions and sends their entries in batches
+of `--batch-size` over a keep-alive connection, as gzip NDJSON
+(`--format ndjson`) or as a JSON array (`--format array`). `--batch-size 1`
+sends one JSON object per request, as the CoAgent client does without a
+spool.
+
+Reported for each concurrency level:
+
+- events/s and requests/s over the run
+- p50, p90 and p99 latency of the requests
+- client CPU per event: the process time of this process while sending,
+  which includes encoding and compressing the entries
+- bytes on the wire: request headers and bodies sent, request bodies before
+  compression, and response bodies received
+
+With `--local`, the stand-in server `ingest_server.py` is started in a
+subprocess on a free port, so its CPU time isn't counted as the client's.
+Only the standard library is used.
+
+Usage:
+    python tools/ingest_bench.py --local --concurrency 1,8,32 --output ingest.json
+    python tools/ingest_bench.py --base-url http://localhost:3000/api/v1 --sessions 1000
+"""
+
+import argparse
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import platform
+import queue
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+from session_logs import DEFAULT_BASE_URL, PROMPT_CHUNKS_FIELD
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+# Like the spools' BulkSender: gzip NDJSON bodies larger than a kilobyte
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+ERROR_RATE = 0.02
+
+VOCABULARY = (
+    "find a flight from delhi to mumbai next week under five thousand rupees the cheapest "
+    "option departs in the morning with one stop and the agent checks availability before "
+    "booking the final itinerary for the user analyze the market data for the ticker and "
+    "propose trading strategies with entry and exit points position sizing risk limits "
+    "volatility drawdown earnings guidance revenue growth margin outlook sector momentum "
+    "print result observation code search dataset columns price airline duration"
+).split()
+
+
+def text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(VOCABULARY, k=words))
+
+
+class SessionBuilder:
+    """Entries of one synthetic session, timestamped as they would be logged."""
+
+    def __init__(self, rng: random.Random, profile: str, start_ms: int) -> None:
+        self.rng = rng
+        self.session_id = f"bench-{profile}-{uuid.uuid4()}"
+        self.now = start_ms
+        self.entries: list[dict] = []
+
+    def add(self, event_type: str, prompt_number: int, turn_number: int, **fields) -> dict:
+        self.now += self.rng.randint(20, 1500)
+        entry = {
+            "version": "2.0.0",
+            "session_id": self.session_id,
+            "prompt_number": prompt_number,
+            "turn_number": turn_number,
+            "event_id": str(uuid.uuid4()),
+            "event_type": event_type,
+            "timestamp": self.now,
+        }
+        entry.update((key, value) for key, value in fields.items() if value is not None)
+        self.entries.append(entry)
+        return entry
+
+    def llm_response(self, turn: int, response: str, model: str, agent: str, meta: dict | None = None,
+                     **fields) -> dict:
+        input_tokens = self.rng.randint(500, 6000)
+        output_tokens = self.rng.randint(50, 800)
+        return self.add(
+            "llm_response", 1, turn,
+            llm_response={
+                "response": response,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+                "execution_time_ms": self.rng.randint(300, 20000),
+            },
+            meta={"model": model, "agent": agent, **(meta or {})},
+            **fields,
+        )
+
+    def end(self, turn: int, response: str, meta: dict) -> None:
+        elapsed_ms = self.now - self.entries[0]["timestamp"]
+        self.add("session_end", 1, turn, output_data={"response": response},
+                 meta={**meta, "elapsed_time_ms": elapsed_ms})
+
+
+def stream_timing(rng: random.Random) -> dict:
+    """A `stream_timing` report as the ADK and LangChain examples log it."""
+    return {
+        "ttft_ms": round(rng.uniform(80, 1500), 3),
+        "stream_ms": round(rng.uniform(500, 15000), 3),
+        "chunks": rng.randint(20, 800),
+        "tokens_per_second": round(rng.uniform(15, 90), 3),
+        "inter_token_ms": {name: round(rng.uniform(5, 60), 3) for name in ("p50", "p90", "p99", "max")},
+    }
+
+
+def smolagents_session(b: SessionBuilder) -> None:
+    rng = b.rng
+    task = text(rng, rng.randint(12, 40))
+    b.add("session_start", 1, 0, prompt=task, meta={"agent": "manager_agent"})
+    # The system prompt and task are resent with every step; prompt_dedup
+    # sends each message once and refers to it by hash afterwards
+    messages = [text(rng, rng.randint(600, 900)), task]
+    sent: set[str] = set()
+    turn = 0
+    for agent in ("manager_agent", "transportation_agent"):
+        for _ in range(rng.randint(2, 6)):
+            turn += 1
+            refs = [hashlib.sha256(message.encode()).hexdigest()[:32] for message in messages]
+            chunks = [{"hash": ref, "text": message} for ref, message in zip(refs, messages) if ref not in sent]
+            sent.update(refs)
+            b.add("llm_call", 1, turn, llm_call={"issuer": agent},
+                  **{PROMPT_CHUNKS_FIELD: {"refs": refs, "chunks": chunks, "separator": "\n"}})
+            code = text(rng, rng.randint(20, 120))
+            b.llm_response(turn, f"Thought: {text(rng, 30)}\nCode:\n```py\n{code}\n```", "qwen3:4b", agent)
+            parameters = {"code": code}
+            b.add("tool_call", 1, turn, tool_call={"tool_name": "python_interpreter", "parameters": parameters})
+            observation = text(rng, rng.randint(40, 300))
+            b.add("tool_response", 1, turn, tool_response={
+                "tool_name": "python_interpreter",
+                "parameters": parameters,
+                "result": {"output": observation},
+                "success": True,
+                "execution_time_ms": rng.randint(5, 3000),
+            })
+            if rng.random() < ERROR_RATE:
+                b.add("error", 1, turn, error_info={"error_type": "AgentExecutionError",
+                                                    "error_message": text(rng, 20)})
+            messages.append(observation)
+    b.end(turn, text(rng, 40), {"hook_log": {"queued": turn * 4, "dropped": 0}})
+
+
+def adk_session(b: SessionBuilder) -> None:
+    rng = b.rng
+    question = text(rng, rng.randint(8, 30))
+    b.add("session_start", 1, 0, prompt=question, meta={"agent": "financial_coordinator"})
+    b.add("user_input", 1, 0, prompt=question)
+    root = uuid.uuid4().hex[:16]
+    turn = 0
+    analysts = ("data_analyst", "trading_analyst", "execution_analyst", "risk_analyst")
+    for agent in ("financial_coordinator", *analysts, "financial_coordinator"):
+        turn += 1
+        agent_span = root if agent == "financial_coordinator" else uuid.uuid4().hex[:16]
+        model_span = uuid.uuid4().hex[:16]
+        span = {"span_id": model_span, "parent_span_id": agent_span, "span_kind": "model"}
+        if agent in analysts[2:]:
+            # Execution and risk analysis run side by side in a fan-out
+            span["branch"] = f"advisory.{agent}"
+        b.add("llm_call", 1, turn, prompt=text(rng, rng.randint(150, 600)),
+              llm_call={"issuer": agent, "system_prompt": text(rng, rng.randint(100, 300))},
+              meta={"model": "gemini-2.5-flash", **span})
+        if agent == "data_analyst":
+            for _ in range(rng.randint(1, 3)):
+                tool_span = {"span_id": uuid.uuid4().hex[:16], "parent_span_id": agent_span, "span_kind": "tool"}
+                parameters = {"query": text(rng, 8)}
+                b.add("tool_call", 1, turn, tool_call={"tool_name": "google_search", "parameters": parameters},
+                      meta=tool_span)
+                b.add("tool_response", 1, turn, meta=tool_span, tool_response={
+                    "tool_name": "google_search",
+                    "parameters": parameters,
+                    "result": {"result": text(rng, rng.randint(100, 500))},
+                    "success": True,
+                    "execution_time_ms": rng.randint(200, 4000),
+                })
+        b.llm_response(turn, text(rng, rng.randint(100, 700)), "gemini-2.5-flash", agent,
+                       meta=span, stream_timing=stream_timing(rng))
+    b.end(turn, text(rng, 60), {"response_cache": {"hits": 0, "misses": turn}})
+
+
+def langchain_session(b: SessionBuilder) -> None:
+    rng = b.rng
+    b.add("session_start", 1, 0, prompt="Generate structured recipes using LangChain with Ollama")
+    ingredients = ", ".join(rng.choices(VOCABULARY, k=rng.randint(3, 8)))
+    b.add("llm_call", 1, 1, prompt=f"{text(rng, 150)}\nIngredients: {ingredients}",
+          llm_call={"issuer": "langchain", "system_prompt": "You are a professional chef and cooking assistant."})
+    recipes = {"recipes": [
+        {"name": text(rng, 4), "ingredients": rng.choices(VOCABULARY, k=8), "steps": [text(rng, 15) for _ in range(6)]}
+        for _ in range(rng.randint(1, 3))
+    ]}
+    b.llm_response(1, json.dumps(recipes), "llama3.2", "langchain", stream_timing=stream_timing(rng))
+    b.end(0, f"Generated {len(recipes['recipes'])} recipes successfully", {"model": "llama3.2"})
+
+
+PROFILES = {
+    "smolagents": smolagents_session,
+    "adk": adk_session,
+    "langchain": langchain_session,
+}
+
+
+def generate_sessions(count: int, profiles: list[str], seed: int) -> list[list[dict]]:
+    """`count` sessions of the given profiles in turn, starting now."""
+    rng = random.Random(seed)
+    start_ms = int(time.time() * 1000)
+    sessions = []
+    for i in range(count):
+        profile = profiles[i % len(profiles)]
+        builder = SessionBuilder(rng, profile, start_ms + rng.randint(0, 60_000))
+        PROFILES[profile](builder)
+        sessions.append(builder.entries)
+    return sessions
+
+
+class CountingConnection(http.client.HTTPConnection):
+    """HTTPConnection counting the bytes it sends, headers included."""
+
+    bytes_sent = 0
+
+    def send(self, data) -> None:
+        super().send(data)
+        self.bytes_sent += len(data)
+
+
+class Worker(threading.Thread):
+    """Sends the entries of sessions taken from a queue, in batches, like one spool."""
+
+    def __init__(self, url: str, sessions: queue.Queue, batch_size: int, body_format: str,
+                 compress: bool, headers: dict[str, str]) -> None:
+        super().__init__(daemon=True)
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.path = parsed.path
+        self.sessions = sessions
+        self.batch_size = batch_size
+        self.format = body_format
+        self.compress = compress
+        self.headers = headers
+        self.latencies_ms: list[float] = []
+        self.events = self.rejected = self.requests = self.failed_requests = 0
+        self.body_bytes = self.uncompressed_bytes = self.received_bytes = self.bytes_sent = 0
+        self._connection: CountingConnection | None = None
+
+    def run(self) -> None:
+        pending: list[dict] = []
+        while True:
+            try:
+                pending.extend(self.sessions.get_nowait())
+            except queue.Empty:
+                break
+            while len(pending) >= self.batch_size:
+                self._send(pending[:self.batch_size])
+                del pending[:self.batch_size]
+        if pending:
+            self._send(pending)
+        self._close()
+
+    def _encode(self, entries: list[dict]) -> tuple[bytes, dict[str, str]]:
+        if self.batch_size == 1:
+            return json.dumps(entries[0]).encode(), {"Content-Type": "application/json"}
+        if self.format == "array":
+            return json.dumps(entries).encode(), {"Content-Type": "application/json"}
+        body = "".join(json.dumps(entry) + "\n" for entry in entries).encode()
+        self.uncompressed_bytes += len(body)
+        if self.compress and len(body) > GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            return body, {"Content-Type": NDJSON_CONTENT_TYPE, "Content-Encoding": "gzip"}
+        return body, {"Content-Type": NDJSON_CONTENT_TYPE}
+
+    def _send(self, entries: list[dict]) -> None:
+        body, headers = self._encode(entries)
+        if "Content-Encoding" not in headers and headers["Content-Type"] != NDJSON_CONTENT_TYPE:
+            self.uncompressed_bytes += len(body)
+        self.body_bytes += len(body)
+        self.events += len(entries)
+        self.requests += 1
+        start = time.perf_counter()
+        try:
+            if self._connection is None:
+                self._connection = CountingConnection(self.host, self.port, timeout=60)
+            self._connection.request("POST", self.path, body, {**self.headers, **headers})
+            response = self._connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            self.failed_requests += 1
+            self.rejected += len(entries)
+            self._close()
+            return
+        self.latencies_ms.append((time.perf_counter() - start) * 1000)
+        self.received_bytes += len(payload)
+        if response.status != 200:
+            self.failed_requests += 1
+            self.rejected += len(entries)
+        elif headers["Content-Type"] == NDJSON_CONTENT_TYPE:
+            self.rejected += json.loads(payload).get("rejected", 0)
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self.bytes_sent += self._connection.bytes_sent
+            self._connection.close()
+            self._connection = None
+
+
+def percentiles(values: list[float]) -> dict[str, float | None]:
+    if not values:
+        return {"p50": None, "p90": None, "p99": None, "max": None}
+    cuts = statistics.quantiles(values, n=100, method="inclusive") if len(values) > 1 else values * 99
+    return {
+        "p50": round(cuts[49], 3),
+        "p90": round(cuts[89], 3),
+        "p99": round(cuts[98], 3),
+        "max": round(max(values), 3),
+    }
+
+
+def run(url: str, sessions: list[list[dict]], concurrency: int, batch_size: int, body_format: str,
+        compress: bool, headers: dict[str, str]) -> dict:
+    """Send the sessions with `concurrency` workers and measure the run."""
+    pending: queue.Queue = queue.Queue()
+    for session in sessions:
+        pending.put(session)
+    workers = [Worker(url, pending, batch_size, body_format, compress, headers) for _ in range(concurrency)]
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    duration_s = time.perf_counter() - start
+    cpu_s = time.process_time() - cpu_start
+
+    def total(name: str) -> int:
+        return sum(getattr(worker, name) for worker in workers)
+
+    events = total("events")
+    accepted = events - total("rejected")
+    latencies = [latency for worker in workers for latency in worker.latencies_ms]
+    requests = total("requests")
+    return {
+        "concurrency": concurrency,
+        "sessions": len(sessions),
+        "events": events,
+        "accepted_events": accepted,
+        "rejected_events": events - accepted,
+        "requests": requests,
+        "failed_requests": total("failed_requests"),
+        "duration_s": round(duration_s, 3),
+        "events_per_s": round(accepted / duration_s, 1),
+        "requests_per_s": round(requests / duration_s, 1),
+        "latency_ms": percentiles(latencies),
+        "client_cpu_s": round(cpu_s, 3),
+        "client_cpu_us_per_event": round(cpu_s / events * 1e6, 1) if events else None,
+        # Above 1 the client used more than one core's worth of CPU time
+        "client_cpu_utilization": round(cpu_s / duration_s, 3),
+        "bytes": {
+            "sent": total("bytes_sent"),
+            "request_bodies": total("body_bytes"),
+            "uncompressed_bodies": total("uncompressed_bytes"),
+            "received_bodies": total("received_bytes"),
+            "sent_per_event": round(total("bytes_sent") / events, 1) if events else None,
+        },
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_server() -> tuple[subprocess.Popen, str]:
+    """Start ingest_server.py on a free port and wait until it accepts connections."""
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingest_server.py"),
+         "--port", str(port), "--quiet"],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server, f"http://127.0.0.1:{port}/api/v1"
+        except OSError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise RuntimeError("The stand-in ingestion server didn't start")
+            time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion throughput of the CoAgent log API")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--local", action="store_true", help="benchmark the bundled stand-in server")
+    parser.add_argument("--token", help="bearer token for the log API")
+    parser.add_argument("--sessions", type=int, default=200, help="sessions per concurrency level")
+    parser.add_argument("--profiles", default=",".join(PROFILES),
+                        help=f"comma-separated session shapes, sent in turn (default: {','.join(PROFILES)})")
+    parser.add_argument("--concurrency", default="1,8",
+                        help="comma-separated numbers of concurrent senders, one run each")
+    parser.add_argument("--batch-size", type=int, default=100, help="entries per request; 1 for single entries")
+    parser.add_argument("--format", choices=("ndjson", "array"), default="ndjson", help="body of batches")
+    parser.add_argument("--no-gzip", action="store_true", help="don't compress NDJSON batches")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    profiles = [name.strip() for name in args.profiles.split(",") if name.strip()]
+    unknown = set(profiles) - set(PROFILES)
+    if unknown or not profiles:
+        parser.error(f"unknown profiles: {', '.join(sorted(unknown))}; choose from {', '.join(PROFILES)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    headers = {"Accept": "application/json"}
+    if args.token:
+        headers["Authorization"] = f"Bearer {args.token}"
+
+    server = None
+    base_url = args.base_url
+    if args.local:
+        server, base_url = start_local_server()
+    url = f"{base_url.rstrip('/')}/logs"
+    try:
+        runs = []
+        for concurrency in levels:
+            # Fresh ids for every run, so no run rewrites the entries of another
+            sessions = generate_sessions(args.sessions, profiles, args.seed)
+            print(f"Sending {sum(map(len, sessions))} events with concurrency {concurrency}...", file=sys.stderr)
+            runs.append(run(url, sessions, concurrency, args.batch_size, args.format, not args.no_gzip, headers))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "target": "local" if args.local else url,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "sessions": args.sessions,
+            "profiles": profiles,
+            "batch_size": args.batch_size,
+            "format": "json" if args.batch_size == 1 else args.format,
+            "gzip": args.batch_size > 1 and args.format == "ndjson" and not args.no_gzip,
+            "seed": args.seed,
+        },
+        "runs": runs,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{'concurrency':>11}{'events/s':>11}{'p50 ms':>9}{'p99 ms':>9}{'cpu us/ev':>11}"
+          f"{'bytes/ev':>10}{'rejected':>10}")
+    for result in report["runs"]:
+        row = (result["concurrency"], result["events_per_s"], result["latency_ms"]["p50"],
+               result["latency_ms"]["p99"], result["client_cpu_us_per_event"],
+               result["bytes"]["sent_per_event"], result["rejected_events"])
+        # Latencies are None when no request got an answer
+        print("".join(f"{str(value):>{width}}" for value, width in zip(row, (11, 11, 9, 9, 11, 10, 10))))
+
+
+if __name__ == "__main__":
+    main()
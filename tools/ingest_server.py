@@ -0,0 +1,383 @@
+"""
+Stand-in for the CoAgent log API, for testing integrations without the
+CoAgent stack.
+
+Implements the endpoints the examples use:
+
+    POST /api/v1/logs               one JSON object, a JSON array, or NDJSON
+                                    (`Content-Type: application/x-ndjson`,
+                                    optionally `Content-Encoding: gzip`)
+    GET  /api/v1/logs/{session_id}  entries of a session, oldest first; see
+                                    below for pagination and streaming
+    GET  /api/v1/runs               session ids (`?summarize=1` for counts,
+                                    first/last timestamps, event counts per
+                                    type, token sums, errors and tool calls)
+
+NDJSON requests are answered with a status per entry, so clients can retry
+or drop entries individually:
+
+    {"success": false, "message": "1 of 2 log entries rejected",
+     "accepted": 1, "rejected": 1,
+     "results": [{"index": 0, "event_id": "a", "status": "ok"},
+                 {"index": 1, "event_id": null, "status": "error",
+                  "error": "missing field: event_id"}]}
+
+Session logs can be read in pages with keyset pagination over
+(timestamp, event_id), the sort order of `log_entries` in ClickHouse:
+
+    GET /api/v1/logs/{session_id}?limit=500
+    -> {"logs": [...], "next_cursor": "WzE3MjUzNzkyNjAwMDAsImV2dC0xIl0"}
+    GET /api/v1/logs/{session_id}?limit=500&cursor=WzE3MjUzNzkyNjAwMDAsImV2dC0xIl0
+
+`next_cursor` is null on the last page. With `Accept: application/x-ndjson`
+(or `?format=ndjson`) the entries are streamed one per line instead, using
+chunked transfer encoding; `cursor` and `limit` apply there too. Without
+any of these parameters the whole session is returned as a JSON array.
+
+Prompts logged as content-addressed chunks (`prompt_chunks`, see
+`prompt_dedup.py` in the examples) are stored once per session and
+reassembled into `prompt` when the session is read. Delta-encoded prompts
+are materialized from their base on read, and recent ones are cached.
+
+Entries are kept in memory and, with `--store`, appended to an NDJSON file.
+Only the standard library is used.
+
+Usage:
+    python tools/ingest_server.py --port 3000 --store /tmp/coagent-logs.ndjson
+"""
+
+import argparse
+import base64
+import bisect
+import gzip
+import json
+import threading
+
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from session_logs import PROMPT_CHUNKS_FIELD, PromptResolver
+
+API_PREFIX = "/api/v1"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+EVENT_TYPES = {
+    "session_start", "session_end", "user_input", "component_enter", "component_exit",
+    "routing", "consensus_success", "consensus_failure", "tool_call", "tool_response",
+    "error", "recovery", "performance_degradation", "human_oversight", "test_result",
+    "llm_call", "llm_response",
+}
+REQUIRED_FIELDS = ("session_id", "event_id", "event_type", "timestamp")
+MAX_PAGE_SIZE = 1000
+# Entries per chunk of a streamed response
+STREAM_CHUNK_SIZE = 100
+
+
+def encode_cursor(key: tuple[int, str]) -> str:
+    """Opaque cursor for the position after the entry with sort key `key`."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, str]:
+    timestamp, event_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    return int(timestamp), str(event_id)
+
+
+def validate_entry(entry) -> str | None:
+    """Return why `entry` can't be stored, or None when it is valid."""
+    if not isinstance(entry, dict):
+        return "entry is not a JSON object"
+    for field in REQUIRED_FIELDS:
+        if entry.get(field) in (None, ""):
+            return f"missing field: {field}"
+    if entry["event_type"] not in EVENT_TYPES:
+        return f"unknown event_type: {entry['event_type']}"
+    for field in ("prompt_number", "turn_number", "timestamp"):
+        value = entry.get(field, 0)
+        if not isinstance(value, int) or value < 0:
+            return f"{field} must be a non-negative integer"
+    return None
+
+
+def new_summary(session_id: str) -> dict:
+    return {
+        "run_id": session_id,
+        "log_count": 0,
+        "start_timestamp": None,
+        "end_timestamp": None,
+        "event_counts": defaultdict(int),
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "total_tokens": 0,
+        "error_count": 0,
+        "tool_call_count": 0,
+    }
+
+
+def add_to_summary(summary: dict, entry: dict) -> None:
+    """Fold one entry into a session summary, like session_summaries_mv."""
+    timestamp = entry["timestamp"]
+    summary["log_count"] += 1
+    if summary["start_timestamp"] is None or timestamp < summary["start_timestamp"]:
+        summary["start_timestamp"] = timestamp
+    if summary["end_timestamp"] is None or timestamp > summary["end_timestamp"]:
+        summary["end_timestamp"] = timestamp
+
+    event_type = entry["event_type"]
+    summary["event_counts"][event_type] += 1
+    if event_type == "llm_response":
+        usage = entry.get("llm_response") or {}
+        for field in ("input_tokens", "output_tokens", "total_tokens"):
+            summary[field] += usage.get(field) or 0
+    elif event_type == "error":
+        summary["error_count"] += 1
+    elif event_type == "tool_call":
+        summary["tool_call_count"] += 1
+
+
+class LogStore:
+    """
+    Thread-safe in-memory store of log entries, grouped by session.
+
+    Each session's entries are kept sorted by (timestamp, event_id), so pages
+    are found by bisection. A summary per session is updated as entries
+    arrive, so listing runs doesn't scan the entries.
+    """
+
+    def __init__(self, path: str | None = None) -> None:
+        self._lock = threading.Lock()
+        self._sessions: dict[str, list[dict]] = defaultdict(list)
+        self._keys: dict[str, list[tuple[int, str]]] = defaultdict(list)
+        # Prompt chunks, and the chunk blocks of llm_call entries for
+        # materializing delta-encoded prompts
+        self._resolvers: dict[str, PromptResolver] = {}
+        self._blocks: dict[str, dict[str, dict]] = defaultdict(dict)
+        self._summaries: dict[str, dict] = {}
+        self._file = open(path, "a", encoding="utf-8") if path else None
+        self.bytes_received = 0
+
+    def add(self, entries: list[dict]) -> None:
+        with self._lock:
+            for entry in entries:
+                session_id = entry["session_id"]
+                keys = self._keys[session_id]
+                key = (entry["timestamp"], entry["event_id"])
+                # Entries mostly arrive in order
+                position = len(keys) if not keys or key >= keys[-1] else bisect.bisect_right(keys, key)
+                keys.insert(position, key)
+                self._sessions[session_id].insert(position, self._store_chunks(entry))
+                if session_id not in self._summaries:
+                    self._summaries[session_id] = new_summary(session_id)
+                add_to_summary(self._summaries[session_id], entry)
+            if self._file is not None:
+                self._file.writelines(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries)
+                self._file.flush()
+
+    def _store_chunks(self, entry: dict) -> dict:
+        """Move the prompt chunks of an entry to the session's resolver."""
+        block = entry.get(PROMPT_CHUNKS_FIELD)
+        if not isinstance(block, dict):
+            return entry
+        session_id = entry["session_id"]
+        resolver = self._resolvers.get(session_id)
+        if resolver is None:
+            resolver = self._resolvers[session_id] = PromptResolver(self._blocks[session_id].get)
+        resolver.add_chunks(block)
+        block = {**block, "chunks": []}
+        self._blocks[session_id][entry["event_id"]] = block
+        return {**entry, PROMPT_CHUNKS_FIELD: block}
+
+    def session(self, session_id: str, after: tuple[int, str] | None = None,
+                limit: int | None = None) -> tuple[list[dict], tuple[int, str] | None]:
+        """
+        Entries of a session after the sort key `after`, at most `limit`.
+
+        Returns the entries and the key to continue after, or None when
+        there are no more entries.
+        """
+        with self._lock:
+            keys = self._keys.get(session_id, [])
+            start = bisect.bisect_right(keys, after) if after is not None else 0
+            stop = len(keys) if limit is None else min(start + limit, len(keys))
+            entries = self._sessions.get(session_id, [])[start:stop]
+            resolver = self._resolvers.get(session_id)
+            if resolver is not None:
+                entries = [resolver.resolve(entry) for entry in entries]
+            next_key = keys[stop - 1] if stop < len(keys) else None
+            return entries, next_key
+
+    def runs(self, summarize: bool) -> list:
+        with self._lock:
+            if not summarize:
+                return list(self._sessions)
+            return [
+                {**summary, "event_counts": dict(summary["event_counts"])}
+                for summary in self._summaries.values()
+            ]
+
+
+class IngestHandler(BaseHTTPRequestHandler):
+    server_version = "CoAgentStandIn/1.0"
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, Nagle's
+    # algorithm holds the body back until the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    @property
+    def store(self) -> LogStore:
+        return self.server.store
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != f"{API_PREFIX}/logs":
+            return self._reply(404, {"success": False, "message": "not found"})
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.store.bytes_received += len(body)
+        try:
+            if self.headers.get("Content-Encoding", "").lower() == "gzip":
+                body = gzip.decompress(body)
+        except OSError as e:
+            return self._reply(400, {"success": False, "message": f"invalid gzip body: {e}"})
+
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip()
+        if content_type == NDJSON_CONTENT_TYPE:
+            return self._ingest_ndjson(body)
+
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            return self._reply(400, {"success": False, "message": f"invalid JSON: {e}"})
+
+        entries = payload if isinstance(payload, list) else [payload]
+        errors = [error for error in map(validate_entry, entries) if error]
+        if errors:
+            # Like the CoAgent server, a JSON request is stored all or nothing
+            return self._reply(400, {"success": False, "message": errors[0]})
+
+        self.store.add(entries)
+        message = "All log entries stored successfully" if isinstance(payload, list) else "Log entry stored successfully"
+        self._reply(200, {"success": True, "message": message})
+
+    def _ingest_ndjson(self, body: bytes) -> None:
+        accepted = []
+        results = []
+        for index, line in enumerate(body.splitlines()):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                error = validate_entry(entry)
+            except ValueError as e:
+                entry, error = None, f"invalid JSON: {e}"
+
+            event_id = entry.get("event_id") if isinstance(entry, dict) else None
+            if error is None:
+                accepted.append(entry)
+                results.append({"index": index, "event_id": event_id, "status": "ok"})
+            else:
+                results.append({"index": index, "event_id": event_id, "status": "error", "error": error})
+
+        self.store.add(accepted)
+        rejected = len(results) - len(accepted)
+        self._reply(200, {
+            "success": rejected == 0,
+            "message": f"{rejected} of {len(results)} log entries rejected" if rejected
+            else "All log entries stored successfully",
+            "accepted": len(accepted),
+            "rejected": rejected,
+            "results": results,
+        })
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path.rstrip("/")
+        if path == f"{API_PREFIX}/runs":
+            summarize = parse_qs(url.query).get("summarize", ["0"])[0] not in ("0", "false", "")
+            return self._reply(200, self.store.runs(summarize))
+        if path.startswith(f"{API_PREFIX}/logs/"):
+            return self._session_logs(unquote(path[len(f"{API_PREFIX}/logs/"):]), parse_qs(url.query))
+        self._reply(404, {"success": False, "message": "not found"})
+
+    def _session_logs(self, session_id: str, query: dict[str, list[str]]) -> None:
+        try:
+            after = decode_cursor(query["cursor"][0]) if "cursor" in query else None
+            limit = int(query["limit"][0]) if "limit" in query else None
+        except (ValueError, TypeError) as e:
+            return self._reply(400, {"success": False, "message": f"invalid cursor or limit: {e}"})
+        if limit is not None and not 0 < limit <= MAX_PAGE_SIZE:
+            return self._reply(400, {"success": False, "message": f"limit must be 1 to {MAX_PAGE_SIZE}"})
+
+        streaming = (query.get("format") == ["ndjson"]
+                     or NDJSON_CONTENT_TYPE in self.headers.get("Accept", ""))
+        if streaming:
+            return self._stream(session_id, after, limit)
+
+        entries, next_key = self.store.session(session_id, after, limit)
+        if after is None and limit is None:
+            return self._reply(200, entries)
+        self._reply(200, {"logs": entries, "next_cursor": encode_cursor(next_key) if next_key else None})
+
+    def _stream(self, session_id: str, after: tuple[int, str] | None, limit: int | None) -> None:
+        """Write entries as NDJSON, a chunk at a time, reading the store page by page."""
+        self.send_response(200)
+        self.send_header("Content-Type", NDJSON_CONTENT_TYPE)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = STREAM_CHUNK_SIZE if remaining is None else min(STREAM_CHUNK_SIZE, remaining)
+            entries, after = self.store.session(session_id, after, size)
+            if entries:
+                chunk = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries).encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            if remaining is not None:
+                remaining -= len(entries)
+            if after is None:
+                break
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _reply(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def create_server(host: str = "127.0.0.1", port: int = 3000, store_path: str | None = None,
+                  quiet: bool = False) -> ThreadingHTTPServer:
+    """Create the stand-in server; call `serve_forever()` on it to run it."""
+    server = ThreadingHTTPServer((host, port), IngestHandler)
+    server.daemon_threads = True
+    server.store = LogStore(store_path)
+    server.quiet = quiet
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in CoAgent log ingestion server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3000)
+    parser.add_argument("--store", help="append accepted entries to this NDJSON file")
+    parser.add_argument("--quiet", action="store_true", help="don't log requests")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.store, args.quiet)
+    print(f"CoAgent stand-in listening on http://{args.host}:{args.port}{API_PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
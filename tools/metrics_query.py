@@ -0,0 +1,222 @@
+"""
+Query token and latency time series from the ClickHouse usage rollups.
+
+Reads `usage_rollups_1m` / `usage_rollups_1h`
+(`config/clickhouse/initdb.d/05-usage-rollups.sql`) instead of raw log
+entries, so a 30-day dashboard reads at most 720 hourly buckets per series.
+`stream_timeseries` reads time to first token and inter-token latency of
+streamed responses from `stream_rollups_1m` / `stream_rollups_1h`
+(`07-stream-rollups.sql`) the same way.
+
+    from clickhouse_http import ClickHouse
+    from metrics_query import usage_timeseries
+
+    rows = usage_timeseries(ClickHouse(), since=timedelta(days=30), group_by=("model",))
+
+Usage:
+    python tools/metrics_query.py --since 30d --group-by model,agent
+    python tools/metrics_query.py --since 2h --granularity minute --event-type tool_response --group-by tool
+    python tools/metrics_query.py --since 7d --stream --group-by model
+"""
+
+import argparse
+import json
+import re
+
+from datetime import datetime, timedelta, timezone
+
+from clickhouse_http import ClickHouse
+
+TABLES = {"minute": "usage_rollups_1m", "hour": "usage_rollups_1h"}
+DIMENSIONS = ("event_type", "model", "agent", "tool")
+STREAM_TABLES = {"minute": "stream_rollups_1m", "hour": "stream_rollups_1h"}
+STREAM_DIMENSIONS = ("model", "agent")
+
+# Ranges longer than this are read from the hourly rollups by default
+MINUTE_RANGE_LIMIT = timedelta(hours=6)
+
+
+def usage_timeseries(
+    ch: ClickHouse,
+    since: timedelta | datetime,
+    until: datetime | None = None,
+    granularity: str | None = None,
+    group_by: tuple[str, ...] = ("model",),
+    event_type: str | None = "llm_response",
+    filters: dict[str, str] | None = None,
+    bucketed: bool = True,
+    database: str = "coagent",
+) -> list[dict]:
+    """
+    Token sums, error counts and latency percentiles per time bucket.
+
+    Args:
+        ch: ClickHouse connection
+        since: Start of the range, or how far back from `until` it starts
+        until: End of the range (default: now, UTC)
+        granularity: "minute" or "hour"; by default minutes for ranges up to
+            six hours, hours beyond that
+        group_by: Dimensions to split the series by (see DIMENSIONS)
+        event_type: Only this event type ("llm_response", "tool_response" or
+            "error"); None for all
+        filters: Exact values for dimensions, e.g. {"model": "qwen3:4b"}
+        bucketed: False to aggregate the whole range into one row per group
+        database: Database holding the rollup tables
+
+    Returns:
+        One dict per bucket and group with events, errors, input_tokens,
+        output_tokens, total_tokens, avg_duration_ms and p50/p95/p99_ms
+    """
+    filters = dict(filters or {})
+    if event_type is not None:
+        filters["event_type"] = event_type
+    rows = _query_rollups(
+        ch, TABLES, DIMENSIONS, since, until, granularity, group_by, filters, bucketed, database, [
+            "sum(events) AS events",
+            "sum(errors) AS errors",
+            "sum(input_tokens) AS input_tokens",
+            "sum(output_tokens) AS output_tokens",
+            "sum(total_tokens) AS total_tokens",
+            "if(sum(duration_ms_count) > 0, sum(duration_ms_sum) / sum(duration_ms_count), NULL) AS avg_duration_ms",
+            "quantilesTDigestMerge(0.5, 0.95, 0.99)(duration_ms_quantiles) AS duration_quantiles",
+        ],
+    )
+    for row in rows:
+        _quantile_columns(row, "duration_quantiles", "")
+    return rows
+
+
+def stream_timeseries(
+    ch: ClickHouse,
+    since: timedelta | datetime,
+    until: datetime | None = None,
+    granularity: str | None = None,
+    group_by: tuple[str, ...] = ("model",),
+    filters: dict[str, str] | None = None,
+    bucketed: bool = True,
+    database: str = "coagent",
+) -> list[dict]:
+    """
+    Time to first token and inter-token latency of streamed LLM responses per
+    time bucket. Arguments are those of `usage_timeseries`; the dimensions are
+    model and agent.
+
+    Returns:
+        One dict per bucket and group with calls, avg_ttft_ms,
+        ttft_p50/p95/p99_ms, the p50/p95/p99 across calls of each call's median
+        gap (inter_token_p50_p50_ms, ...) and 99th percentile gap
+        (inter_token_p99_p50_ms, ...), and avg_tokens_per_second
+    """
+    rows = _query_rollups(
+        ch, STREAM_TABLES, STREAM_DIMENSIONS, since, until, granularity, group_by, dict(filters or {}),
+        bucketed, database, [
+            "sum(streamed_calls) AS calls",
+            "if(sum(streamed_calls) > 0, sum(ttft_ms_sum) / sum(streamed_calls), NULL) AS avg_ttft_ms",
+            "quantilesTDigestMerge(0.5, 0.95, 0.99)(ttft_ms_quantiles) AS ttft_quantiles",
+            "quantilesTDigestMerge(0.5, 0.95, 0.99)(inter_token_p50_ms_quantiles) AS inter_token_p50_quantiles",
+            "quantilesTDigestMerge(0.5, 0.95, 0.99)(inter_token_p99_ms_quantiles) AS inter_token_p99_quantiles",
+            "if(sum(tokens_per_second_count) > 0, sum(tokens_per_second_sum) / sum(tokens_per_second_count), NULL)"
+            " AS avg_tokens_per_second",
+        ],
+    )
+    for row in rows:
+        _quantile_columns(row, "ttft_quantiles", "ttft_")
+        _quantile_columns(row, "inter_token_p50_quantiles", "inter_token_p50_")
+        _quantile_columns(row, "inter_token_p99_quantiles", "inter_token_p99_")
+    return rows
+
+
+def _query_rollups(
+    ch: ClickHouse,
+    tables: dict[str, str],
+    dimensions: tuple[str, ...],
+    since: timedelta | datetime,
+    until: datetime | None,
+    granularity: str | None,
+    group_by: tuple[str, ...],
+    filters: dict[str, str],
+    bucketed: bool,
+    database: str,
+    aggregates: list[str],
+) -> list[dict]:
+    until = until or datetime.now(timezone.utc)
+    start = until - since if isinstance(since, timedelta) else since
+    if granularity is None:
+        granularity = "minute" if until - start <= MINUTE_RANGE_LIMIT else "hour"
+    if granularity not in tables:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    for dimension in (*group_by, *filters):
+        if dimension not in dimensions:
+            raise ValueError(f"Unknown dimension: {dimension}")
+
+    keys = (["bucket"] if bucketed else []) + list(group_by)
+    conditions = ["bucket >= {start:DateTime}", "bucket < {until:DateTime}"]
+    params = {
+        "param_start": start.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        "param_until": until.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    for i, (dimension, value) in enumerate(sorted(filters.items())):
+        conditions.append(f"{dimension} = {{f{i}:String}}")
+        params[f"param_f{i}"] = value
+
+    select = ", ".join(keys + aggregates)
+    sql = f"SELECT {select} FROM {database}.{tables[granularity]} WHERE {' AND '.join(conditions)}"
+    if keys:
+        sql += f" GROUP BY {', '.join(keys)} ORDER BY {', '.join(keys)}"
+    return ch.rows(sql, output_format_json_quote_64bit_integers=0, **params)["data"]
+
+
+def _quantile_columns(row: dict, column: str, prefix: str) -> None:
+    """Replace a quantiles array in `row` with p50/p95/p99 columns."""
+    quantiles = row.pop(column)
+    for name, value in zip(("p50_ms", "p95_ms", "p99_ms"), quantiles):
+        # No values in the group: t-digest yields NaN, JSON null
+        row[prefix + name] = value if isinstance(value, (int, float)) and value == value else None
+
+
+def parse_duration(text: str) -> timedelta:
+    """Parse durations such as 90m, 12h or 30d."""
+    match = re.fullmatch(r"(\d+)([mhd])", text)
+    if not match:
+        raise argparse.ArgumentTypeError(f"Invalid duration: {text} (use e.g. 90m, 12h, 30d)")
+    unit = {"m": "minutes", "h": "hours", "d": "days"}[match.group(2)]
+    return timedelta(**{unit: int(match.group(1))})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query CoAgent token and latency rollups")
+    parser.add_argument("--since", type=parse_duration, default=timedelta(days=1))
+    parser.add_argument("--granularity", choices=sorted(TABLES))
+    parser.add_argument("--group-by", default="model", help="comma-separated: " + ", ".join(DIMENSIONS))
+    parser.add_argument("--event-type", default="llm_response", help="'all' for every event type")
+    parser.add_argument("--filter", action="append", default=[], metavar="DIMENSION=VALUE")
+    parser.add_argument("--totals", action="store_true", help="one row per group instead of per bucket")
+    parser.add_argument("--stream", action="store_true",
+                        help="time to first token and inter-token latency of streamed responses")
+    args = parser.parse_args()
+
+    if args.stream:
+        rows = stream_timeseries(
+            ClickHouse(),
+            since=args.since,
+            granularity=args.granularity,
+            group_by=tuple(filter(None, args.group_by.split(","))),
+            filters=dict(item.split("=", 1) for item in args.filter),
+            bucketed=not args.totals,
+        )
+    else:
+        rows = usage_timeseries(
+            ClickHouse(),
+            since=args.since,
+            granularity=args.granularity,
+            group_by=tuple(filter(None, args.group_by.split(","))),
+            event_type=None if args.event_type == "all" else args.event_type,
+            filters=dict(item.split("=", 1) for item in args.filter),
+            bucketed=not args.totals,
+        )
+    for row in rows:
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,641 @@
+"""
+Convert between CoAgent log entries and OpenTelemetry traces (OTLP/JSON).
+
+The entries of a session already describe a trace. `session_to_otlp` turns
+them into the spans of one trace:
+
+    session <session_id>                  session_start .. last entry
+      prompt <n>                          entries with prompt_number n
+        <component>                       component_enter .. component_exit
+          invoke_agent <agent>            agent spans referenced by `meta`
+            chat <model>                  llm_call .. llm_response
+            execute_tool <tool>           tool_call .. tool_response
+
+Calls are paired with their responses by the `span_id` in their `meta` when
+present (the ADK example logs one, see `spans.py`), otherwise in order of
+arrival, by tool name for tools. Durations come from `execution_time_ms`
+where logged. Errors and the other events become span events of the
+innermost open span; errors also set its status. Span ids logged in `meta`
+are kept, and the trace id is `meta.trace_id` when logged, so the trace
+lines up with spans of downstream services that share the trace context.
+
+`otlp_to_entries` goes the other way and turns spans into CoAgent entries:
+`gen_ai.operation.name` "chat" spans into `llm_call`/`llm_response`,
+"execute_tool" spans into `tool_call`/`tool_response`, and all other spans
+into `component_enter`/`component_exit`. Failed spans and `exception`
+events add `error` entries. The session is the span's `session.id` or
+`coagent.session_id` attribute, that of another span of its trace, or else
+the trace id. Every entry keeps the trace and span ids in `meta`, so a
+session can be joined with the traces of the services it called. Event ids
+are derived from the span ids, so spans received twice yield entries with
+the same event ids.
+
+Only the OTLP/HTTP JSON encoding is supported; it needs no dependencies.
+
+Usage:
+    python tools/otlp.py export <session_id> --output trace.json
+    python tools/otlp.py export <session_id> --endpoint http://localhost:4318/v1/traces
+    python tools/otlp.py receive --port 4318 --base-url http://localhost:3000/api/v1
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import sys
+import urllib.request
+import uuid
+
+from collections.abc import Iterable
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from clickhouse_http import ClickHouse
+from session_logs import (
+    DEFAULT_BASE_URL,
+    iter_session_logs,
+    iter_session_logs_from_clickhouse,
+)
+
+SCOPE_NAME = "coagent"
+TRACES_PATH = "/v1/traces"
+DEFAULT_ENDPOINT = f"http://localhost:4318{TRACES_PATH}"
+
+# Span kinds and status codes of the OTLP protocol
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# Namespace of the event ids derived from span ids
+EVENT_ID_NAMESPACE = uuid.UUID("6f1c2a4e-1d0b-4a52-9a3e-3c1f0d7b2e61")
+
+
+def _hex_id(*parts: str, size: int) -> str:
+    """Deterministic id of `size` bytes, hex, for spans without a logged id."""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:size * 2]
+
+
+def trace_id_for(session_id: str) -> str:
+    """Trace id of a session that doesn't log one; the same for every export."""
+    return _hex_id("session", session_id, size=16)
+
+
+def _timestamp_ms(entry: dict) -> int:
+    value = entry.get("timestamp")
+    if isinstance(value, (int, float)):
+        return int(value)
+    # DateTime64(3) of ClickHouse rows, in UTC
+    parsed = datetime.fromisoformat(str(value))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def _section(entry: dict, name: str) -> dict:
+    """Event payload of an entry, as sent by clients or stored in event_data."""
+    value = entry.get(name)
+    if isinstance(value, dict):
+        return value
+    data = entry.get("event_data")
+    if isinstance(data, dict):
+        return data.get(name) if isinstance(data.get(name), dict) else data
+    return {}
+
+
+def _meta(entry: dict) -> dict:
+    return entry.get("meta") if isinstance(entry.get("meta"), dict) else {}
+
+
+def _any_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # int64 is a string in OTLP/JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, str):
+        return {"stringValue": value}
+    return {"stringValue": json.dumps(value, default=str)}
+
+
+def _attributes(values: dict) -> list[dict]:
+    return [{"key": key, "value": _any_value(value)} for key, value in values.items() if value is not None]
+
+
+def _from_any_value(value: dict):
+    if "intValue" in value:
+        return int(value["intValue"])
+    if "arrayValue" in value:
+        return [_from_any_value(item) for item in value["arrayValue"].get("values", [])]
+    if "kvlistValue" in value:
+        return _from_attributes(value["kvlistValue"].get("values", []))
+    for kind in ("stringValue", "boolValue", "doubleValue", "bytesValue"):
+        if kind in value:
+            return value[kind]
+    return None
+
+
+def _from_attributes(attributes: list[dict]) -> dict:
+    return {item["key"]: _from_any_value(item.get("value", {})) for item in attributes or ()}
+
+
+class _Span:
+    def __init__(self, span_id: str, parent: "_Span | None", name: str, start_ms: int,
+                 kind: int = SPAN_KIND_INTERNAL, attributes: dict | None = None) -> None:
+        self.span_id = span_id
+        self.parent = parent
+        self.name = name
+        self.start_ms = start_ms
+        self.end_ms: int | None = None
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.events: list[dict] = []
+        self.error: str | None = None
+        # Spans created for ids only referenced by parent_span_id
+        self.synthetic = False
+
+    def cover(self, start_ms: int, end_ms: int) -> None:
+        """Widen the span, and its ancestors, to include a child."""
+        span = self
+        while span is not None:
+            span.start_ms = min(span.start_ms, start_ms)
+            span.end_ms = max(span.end_ms if span.end_ms is not None else end_ms, end_ms)
+            span = span.parent
+
+    def to_otlp(self, trace_id: str, session_id: str, last_ms: int) -> dict:
+        end_ms = self.end_ms if self.end_ms is not None else last_ms
+        span = {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ms * 1_000_000),
+            "endTimeUnixNano": str(max(end_ms, self.start_ms) * 1_000_000),
+            "attributes": _attributes({"session.id": session_id, **self.attributes}),
+            "events": self.events,
+            "status": {"code": STATUS_ERROR, "message": self.error} if self.error is not None
+            else {"code": STATUS_OK},
+        }
+        if self.parent is not None:
+            span["parentSpanId"] = self.parent.span_id
+        return span
+
+
+class _TraceBuilder:
+    """Builds the spans of one session from its entries, oldest first."""
+
+    def __init__(self, session_id: str) -> None:
+        self.session_id = session_id
+        self.trace_id: str | None = None
+        self.spans: dict[str, _Span] = {}
+        self.root: _Span | None = None
+        self.prompts: dict[int, _Span] = {}
+        # Span ids of session_end entries, the ids of their prompt spans
+        self.run_span_ids: dict[int, str] = {}
+        self.components: list[_Span] = []
+        # Open calls by logged span id, and unpaired ones in order of arrival
+        self.open_calls: dict[str, _Span] = {}
+        self.pending: dict[tuple[str, str], list[_Span]] = {}
+        self.last_ms = 0
+
+    def add_all(self, entries: list[dict]) -> None:
+        for entry in entries:
+            meta = _meta(entry)
+            if entry.get("event_type") == "session_end" and meta.get("span_kind") == "run" and meta.get("span_id"):
+                self.run_span_ids[entry.get("prompt_number") or 0] = meta["span_id"]
+            if self.trace_id is None and meta.get("trace_id"):
+                self.trace_id = meta["trace_id"]
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry: dict) -> None:
+        timestamp = _timestamp_ms(entry)
+        self.last_ms = max(self.last_ms, timestamp)
+        event_type = entry.get("event_type")
+        meta = _meta(entry)
+        parent = self._parent(entry, timestamp)
+
+        if event_type == "component_enter":
+            target = entry.get("target_component") or {}
+            name = target.get("name") or target.get("id") or "component"
+            span = self._new_span(self._span_id(entry), parent, name, timestamp, attributes={
+                "coagent.component.id": target.get("id"),
+                "coagent.component.type": target.get("component_type"),
+            })
+            self.components.append(span)
+        elif event_type == "component_exit":
+            target = entry.get("target_component") or {}
+            name = target.get("name") or target.get("id") or "component"
+            for index in range(len(self.components) - 1, -1, -1):
+                if self.components[index].name == name:
+                    self.components.pop(index).end_ms = timestamp
+                    break
+        elif event_type in ("llm_call", "tool_call"):
+            self._open_call(entry, event_type, parent, timestamp)
+        elif event_type in ("llm_response", "tool_response"):
+            self._close_call(entry, event_type, parent, timestamp)
+        elif event_type == "session_end":
+            prompt = self._prompt(entry, timestamp)
+            prompt.end_ms = timestamp
+            prompt.events.append(self._event(entry, timestamp))
+            elapsed_ms = meta.get("elapsed_time_ms")
+            if isinstance(elapsed_ms, int):
+                prompt.cover(timestamp - elapsed_ms, timestamp)
+        else:
+            parent.events.append(self._event(entry, timestamp))
+            if event_type == "error":
+                error = _section(entry, "error_info")
+                message = error.get("error_message") or "error"
+                span = parent
+                # Failures propagate to the prompt, like exceptions
+                while span is not None and span is not self.root:
+                    span.error = span.error or message
+                    span = span.parent
+
+    def to_otlp(self, service_name: str) -> dict:
+        trace_id = self.trace_id or trace_id_for(self.session_id)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _attributes({"service.name": service_name})},
+                "scopeSpans": [{
+                    "scope": {"name": SCOPE_NAME},
+                    "spans": [span.to_otlp(trace_id, self.session_id, self.last_ms) for span in self.spans.values()],
+                }],
+            }],
+        }
+
+    def _span_id(self, entry: dict, kind: str = "") -> str:
+        return _hex_id(self.session_id, str(entry.get("event_id")), kind, size=8)
+
+    def _new_span(self, span_id: str, parent: _Span | None, name: str, start_ms: int, **kwargs) -> _Span:
+        span = _Span(span_id, parent, name, start_ms, **kwargs)
+        self.spans[span_id] = span
+        return span
+
+    def _prompt(self, entry: dict, timestamp: int) -> _Span:
+        if self.root is None:
+            self.root = self._new_span(
+                _hex_id("session", self.session_id, size=8), None, f"session {self.session_id}", timestamp,
+                attributes={"coagent.session_id": self.session_id},
+            )
+        number = entry.get("prompt_number") or 0
+        if number not in self.prompts:
+            span_id = self.run_span_ids.get(number) or _hex_id("prompt", self.session_id, str(number), size=8)
+            self.prompts[number] = self._new_span(span_id, self.root, f"prompt {number}", timestamp,
+                                                  attributes={"coagent.prompt_number": number})
+        self.root.cover(timestamp, timestamp)
+        return self.prompts[number]
+
+    def _parent(self, entry: dict, timestamp: int) -> _Span:
+        """Innermost open span an entry belongs to."""
+        prompt = self._prompt(entry, timestamp)
+        parent_id = _meta(entry).get("parent_span_id")
+        if parent_id:
+            parent = self.spans.get(parent_id)
+            if parent is None:
+                # Agent spans aren't logged themselves, only referenced
+                agent = _meta(entry).get("issuer") or _section(entry, "llm_call").get("issuer")
+                parent = self._new_span(parent_id, prompt, f"invoke_agent {agent or 'agent'}", timestamp,
+                                        attributes={"gen_ai.operation.name": "invoke_agent",
+                                                    "gen_ai.agent.name": agent})
+                parent.synthetic = True
+            elif parent.synthetic and parent.attributes.get("gen_ai.agent.name") is None:
+                agent = _meta(entry).get("issuer") or _section(entry, "llm_call").get("issuer")
+                if agent:
+                    parent.name = f"invoke_agent {agent}"
+                    parent.attributes["gen_ai.agent.name"] = agent
+            if parent.synthetic:
+                parent.cover(timestamp, timestamp)
+            return parent
+        return self.components[-1] if self.components else prompt
+
+    def _open_call(self, entry: dict, event_type: str, parent: _Span, timestamp: int) -> None:
+        meta = _meta(entry)
+        if event_type == "llm_call":
+            model = meta.get("model") or ""
+            agent = _section(entry, "llm_call").get("issuer")
+            name, key = f"chat {model}".strip(), ""
+            attributes = {"gen_ai.operation.name": "chat", "gen_ai.request.model": model or None,
+                          "gen_ai.agent.name": agent}
+        else:
+            tool = _section(entry, "tool_call").get("tool_name") or ""
+            name, key = f"execute_tool {tool}".strip(), tool
+            attributes = {"gen_ai.operation.name": "execute_tool", "gen_ai.tool.name": tool or None}
+        attributes.update(self._entry_attributes(entry))
+        span = self._new_span(meta.get("span_id") or self._span_id(entry), parent, name, timestamp,
+                              kind=SPAN_KIND_CLIENT, attributes=attributes)
+        if meta.get("span_id"):
+            self.open_calls[meta["span_id"]] = span
+        else:
+            self.pending.setdefault((event_type, key), []).append(span)
+
+    def _close_call(self, entry: dict, event_type: str, parent: _Span, timestamp: int) -> None:
+        meta = _meta(entry)
+        section = _section(entry, event_type)
+        call_type = "llm_call" if event_type == "llm_response" else "tool_call"
+        key = "" if event_type == "llm_response" else section.get("tool_name") or ""
+
+        span = self.open_calls.pop(meta.get("span_id"), None)
+        if span is None and not meta.get("span_id"):
+            pending = self.pending.get((call_type, key))
+            span = pending.pop(0) if pending else None
+        duration_ms = section.get("execution_time_ms")
+        if span is None:
+            # Responses logged without their call
+            name = (f"chat {meta.get('model') or ''}" if event_type == "llm_response"
+                    else f"execute_tool {key}").strip()
+            span = self._new_span(meta.get("span_id") or self._span_id(entry, event_type), parent, name,
+                                  timestamp - (duration_ms or 0), kind=SPAN_KIND_CLIENT)
+        span.end_ms = timestamp
+        if isinstance(duration_ms, int):
+            # The measured duration is more precise than the gap between entries
+            span.start_ms = timestamp - duration_ms
+        if span.parent is not None:
+            span.parent.cover(span.start_ms, timestamp)
+
+        if event_type == "llm_response":
+            span.attributes.update({
+                "gen_ai.response.model": meta.get("model") or None,
+                "gen_ai.usage.input_tokens": section.get("input_tokens"),
+                "gen_ai.usage.output_tokens": section.get("output_tokens"),
+                "coagent.usage.total_tokens": section.get("total_tokens"),
+            })
+        elif section.get("success") is False:
+            span.error = section.get("error_message") or "tool call failed"
+        span.attributes["coagent.response_event_id"] = entry.get("event_id")
+
+    def _entry_attributes(self, entry: dict) -> dict:
+        return {
+            "coagent.event_id": entry.get("event_id"),
+            "coagent.prompt_number": entry.get("prompt_number"),
+            "coagent.turn_number": entry.get("turn_number"),
+        }
+
+    def _event(self, entry: dict, timestamp: int) -> dict:
+        attributes = self._entry_attributes(entry)
+        if entry.get("event_type") == "error":
+            error = _section(entry, "error_info")
+            attributes.update({"exception.type": error.get("error_type"),
+                               "exception.message": error.get("error_message")})
+        return {
+            "timeUnixNano": str(timestamp * 1_000_000),
+            "name": "exception" if entry.get("event_type") == "error" else str(entry.get("event_type")),
+            "attributes": _attributes(attributes),
+        }
+
+
+def session_to_otlp(session_id: str, entries: Iterable[dict], service_name: str = "coagent-agent") -> dict:
+    """OTLP/JSON `ExportTraceServiceRequest` with the spans of a session."""
+    builder = _TraceBuilder(session_id)
+    builder.add_all(sorted(entries, key=lambda entry: (_timestamp_ms(entry), str(entry.get("event_id")))))
+    return builder.to_otlp(service_name)
+
+
+def _entry(session_id: str, event_type: str, timestamp_ms: int, event_id: str, attributes: dict,
+           meta: dict, **fields) -> dict:
+    entry = {
+        "version": "2.0.0",
+        "session_id": session_id,
+        "prompt_number": max(int(attributes.get("coagent.prompt_number") or 0), 0),
+        "turn_number": max(int(attributes.get("coagent.turn_number") or 0), 0),
+        "event_id": event_id,
+        "event_type": event_type,
+        "timestamp": timestamp_ms,
+        "meta": meta,
+    }
+    entry.update(fields)
+    return entry
+
+
+def _session_id(attributes: dict) -> str | None:
+    session_id = attributes.get("session.id") or attributes.get("coagent.session_id")
+    return str(session_id) if session_id else None
+
+
+def span_to_entries(span: dict, resource: dict | None = None, session_id: str | None = None) -> list[dict]:
+    """
+    CoAgent entries for one OTLP/JSON span.
+
+    `session_id` is used when the span has no session attribute, falling
+    back to the trace id.
+    """
+    attributes = _from_attributes(span.get("attributes", []))
+    resource = resource or {}
+    trace_id, span_id = span.get("traceId", ""), span.get("spanId", "")
+    session_id = _session_id(attributes) or session_id or trace_id
+    start_ms = int(span.get("startTimeUnixNano", 0)) // 1_000_000
+    end_ms = int(span.get("endTimeUnixNano", 0)) // 1_000_000
+    duration_ms = max(end_ms - start_ms, 0)
+    status = span.get("status") or {}
+    failed = status.get("code") in (STATUS_ERROR, "STATUS_CODE_ERROR")
+    meta = {
+        "trace_id": trace_id,
+        "span_id": span_id,
+        "parent_span_id": span.get("parentSpanId") or None,
+        "span_name": span.get("name"),
+        "service_name": resource.get("service.name"),
+        "attributes": attributes,
+    }
+
+    def event_id(kind: str) -> str:
+        return str(uuid.uuid5(EVENT_ID_NAMESPACE, f"{trace_id}/{span_id}/{kind}"))
+
+    def entry(event_type: str, timestamp_ms: int, **fields) -> dict:
+        return _entry(session_id, event_type, timestamp_ms, event_id(event_type), attributes, meta, **fields)
+
+    operation = attributes.get("gen_ai.operation.name")
+    if operation == "chat":
+        model = attributes.get("gen_ai.response.model") or attributes.get("gen_ai.request.model")
+        meta.update(model=model or "", issuer=attributes.get("gen_ai.agent.name"))
+        input_tokens = attributes.get("gen_ai.usage.input_tokens")
+        output_tokens = attributes.get("gen_ai.usage.output_tokens")
+        entries = [
+            entry("llm_call", start_ms, llm_call={"issuer": attributes.get("gen_ai.agent.name")}),
+            entry("llm_response", end_ms, llm_response={
+                "response": "",
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": attributes.get("coagent.usage.total_tokens")
+                or (input_tokens or 0) + (output_tokens or 0),
+                "execution_time_ms": duration_ms,
+            }),
+        ]
+    elif operation == "execute_tool":
+        tool = attributes.get("gen_ai.tool.name") or span.get("name")
+        entries = [
+            entry("tool_call", start_ms, tool_call={"tool_name": tool}),
+            entry("tool_response", end_ms, tool_response={
+                "tool_name": tool,
+                "success": not failed,
+                "error_message": status.get("message") if failed else None,
+                "execution_time_ms": duration_ms,
+            }),
+        ]
+    else:
+        target = {"id": span_id, "name": span.get("name")}
+        entries = [
+            entry("component_enter", start_ms, target_component=target),
+            entry("component_exit", end_ms, target_component=target),
+        ]
+
+    errors = [event for event in span.get("events", []) if event.get("name") == "exception"]
+    for index, event in enumerate(errors):
+        event_attributes = _from_attributes(event.get("attributes", []))
+        entries.append(_entry(
+            session_id, "error", int(event.get("timeUnixNano", 0)) // 1_000_000 or end_ms,
+            event_id(f"exception-{index}"), attributes, meta,
+            error_info={"error_type": event_attributes.get("exception.type"),
+                        "error_message": event_attributes.get("exception.message") or "exception"},
+        ))
+    if failed and not errors and operation != "execute_tool":
+        entries.append(entry("error", end_ms, error_info={"error_message": status.get("message") or "span failed"}))
+    return entries
+
+
+def otlp_to_entries(payload: dict) -> list[dict]:
+    """
+    CoAgent entries for the spans of an OTLP/JSON `ExportTraceServiceRequest`.
+
+    Spans without a session attribute join the session of another span of
+    their trace in the same request, if there is one.
+    """
+    spans = []
+    for resource_spans in payload.get("resourceSpans", []):
+        resource = _from_attributes((resource_spans.get("resource") or {}).get("attributes", []))
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            spans.extend((span, resource) for span in scope_spans.get("spans", []))
+
+    sessions: dict[str, str] = {}
+    for span, _ in spans:
+        session_id = _session_id(_from_attributes(span.get("attributes", [])))
+        if session_id:
+            sessions.setdefault(span.get("traceId", ""), session_id)
+    entries = []
+    for span, resource in spans:
+        entries.extend(span_to_entries(span, resource, sessions.get(span.get("traceId", ""))))
+    return entries
+
+
+def export(payload: dict, endpoint: str, timeout: float = 30.0) -> None:
+    """Send an OTLP/JSON request to a collector, gzip-compressed."""
+    request = urllib.request.Request(
+        endpoint,
+        data=gzip.compress(json.dumps(payload).encode("utf-8")),
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+
+
+class OtlpReceiver(BaseHTTPRequestHandler):
+    """Accepts OTLP/HTTP JSON traces and forwards them as CoAgent log entries."""
+
+    server_version = "CoAgentOtlp/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != TRACES_PATH:
+            return self._reply(404, {"code": 5, "message": "not found"})
+        if self.headers.get("Content-Type", "").split(";")[0].strip() != "application/json":
+            # Protobuf would need the opentelemetry-proto package
+            return self._reply(415, {"code": 3, "message": "only application/json is supported"})
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            if self.headers.get("Content-Encoding", "").lower() == "gzip":
+                body = gzip.decompress(body)
+            entries = otlp_to_entries(json.loads(body))
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            return self._reply(400, {"code": 3, "message": f"invalid OTLP request: {e}"})
+
+        if entries:
+            request = urllib.request.Request(
+                f"{self.server.base_url.rstrip('/')}/logs",
+                data=json.dumps(entries).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    response.read()
+            except OSError as e:
+                # Retryable for OTLP exporters
+                return self._reply(503, {"code": 14, "message": f"CoAgent unavailable: {e}"})
+        self._reply(200, {"partialSuccess": {}})
+
+    def _reply(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def create_receiver(host: str = "127.0.0.1", port: int = 4318, base_url: str = DEFAULT_BASE_URL,
+                    quiet: bool = False) -> ThreadingHTTPServer:
+    """Create the OTLP receiver; call `serve_forever()` on it to run it."""
+    server = ThreadingHTTPServer((host, port), OtlpReceiver)
+    server.daemon_threads = True
+    server.base_url = base_url
+    server.quiet = quiet
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between CoAgent log entries and OTLP traces")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="export a session as an OTLP trace")
+    export_parser.add_argument("session_id")
+    export_parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    export_parser.add_argument("--clickhouse", action="store_true", help="read from ClickHouse directly")
+    export_parser.add_argument("--service-name", default="coagent-agent")
+    target = export_parser.add_mutually_exclusive_group()
+    target.add_argument("--output", help="write the OTLP/JSON request to this file ('-' for stdout)")
+    target.add_argument("--endpoint", help=f"POST it to an OTLP/HTTP collector, e.g. {DEFAULT_ENDPOINT}")
+
+    receive_parser = commands.add_parser("receive", help="ingest OTLP traces as CoAgent log entries")
+    receive_parser.add_argument("--host", default="127.0.0.1")
+    receive_parser.add_argument("--port", type=int, default=4318)
+    receive_parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="CoAgent log API to forward to")
+    receive_parser.add_argument("--quiet", action="store_true", help="don't log requests")
+    args = parser.parse_args()
+
+    if args.command == "receive":
+        server = create_receiver(args.host, args.port, args.base_url, args.quiet)
+        print(f"OTLP receiver listening on http://{args.host}:{args.port}{TRACES_PATH}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+
+    if args.clickhouse:
+        entries = iter_session_logs_from_clickhouse(ClickHouse(), args.session_id)
+    else:
+        entries = iter_session_logs(args.session_id, args.base_url)
+    payload = session_to_otlp(args.session_id, entries, args.service_name)
+    if args.endpoint:
+        export(payload, args.endpoint)
+        print(f"Exported {len(payload['resourceSpans'][0]['scopeSpans'][0]['spans'])} spans to {args.endpoint}")
+    elif args.output and args.output != "-":
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+    else:
+        json.dump(payload, sys.stdout)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Read the log entries of a session lazily, with bounded memory.
+
+Sessions of long-running agents can hold hundreds of thousands of entries;
+fetching them with one `GET /api/v1/logs/{session_id}` builds the whole
+array in memory on the server and the client. These generators read them a
+page at a time instead, following the keyset cursor over
+(timestamp, event_id), or from an NDJSON stream, or straight from
+ClickHouse:
+
+    from session_logs import iter_session_logs
+
+    for entry in iter_session_logs("session-123", page_size=500):
+        ...
+
+Prompts of `llm_call` entries logged as content-addressed chunks (see
+`prompt_dedup.py` in the examples) are reassembled into `prompt`.
+
+Usage:
+    python tools/session_logs.py session-123 > session-123.ndjson
+    python tools/session_logs.py session-123 --stream
+    python tools/session_logs.py session-123 --clickhouse
+"""
+
+import argparse
+import json
+import sys
+import urllib.parse
+import urllib.request
+
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+
+from clickhouse_http import ClickHouse
+
+DEFAULT_BASE_URL = "http://localhost:3000/api/v1"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+PROMPT_CHUNKS_FIELD = "prompt_chunks"
+MISSING_BASE = "missing-base:"
+
+
+class PromptResolver:
+    """
+    Rebuilds the prompts of entries logged with prompt chunks.
+
+    Chunks and the full refs of recent prompts are remembered across
+    entries of one session, so delta-encoded prompts (`base`) are
+    materialized from their base without reading it again. Bases that
+    are no longer cached are fetched with `lookup`, which maps an event id
+    to its `prompt_chunks` block.
+
+    Args:
+        lookup: Finds the block of an earlier entry; None when entries are
+            read in order and every base has been seen
+        max_cached: Materialized prompts kept, least recently used dropped
+    """
+
+    def __init__(self, lookup: Callable[[str], dict | None] | None = None,
+                 max_cached: int = 256) -> None:
+        self.chunks: dict[str, str] = {}
+        self.lookup = lookup
+        self.max_cached = max_cached
+        self._refs: OrderedDict[str, list[str]] = OrderedDict()
+
+    def add_chunks(self, block: dict) -> None:
+        for chunk in block.get("chunks") or ():
+            self.chunks[chunk["hash"]] = chunk["text"]
+
+    def refs(self, block: dict, event_id: str | None = None) -> list[str]:
+        """Full refs of a block, resolving its chain of bases."""
+        # Walk back to a block without base, or one already materialized
+        chain = [(event_id, block)]
+        while "base" in chain[-1][1] and chain[-1][1]["base"] not in self._refs:
+            base = chain[-1][1]["base"]
+            base_block = self.lookup(base) if self.lookup else None
+            if base_block is None:
+                break
+            chain.append((base, base_block))
+
+        refs: list[str] = []
+        for chain_event_id, chain_block in reversed(chain):
+            if "base" in chain_block:
+                base_refs = self._refs.get(chain_block["base"])
+                if base_refs is None:
+                    # Stands in for the whole prefix
+                    base_refs = [f"{MISSING_BASE}{chain_block['base']}"]
+                else:
+                    self._refs.move_to_end(chain_block["base"])
+                refs = base_refs[:chain_block["base_length"]] + list(chain_block.get("refs") or ())
+            else:
+                refs = list(chain_block.get("refs") or ())
+            if chain_event_id is not None:
+                self._refs[chain_event_id] = refs
+                while len(self._refs) > self.max_cached:
+                    self._refs.popitem(last=False)
+        return refs
+
+    def resolve(self, entry: dict) -> dict:
+        """
+        Entry with `prompt` rebuilt from its chunks; entries without chunks
+        are returned as they are.
+        """
+        resolved = dict(entry)
+        block = resolved.pop(PROMPT_CHUNKS_FIELD, None)
+        if block is None and isinstance(entry.get("additional_properties"), dict):
+            # As stored by the CoAgent server
+            resolved["additional_properties"] = dict(entry["additional_properties"])
+            block = resolved["additional_properties"].pop(PROMPT_CHUNKS_FIELD, None)
+        if not isinstance(block, dict):
+            return entry
+        self.add_chunks(block)
+        resolved["prompt"] = block.get("separator", "\n").join(
+            self._text(digest) for digest in self.refs(block, entry.get("event_id"))
+        )
+        return resolved
+
+    def _text(self, digest: str) -> str:
+        if digest in self.chunks:
+            return self.chunks[digest]
+        if digest.startswith(MISSING_BASE):
+            return f"[missing prompt of {digest[len(MISSING_BASE):]}]"
+        return f"[missing prompt chunk {digest}]"
+
+
+def _logs_url(base_url: str, session_id: str, **params) -> str:
+    url = f"{base_url.rstrip('/')}/logs/{urllib.parse.quote(session_id, safe='')}"
+    params = {name: value for name, value in params.items() if value is not None}
+    return f"{url}?{urllib.parse.urlencode(params)}" if params else url
+
+
+def _resolved(entries: Iterator[dict]) -> Iterator[dict]:
+    resolver = PromptResolver()
+    for entry in entries:
+        yield resolver.resolve(entry)
+
+
+def iter_session_logs(session_id: str, base_url: str = DEFAULT_BASE_URL,
+                      page_size: int = 500, timeout: float = 30.0) -> Iterator[dict]:
+    """
+    Yield the entries of a session, oldest first, one page at a time.
+
+    Servers without pagination answer with the whole session as a JSON
+    array, which is read at once.
+    """
+    return _resolved(_session_pages(session_id, base_url, page_size, timeout))
+
+
+def _session_pages(session_id: str, base_url: str, page_size: int, timeout: float) -> Iterator[dict]:
+    cursor = None
+    while True:
+        url = _logs_url(base_url, session_id, limit=page_size, cursor=cursor)
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            page = json.load(response)
+        if isinstance(page, list):
+            yield from page
+            return
+        yield from page["logs"]
+        cursor = page.get("next_cursor")
+        if not cursor:
+            return
+
+
+def stream_session_logs(session_id: str, base_url: str = DEFAULT_BASE_URL,
+                        timeout: float = 30.0) -> Iterator[dict]:
+    """
+    Yield the entries of a session as the server streams them as NDJSON.
+
+    Falls back to parsing a JSON array when the server ignores the Accept
+    header.
+    """
+    return _resolved(_session_stream(session_id, base_url, timeout))
+
+
+def _session_stream(session_id: str, base_url: str, timeout: float) -> Iterator[dict]:
+    request = urllib.request.Request(
+        _logs_url(base_url, session_id), headers={"Accept": NDJSON_CONTENT_TYPE}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        if NDJSON_CONTENT_TYPE not in response.headers.get("Content-Type", ""):
+            yield from json.load(response)
+            return
+        for line in response:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_session_logs_from_clickhouse(ch: ClickHouse, session_id: str, page_size: int = 1000,
+                                      database: str = "coagent") -> Iterator[dict]:
+    """
+    Yield the entries of a session from ClickHouse, one page at a time.
+
+    Each page continues after the (timestamp, event_id) of the previous one,
+    the sort key of `log_entries` within a session, so every page is a
+    range read instead of an OFFSET scan over the pages before it.
+    """
+    return _resolved(_clickhouse_pages(ch, session_id, page_size, database))
+
+
+def _clickhouse_pages(ch: ClickHouse, session_id: str, page_size: int, database: str) -> Iterator[dict]:
+    timestamp, event_id = None, ""
+    while True:
+        conditions = ["session_id = {session_id:String}"]
+        params = {"param_session_id": session_id}
+        if timestamp is not None:
+            conditions.append(
+                "timestamp >= fromUnixTimestamp64Milli({ts:Int64})"
+                " AND (timestamp > fromUnixTimestamp64Milli({ts:Int64}) OR event_id > {event_id:String})"
+            )
+            params.update(param_ts=timestamp, param_event_id=event_id)
+        sql = (
+            f"SELECT *, toUnixTimestamp64Milli(timestamp) AS cursor_timestamp"
+            f" FROM {database}.log_entries WHERE {' AND '.join(conditions)}"
+            f" ORDER BY timestamp, event_id LIMIT {int(page_size)} FORMAT JSONEachRow"
+        )
+        lines = ch.execute(sql, output_format_json_quote_64bit_integers=0, **params).splitlines()
+        for line in lines:
+            entry = json.loads(line)
+            timestamp, event_id = entry.pop("cursor_timestamp"), entry["event_id"]
+            yield entry
+        if len(lines) < page_size:
+            return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the log entries of a session as NDJSON")
+    parser.add_argument("session_id")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL)
+    parser.add_argument("--page-size", type=int, default=500)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--stream", action="store_true", help="read one NDJSON stream instead of pages")
+    source.add_argument("--clickhouse", action="store_true", help="read from ClickHouse directly")
+    args = parser.parse_args()
+
+    if args.clickhouse:
+        entries = iter_session_logs_from_clickhouse(ClickHouse(), args.session_id, args.page_size)
+    elif args.stream:
+        entries = stream_session_logs(args.session_id, args.base_url)
+    else:
+        entries = iter_session_logs(args.session_id, args.base_url, args.page_size)
+    for entry in entries:
+        sys.stdout.write(json.dumps(entry) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Keep the modules shared by the examples identical.
+
+Each example is built and run on its own (see their Dockerfiles), so modules
+they share, like the log spool, are copied into each of them. One copy of
+each is canonical; fixes go there and are copied to the others:
+
+    python tools/shared_modules.py sync
+
+`check` exits with status 1 when a copy differs from its canonical module,
+so a change made to one copy only fails CI:
+
+    python tools/shared_modules.py check
+"""
+
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Canonical module -> copies, relative to the repository root
+SHARED = {
+    "examples/adk/agent/coagent_clients.py": [
+        "examples/smolagents/src/coagent_clients.py",
+        "examples/langchain-simple/coagent_clients.py",
+    ],
+    "examples/adk/agent/log_spool.py": [
+        "examples/smolagents/src/log_spool.py",
+        "examples/langchain-simple/log_spool.py",
+    ],
+    "examples/adk/agent/hook_logging.py": ["examples/smolagents/src/hook_logging.py"],
+    "examples/adk/agent/instrumentation.py": ["examples/smolagents/src/instrumentation.py"],
+    "examples/adk/agent/payload_governor.py": ["examples/smolagents/src/payload_governor.py"],
+    "examples/adk/agent/prompt_dedup.py": ["examples/smolagents/src/prompt_dedup.py"],
+    "examples/adk/agent/session_sampler.py": ["examples/smolagents/src/session_sampler.py"],
+    "examples/adk/agent/stream_timing.py": ["examples/langchain-simple/stream_timing.py"],
+    "examples/smolagents/src/semantic_cache.py": ["examples/langchain-simple/semantic_cache.py"],
+}
+
+
+def header(canonical: str) -> str:
+    """First line of a shared module, naming its canonical copy."""
+    return f"# Shared by the examples: edit {canonical} and run tools/shared_modules.py sync\n"
+
+
+def differences(root: str = ROOT) -> list[str]:
+    """Problems with the shared modules, empty when every copy is in sync."""
+    problems = []
+    for canonical, copies in SHARED.items():
+        with open(os.path.join(root, canonical)) as f:
+            if f.readline() != header(canonical):
+                problems.append(f"{canonical} doesn't start with: {header(canonical).strip()}")
+        for copy in copies:
+            if not filecmp.cmp(os.path.join(root, canonical), os.path.join(root, copy), shallow=False):
+                problems.append(f"{copy} differs from {canonical}")
+    return problems
+
+
+def sync(root: str = ROOT) -> list[str]:
+    """Copy each canonical module over its copies; returns the copies changed."""
+    changed = []
+    for canonical, copies in SHARED.items():
+        for copy in copies:
+            if not filecmp.cmp(os.path.join(root, canonical), os.path.join(root, copy), shallow=False):
+                shutil.copyfile(os.path.join(root, canonical), os.path.join(root, copy))
+                changed.append(copy)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check or sync the modules shared by the examples")
+    parser.add_argument("command", choices=["check", "sync"])
+    args = parser.parse_args()
+
+    if args.command == "sync":
+        for copy in sync():
+            print(f"updated {copy}")
+    problems = differences()
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
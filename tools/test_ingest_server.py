@@ -0,0 +1,87 @@
+import gzip
+import json
+import urllib.error
+import urllib.request
+
+from ingest_server import NDJSON_CONTENT_TYPE
+
+SESSION = "ingest-test"
+
+
+def _entry(event_id, event_type="user_input", timestamp=1_700_000_000_000, **fields):
+    return {"session_id": SESSION, "event_id": event_id, "event_type": event_type,
+            "timestamp": timestamp, "prompt_number": 1, "turn_number": 0, **fields}
+
+
+def _post(base_url, body, headers):
+    request = urllib.request.Request(f"{base_url}/logs", data=body, headers=headers, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def _session(base_url):
+    with urllib.request.urlopen(f"{base_url}/logs/{SESSION}", timeout=10) as response:
+        return json.load(response)
+
+
+def test_ndjson_batch_gets_a_status_per_entry(ingest_server):
+    lines = [
+        json.dumps(_entry("a")),
+        json.dumps({**_entry("b"), "event_id": None}),
+        json.dumps(_entry("c", event_type="thinking")),
+        '{"session_id": ',
+        json.dumps(_entry("d", timestamp=-1)),
+        "",
+        json.dumps(_entry("e", event_type="session_end")),
+    ]
+    body = gzip.compress("\n".join(lines).encode())
+    status, reply = _post(ingest_server, body, {"Content-Type": NDJSON_CONTENT_TYPE, "Content-Encoding": "gzip"})
+
+    assert status == 200
+    assert (reply["success"], reply["accepted"], reply["rejected"]) == (False, 2, 4)
+    assert reply["message"] == "4 of 6 log entries rejected"
+    results = reply["results"]
+    assert [(result["index"], result["status"]) for result in results] == [
+        (0, "ok"), (1, "error"), (2, "error"), (3, "error"), (4, "error"), (6, "ok"),
+    ]
+    assert results[0]["event_id"] == "a" and results[5]["event_id"] == "e"
+    assert results[1]["error"] == "missing field: event_id"
+    assert results[2]["error"] == "unknown event_type: thinking"
+    assert results[3]["error"].startswith("invalid JSON")
+    assert results[4]["error"] == "timestamp must be a non-negative integer"
+    # Accepted entries are stored despite the rejected ones
+    assert [entry["event_id"] for entry in _session(ingest_server)] == ["a", "e"]
+
+
+def test_json_request_is_stored_all_or_nothing(ingest_server):
+    body = json.dumps([_entry("a"), _entry("b", event_type="thinking")]).encode()
+    status, reply = _post(ingest_server, body, {"Content-Type": "application/json"})
+
+    assert status == 400
+    assert reply == {"success": False, "message": "unknown event_type: thinking"}
+    assert _session(ingest_server) == []
+
+    status, reply = _post(ingest_server, json.dumps(_entry("a")).encode(), {"Content-Type": "application/json"})
+    assert (status, reply["success"]) == (200, True)
+    assert [entry["event_id"] for entry in _session(ingest_server)] == ["a"]
+
+
+def test_runs_are_summarized(ingest_server):
+    entries = [
+        _entry("a", timestamp=1000),
+        _entry("b", "llm_response", timestamp=3000,
+               llm_response={"input_tokens": 10, "output_tokens": 5, "total_tokens": 15}),
+        _entry("c", "tool_call", timestamp=2000),
+        _entry("d", "error", timestamp=4000),
+    ]
+    _post(ingest_server, json.dumps(entries).encode(), {"Content-Type": "application/json"})
+
+    with urllib.request.urlopen(f"{ingest_server}/runs?summarize=1", timeout=10) as response:
+        (summary,) = json.load(response)
+    assert summary["run_id"] == SESSION and summary["log_count"] == 4
+    assert (summary["start_timestamp"], summary["end_timestamp"]) == (1000, 4000)
+    assert summary["total_tokens"] == 15 and summary["tool_call_count"] == 1 and summary["error_count"] == 1
+    assert summary["event_counts"] == {"user_input": 1, "llm_response": 1, "tool_call": 1, "error": 1}
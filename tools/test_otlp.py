@@ -0,0 +1,90 @@
+import threading
+
+from otlp import STATUS_ERROR, TRACES_PATH, create_receiver, export, session_to_otlp, trace_id_for
+from session_logs import iter_session_logs
+
+SESSION = "otlp-test"
+T0 = 1_700_000_000_000
+
+
+def _entry(event_id, event_type, offset_ms, **fields):
+    return {"session_id": SESSION, "event_id": event_id, "event_type": event_type,
+            "timestamp": T0 + offset_ms, "prompt_number": 1, "turn_number": 0, **fields}
+
+
+def _session_entries():
+    """A run as the ADK example logs it: spans of a model and a tool call under one agent."""
+    return [
+        _entry("e1", "session_start", 0, prompt="What moved NVDA?"),
+        _entry("e2", "llm_call", 100, llm_call={"issuer": "analyst"},
+               meta={"model": "gemini", "span_id": "m1", "parent_span_id": "a1", "span_kind": "model"}),
+        _entry("e3", "llm_response", 400,
+               llm_response={"input_tokens": 10, "output_tokens": 5, "total_tokens": 15, "execution_time_ms": 250},
+               meta={"model": "gemini", "issuer": "analyst", "span_id": "m1", "parent_span_id": "a1",
+                     "span_kind": "model"}),
+        _entry("e4", "tool_call", 500, tool_call={"tool_name": "search"},
+               meta={"span_id": "t1", "parent_span_id": "a1", "span_kind": "tool"}),
+        _entry("e5", "tool_response", 800,
+               tool_response={"tool_name": "search", "success": False, "error_message": "timeout",
+                              "execution_time_ms": 300},
+               meta={"span_id": "t1", "parent_span_id": "a1", "span_kind": "tool"}),
+        _entry("e6", "session_end", 1000,
+               meta={"span_id": "r1", "span_kind": "run", "elapsed_time_ms": 1000}),
+    ]
+
+
+def _spans(payload):
+    return {span["spanId"]: span for span in payload["resourceSpans"][0]["scopeSpans"][0]["spans"]}
+
+
+def _duration_ms(span):
+    return (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) // 1_000_000
+
+
+def test_export_builds_the_span_tree():
+    spans = _spans(session_to_otlp(SESSION, _session_entries()))
+    root = next(span for span in spans.values() if "parentSpanId" not in span)
+
+    assert root["name"] == f"session {SESSION}"
+    assert {span["traceId"] for span in spans.values()} == {trace_id_for(SESSION)}
+    # The run span id logged with session_end is the prompt's span
+    assert spans["r1"]["name"] == "prompt 1" and spans["r1"]["parentSpanId"] == root["spanId"]
+    assert _duration_ms(spans["r1"]) == 1000
+    # Agent spans are only referenced, so they are made up from their children
+    assert spans["a1"]["name"] == "invoke_agent analyst" and spans["a1"]["parentSpanId"] == "r1"
+    assert spans["m1"]["name"] == "chat gemini" and spans["m1"]["parentSpanId"] == "a1"
+    assert spans["t1"]["name"] == "execute_tool search" and spans["t1"]["parentSpanId"] == "a1"
+    # Durations come from execution_time_ms, not the gap between call and response
+    assert _duration_ms(spans["m1"]) == 250 and _duration_ms(spans["t1"]) == 300
+    assert spans["t1"]["status"] == {"code": STATUS_ERROR, "message": "timeout"}
+    assert len(spans) == 5
+
+
+def test_exported_trace_round_trips_through_the_receiver(ingest_server):
+    receiver = create_receiver(port=0, base_url=ingest_server, quiet=True)
+    threading.Thread(target=receiver.serve_forever, daemon=True).start()
+    try:
+        payload = session_to_otlp(SESSION, _session_entries())
+        export(payload, f"http://127.0.0.1:{receiver.server_port}{TRACES_PATH}")
+    finally:
+        receiver.shutdown()
+        receiver.server_close()
+
+    # Every span carries the session id, so the entries land in the session again
+    entries = list(iter_session_logs(SESSION, ingest_server))
+    by_type = {}
+    for entry in entries:
+        by_type.setdefault(entry["event_type"], []).append(entry)
+    assert sorted(by_type) == ["component_enter", "component_exit", "llm_call", "llm_response",
+                               "tool_call", "tool_response"]
+    (response,) = by_type["llm_response"]
+    assert response["llm_response"]["total_tokens"] == 15 and response["llm_response"]["execution_time_ms"] == 250
+    assert response["meta"]["trace_id"] == trace_id_for(SESSION) and response["meta"]["span_id"] == "m1"
+    (tool_response,) = by_type["tool_response"]
+    assert tool_response["tool_response"]["success"] is False
+    assert tool_response["tool_response"]["error_message"] == "timeout"
+
+    # Exporting the received entries again gives the same model and tool spans
+    spans = _spans(session_to_otlp(SESSION, entries))
+    assert spans["m1"]["parentSpanId"] == "a1" and _duration_ms(spans["m1"]) == 250
+    assert spans["t1"]["parentSpanId"] == "a1" and spans["t1"]["status"]["code"] == STATUS_ERROR
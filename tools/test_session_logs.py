@@ -0,0 +1,76 @@
+import json
+import random
+import urllib.request
+
+from ingest_server import NDJSON_CONTENT_TYPE, STREAM_CHUNK_SIZE
+from session_logs import iter_session_logs, stream_session_logs
+
+SESSION = "session-logs-test"
+
+
+def _entries(count):
+    # Pairs of entries share a timestamp, so pages also break between them
+    return [{"session_id": SESSION, "event_id": f"evt-{i:04d}", "event_type": "user_input",
+             "timestamp": 1_700_000_000_000 + i // 2, "prompt_number": 1, "turn_number": i}
+            for i in range(count)]
+
+
+def _store(base_url, entries):
+    request = urllib.request.Request(
+        f"{base_url}/logs",
+        data="".join(json.dumps(entry) + "\n" for entry in entries).encode(),
+        headers={"Content-Type": NDJSON_CONTENT_TYPE},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        assert json.load(response)["success"]
+
+
+def _get(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.load(response)
+
+
+def test_pages_follow_the_cursor(ingest_server):
+    entries = _entries(25)
+    shuffled = entries[:]
+    random.Random(7).shuffle(shuffled)
+    _store(ingest_server, shuffled)
+
+    pages = []
+    url = f"{ingest_server}/logs/{SESSION}?limit=10"
+    while url:
+        page = _get(url)
+        pages.append(page["logs"])
+        url = page["next_cursor"] and f"{ingest_server}/logs/{SESSION}?limit=10&cursor={page['next_cursor']}"
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert sum(pages, []) == entries
+    assert list(iter_session_logs(SESSION, ingest_server, page_size=10)) == entries
+    # A page ending with the last entry has no cursor
+    assert _get(f"{ingest_server}/logs/{SESSION}?limit=25")["next_cursor"] is None
+
+
+def test_stream_is_read_in_order(ingest_server):
+    entries = _entries(STREAM_CHUNK_SIZE * 2 + 50)
+    _store(ingest_server, reversed(entries))
+
+    assert list(stream_session_logs(SESSION, ingest_server)) == entries
+    assert list(stream_session_logs("unknown-session", ingest_server)) == []
+
+
+def test_prompt_chunks_are_reassembled(ingest_server):
+    first, second = _entries(2)
+    first.update(event_type="llm_call", prompt_chunks={
+        "refs": ["h1", "h2"], "separator": "\n",
+        "chunks": [{"hash": "h1", "text": "system"}, {"hash": "h2", "text": "question"}],
+    })
+    # Delta against the first prompt, sending only the new chunk
+    second.update(event_type="llm_call", prompt_chunks={
+        "base": first["event_id"], "base_length": 2, "refs": ["h3"], "separator": "\n",
+        "chunks": [{"hash": "h3", "text": "answer"}],
+    })
+    _store(ingest_server, [first, second])
+
+    prompts = [entry["prompt"] for entry in iter_session_logs(SESSION, ingest_server, page_size=1)]
+    assert prompts == ["system\nquestion", "system\nquestion\nanswer"]
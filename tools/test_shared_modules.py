@@ -0,0 +1,23 @@
+import os
+import shutil
+
+from shared_modules import ROOT, SHARED, differences, sync
+
+
+def test_shared_modules_are_in_sync():
+    assert differences() == []
+
+
+def test_sync_copies_the_canonical_module(tmp_path):
+    for canonical, copies in SHARED.items():
+        for path in [canonical, *copies]:
+            os.makedirs(tmp_path / os.path.dirname(path), exist_ok=True)
+            shutil.copyfile(os.path.join(ROOT, path), tmp_path / path)
+    canonical = "examples/adk/agent/log_spool.py"
+    copy = SHARED[canonical][0]
+    with open(tmp_path / copy, "a") as f:
+        f.write("# fixed in this copy only\n")
+
+    assert differences(str(tmp_path)) == [f"{copy} differs from {canonical}"]
+    assert sync(str(tmp_path)) == [copy]
+    assert differences(str(tmp_path)) == []